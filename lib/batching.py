@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+The file contains the mini-batch iterator for training on Dataset outputs.
+Segments are grouped into batches of similar length, so a batch is padded
+only to its own longest segment, and the batches are assembled by
+background threads into preallocated buffers that are reused across the
+epoch instead of padding the whole dataset up front.
+"""
+import threading
+import Queue
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+class BatchLoader():
+    """
+    Bucketed, shuffled and prefetched mini-batches of segments
+    """
+
+    def __init__(self, features, modalities, labels=None, segments=None,
+                 batch_size=32, maxlen=None, shuffle=True, seed=0, pool=50,
+                 prefetch=2, workers=1, dtype=np.float32, skip_empty=True):
+        """
+        :param features: Feature dictionary as returned by Dataset.load or
+                         Dataset.align. The times are not used, so passing
+                         Dataset.feature_dict avoids relative time views
+        :param modalities: Modality keys to put in the batches
+        :param labels: Optional {video_id: {segment_id: label}}, or a
+                       sequence of labels aligned with segments
+        :param segments: Optional list of (video_id, segment_id) to iterate
+                         over, defaults to the segments of the first
+                         modality, sorted
+        :param batch_size: Number of segments per batch
+        :param maxlen: Optional maximum number of steps, longer segments
+                       are truncated to their first maxlen steps
+        :param shuffle: Shuffle the segments and batches of every epoch
+        :param seed: Seed of the shuffle, epoch e uses seed + e
+        :param pool: Segments are bucketed by length within pools of
+                     pool * batch_size shuffled segments, None to sort the
+                     whole epoch (least padding, least randomness)
+        :param prefetch: Number of batches assembled ahead of the consumer
+        :param workers: Number of threads assembling batches
+        :param dtype: dtype of the feature buffers
+        :param skip_empty: Leave out segments without features in all the
+                           modalities
+        """
+        self.features = features
+        self.modalities = list(modalities)
+        self.batch_size = batch_size
+        self.maxlen = maxlen
+        self.shuffle = shuffle
+        self.seed = seed
+        self.pool = pool
+        self.prefetch = max(prefetch, 1)
+        self.workers = max(workers, 1)
+        self.dtype = dtype
+        self.epoch = 0
+
+        if segments is None:
+            first = features[self.modalities[0]]
+            segments = [(video_id, segment_id) for video_id in sorted(first)
+                        for segment_id in sorted(first[video_id])]
+        if labels is not None and not hasattr(labels, "keys"):
+            labels = list(labels)
+            if len(labels) != len(segments):
+                raise ValueError("Param labels must have one label per "
+                                 "segment")
+            labels = dict(zip(segments, labels))
+        elif labels is not None:
+            labels = dict(((video_id, segment_id),
+                           labels[video_id][segment_id])
+                          for video_id, segment_id in segments)
+
+        # Steps of every modality of every segment, after truncation
+        lengths = np.zeros((len(segments), len(self.modalities)),
+                           dtype=np.int64)
+        self.dims = [0] * len(self.modalities)
+        for j, modality in enumerate(self.modalities):
+            modality_feats = features[modality]
+            for i, (video_id, segment_id) in enumerate(segments):
+                feats = modality_feats.get(video_id, {}).get(segment_id)
+                if feats:
+                    lengths[i, j] = len(feats)
+                    if not self.dims[j]:
+                        self.dims[j] = len(feats[0][2])
+        if maxlen:
+            np.minimum(lengths, maxlen, out=lengths)
+        keep = lengths.max(axis=1) > 0 if skip_empty else \
+            np.ones(len(segments), dtype=bool)
+        self.segments = [segment for segment, kept in zip(segments, keep)
+                         if kept]
+        self.lengths = lengths[keep]
+        self.labels = None
+        if labels is not None:
+            self.labels = np.asarray([labels[segment]
+                                      for segment in self.segments])
+        self.max_steps = (self.lengths.max(axis=0) if len(self.lengths)
+                          else np.zeros(len(self.modalities), np.int64))
+
+    def __len__(self):
+        return (len(self.segments) + self.batch_size - 1) // self.batch_size
+
+    def plan(self, epoch=None):
+        """
+        Segment indices of the batches of an epoch
+        :returns: list of int arrays, one per batch
+        """
+        epoch = self.epoch if epoch is None else epoch
+        order = np.arange(len(self.segments))
+        rng = np.random.RandomState(self.seed + epoch)
+        if self.shuffle:
+            rng.shuffle(order)
+        # Sort by the longest modality, within pools of shuffled segments
+        size = (self.pool * self.batch_size if self.pool
+                else max(len(order), 1))
+        steps = self.lengths.max(axis=1)
+        pools = [order[i:i + size] for i in range(0, len(order), size)]
+        order = np.concatenate([pool[np.argsort(steps[pool],
+                                                kind="mergesort")]
+                                for pool in pools]) if pools else order
+        batches = [order[i:i + self.batch_size]
+                   for i in range(0, len(order), self.batch_size)]
+        if self.shuffle:
+            rng.shuffle(batches)
+        return batches
+
+    def padding_fraction(self, epoch=None):
+        """
+        Fraction of padded steps in the batches of an epoch
+        """
+        padded = real = 0
+        for batch in self.plan(epoch):
+            batch_lengths = self.lengths[batch]
+            padded += batch_lengths.max(axis=0).sum() * len(batch)
+            real += batch_lengths.sum()
+        return 1.0 - real / float(padded) if padded else 0.0
+
+    def _buffers(self):
+        buffers = {"features": [np.zeros((self.batch_size, max(steps, 1),
+                                          dim), dtype=self.dtype)
+                                for steps, dim in zip(self.max_steps,
+                                                      self.dims)],
+                   "lengths": np.zeros((self.batch_size,
+                                        len(self.modalities)),
+                                       dtype=np.int64)}
+        if self.labels is not None:
+            buffers["labels"] = np.zeros((self.batch_size,) +
+                                         self.labels.shape[1:],
+                                         dtype=self.labels.dtype)
+        return buffers
+
+    def _fill(self, batch, buffers):
+        """
+        Copy the segments of a batch into buffers
+        :returns: batch dictionary of views into the buffers
+        """
+        count = len(batch)
+        batch_lengths = self.lengths[batch]
+        steps = batch_lengths.max(axis=0)
+        buffers["lengths"][:count] = batch_lengths
+        result = {"segments": [self.segments[i] for i in batch],
+                  "lengths": dict((modality, buffers["lengths"][:count, j])
+                                  for j, modality
+                                  in enumerate(self.modalities)),
+                  "features": {}, "labels": None}
+        for j, modality in enumerate(self.modalities):
+            out = buffers["features"][j][:count, :steps[j]]
+            out.fill(0)
+            modality_feats = self.features[modality]
+            for row, i in enumerate(batch):
+                length = batch_lengths[row, j]
+                if not length:
+                    continue
+                video_id, segment_id = self.segments[i]
+                feats = modality_feats[video_id][segment_id]
+                out[row, :length] = [feat[2] for feat in feats[:length]]
+            result["features"][modality] = out
+        if self.labels is not None:
+            buffers["labels"][:count] = self.labels[batch]
+            result["labels"] = buffers["labels"][:count]
+        return result
+
+    def __iter__(self):
+        """
+        Iterate over the batches of the next epoch. Every batch is a
+        dictionary with
+            segments    list of (video_id, segment_id)
+            features    {modality: array (batch, steps, dim)} zero padded
+            lengths     {modality: array (batch,)} unpadded steps
+            labels      array (batch, ...) or None
+        The arrays are views into buffers that are reused once the next
+        batch is requested, copy them to keep them longer.
+        """
+        batches = self.plan()
+        self.epoch += 1
+        free = Queue.Queue()
+        for _ in range(self.prefetch + 1):
+            free.put(self._buffers())
+        ready = {}
+        cond = threading.Condition()
+        state = {"next": 0, "stop": False, "error": None}
+        assign = threading.Lock()
+
+        def worker():
+            while True:
+                # Indices and buffers are handed out in batch order, so the
+                # buffers are never all held by batches after the next one
+                with assign:
+                    if state["stop"] or state["next"] >= len(batches):
+                        return
+                    k = state["next"]
+                    state["next"] += 1
+                    buffers = None
+                    while buffers is None and not state["stop"]:
+                        try:
+                            buffers = free.get(timeout=0.1)
+                        except Queue.Empty:
+                            pass
+                if buffers is None:
+                    return
+                try:
+                    result = self._fill(batches[k], buffers)
+                except Exception as e:
+                    with cond:
+                        state["error"] = e
+                        cond.notify_all()
+                    return
+                with cond:
+                    ready[k] = (result, buffers)
+                    cond.notify_all()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(self.workers)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        held = None
+        try:
+            for k in range(len(batches)):
+                with cond:
+                    while k not in ready and state["error"] is None:
+                        cond.wait(0.1)
+                    if state["error"] is not None:
+                        raise state["error"]
+                    result, buffers = ready.pop(k)
+                if held is not None:
+                    free.put(held)
+                held = buffers
+                yield result
+        finally:
+            state["stop"] = True
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""
+The file contains the benchmark suite of Dataset and P2FA_Helper_v2, run on
+a synthetic dataset (see synthetic.py). Every benchmark runs in its own
+process, so the peak resident memory it reports is not inflated by the
+benchmarks before it. Results are written as JSON together with the git
+commit they were measured at, and can be compared against an earlier run
+    python benchmark.py --data /tmp/bench --output new.json --compare old.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from os.path import join, exists, dirname, abspath
+import numpy as np
+import synthetic
+from loadstats import peak_rss_mb
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+p2fa_stages = ["validate_csv", "load_phonemes", "load_words", "load_glove"]
+
+
+def git_commit():
+    """
+    :returns: tuple (commit hash, True if the work tree has changes)
+    """
+    repo_dir = dirname(abspath(__file__))
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                         cwd=repo_dir).strip()
+        status = subprocess.check_output(["git", "status", "--porcelain",
+                                          "--untracked-files=no"],
+                                         cwd=repo_dir)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def modality_key(dataset, api):
+    """
+    Key of the first modality of type api in a loaded Dataset
+    """
+    for key in sorted(dataset.modalities):
+        if dataset.modalities[key]["type"] == api:
+            return key
+    raise KeyError("No modality of type " + api)
+
+
+def bench_dataset_load(config_csv, p2fa_csv, glove_path, work_dir, options):
+    from dataset import Dataset
+    start = time.time()
+    Dataset(config_csv).load()
+    return time.time() - start
+
+
+def bench_dataset_align(config_csv, p2fa_csv, glove_path, work_dir, options):
+    from dataset import Dataset
+    dataset = Dataset(config_csv)
+    dataset.load()
+    key = modality_key(dataset, options["align"])
+    start = time.time()
+    dataset.align(key)
+    return time.time() - start
+
+
+def p2fa_stage_bench(stage):
+    """
+    Benchmark of one P2FA_Helper_v2 stage. The stages before it are run
+    untimed, as the stage depends on their results
+    """
+    def bench(config_csv, p2fa_csv, glove_path, work_dir, options):
+        from p2fa_helper import P2FA_Helper_v2
+        helper = P2FA_Helper_v2(p2fa_csv, output_dir=work_dir,
+                                embed_type="glove",
+                                embed_model_path=glove_path,
+                                output_format=options["output_format"])
+        for previous in p2fa_stages[:p2fa_stages.index(stage)]:
+            getattr(helper, previous)()
+        start = time.time()
+        getattr(helper, stage)()
+        return time.time() - start
+    return bench
+
+
+benchmarks = [("dataset.load", bench_dataset_load),
+              ("dataset.align", bench_dataset_align)]
+benchmarks += [("p2fa." + stage, p2fa_stage_bench(stage))
+               for stage in p2fa_stages]
+
+
+def _run_child(bench, args, queue, quiet):
+    if quiet:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+    work_dir = tempfile.mkdtemp(prefix="cmsdk_bench_")
+    try:
+        base_rss = peak_rss_mb()
+        seconds = bench(*(args[:3] + (work_dir,) + args[3:]))
+        queue.put((seconds, base_rss, peak_rss_mb(), None))
+    except Exception as e:
+        queue.put((None, None, None, "%s: %s" % (type(e).__name__, e)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_benchmark(bench, args, quiet=True):
+    """
+    Run a benchmark function in a new process.
+    :returns: tuple (seconds, peak rss MB before the benchmark code ran,
+              peak rss MB, error)
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_child,
+                                      args=(bench, args, queue, quiet))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_suite(data_dir, repeat=3, names=None, align="embeddings",
+              output_format="csv", quiet=True):
+    """
+    Run the benchmarks on the synthetic dataset in data_dir.
+    :param repeat: Number of timed runs of each benchmark
+    :param names: Names of the benchmarks to run, all if None
+    :param align: Modality type used as the reference of dataset.align
+    :param output_format: Output format of the P2FA_Helper_v2 stages
+    :returns: dictionary of results, as written to the JSON file
+    """
+    config_csv = join(data_dir, "config.csv")
+    p2fa_csv = join(data_dir, "p2fa.csv")
+    glove_path = join(data_dir, "glove.txt")
+    options = {"align": align, "output_format": output_format}
+    args = (config_csv, p2fa_csv, glove_path, options)
+
+    commit, dirty = git_commit()
+    results = {"commit": commit, "dirty": dirty,
+               "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "python": platform.python_version(),
+               "numpy": np.__version__,
+               "platform": platform.platform(),
+               "data": abspath(data_dir), "repeat": repeat,
+               "options": options, "benchmarks": {}}
+    for name, bench in benchmarks:
+        if names and name not in names:
+            continue
+        times, peaks, bases = [], [], []
+        error = None
+        for _ in range(repeat):
+            seconds, base_rss, peak_rss, error = run_benchmark(bench, args,
+                                                                quiet)
+            if error:
+                break
+            times.append(seconds)
+            bases.append(base_rss)
+            peaks.append(peak_rss)
+        if error:
+            results["benchmarks"][name] = {"error": error}
+            print "%-20s failed: %s" % (name, error)
+            continue
+        results["benchmarks"][name] = {"times": times, "best": min(times),
+                                       "mean": sum(times) / len(times),
+                                       "base_rss_mb": max(bases),
+                                       "peak_rss_mb": max(peaks)}
+        print "%-20s best %8.3fs  mean %8.3fs  peak rss %8.1f MB" % (
+            name, min(times), sum(times) / len(times), max(peaks))
+    return results
+
+
+def compare(results, baseline):
+    """
+    Print the best times and peak memory of results relative to baseline
+    """
+    print "\nCompared to commit", baseline.get("commit")
+    for name in sorted(results["benchmarks"]):
+        new = results["benchmarks"][name]
+        old = baseline["benchmarks"].get(name)
+        if not old or "error" in old or "error" in new:
+            continue
+        print "%-20s time x%6.3f  peak rss x%6.3f" % (
+            name, new["best"] / old["best"],
+            new["peak_rss_mb"] / old["peak_rss_mb"])
+
+
+def add_arguments(parser):
+    """
+    Add the command line arguments of the benchmark suite to parser
+    """
+    parser.add_argument("--data", required=True,
+                        help="Synthetic dataset directory, generated if it "
+                             "does not exist")
+    parser.add_argument("--preset", default="tiny",
+                        help="Preset used to generate the dataset")
+    parser.add_argument("--videos", type=int)
+    parser.add_argument("--segments", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--bench", action="append",
+                        help="Benchmark to run, may be repeated")
+    parser.add_argument("--align", default="embeddings",
+                        help="Modality type to align the dataset to")
+    parser.add_argument("--output_format", default="csv",
+                        help="csv, npz or store, for the P2FA stages")
+    parser.add_argument("--output", help="Path of the JSON results file")
+    parser.add_argument("--compare", help="JSON results file to compare to")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Show the output of the benchmarked code")
+
+
+def main(args):
+    """
+    Run the benchmark suite with the arguments of add_arguments
+    """
+    if not exists(join(args.data, "config.csv")):
+        overrides = {"seed": args.seed}
+        if args.videos:
+            overrides["videos"] = args.videos
+        if args.segments:
+            overrides["segments"] = args.segments
+        print "Generating", args.preset, "dataset in", args.data
+        synthetic.generate(args.data, args.preset, **overrides)
+
+    results = run_suite(args.data, args.repeat, args.bench, args.align,
+                        args.output_format, not args.verbose)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare, "r") as fh:
+            compare(results, json.load(fh))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Dataset and "
+                                     "P2FA_Helper_v2 on a synthetic dataset.")
+    add_arguments(parser)
+    main(parser.parse_args())
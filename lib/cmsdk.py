@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+The file contains the cmsdk command line interface, working from feature
+stores
+    python cmsdk.py build config.csv mosi_store --align modality_3
+    python cmsdk.py align mosi_store modality_3
+    python cmsdk.py export mosi_store mosi_parquet --format parquet
+    python cmsdk.py inspect mosi_store
+    python cmsdk.py query mosi_store modality_0 video_1 12.3 15.8
+    python cmsdk.py bench --data /tmp/bench
+Every subcommand imports the modules it needs when it runs, so inspect,
+which reads only meta.json, and query, which attaches to the memory-mapped
+store, start without loading pandas or scipy.
+"""
+import argparse
+import json
+import os
+import sys
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+def parse_columns(specs):
+    """
+    Column selections of --columns modality=col,col,... where a column is
+    a header name or an integer index
+    :returns: {modality: [columns]}
+    """
+    columns = {}
+    for spec in specs or []:
+        modality, _, names = spec.partition("=")
+        columns[modality] = [int(name) if name.lstrip("-").isdigit()
+                             else name for name in names.split(",") if name]
+    return columns
+
+
+def build(args):
+    from dataset import Dataset
+    shard = None
+    if args.shard:
+        shard = tuple(int(part) for part in args.shard.split("/"))
+    dataset = Dataset(args.config, shard=shard,
+                      columns=parse_columns(args.columns),
+                      prefetch_workers=args.prefetch_workers)
+    dataset.load()
+    if args.align:
+        dataset.align(args.align)
+    if args.stats:
+        dataset.compute_stats(groupby=args.stats)
+    dataset.save(args.store, normalize=args.normalize,
+                 quantize=args.quantize, tolerance=args.tolerance)
+    print "Store written to", args.store
+
+
+def align(args):
+    from dataset import Dataset
+    dataset = Dataset(args.store, stored=True, shared=True)
+    dataset.load()
+    dataset.align(args.modality)
+    output = args.output or args.store
+    names = None
+    if output == args.store:
+        # The loaded modalities are already in the store
+        names = ["aligned_" + key for key in dataset.aligned_feature_dict]
+    dataset.save(output, quantize=args.quantize, modalities=names)
+    print "Aligned features written to", output
+
+
+def export(args):
+    from dataset import Dataset
+    if args.format == "parquet":
+        dataset = Dataset(args.store, stored=True, shared=True)
+        dataset.load()
+        fpaths = dataset.to_parquet(args.output, args.modalities)
+        for name in sorted(fpaths):
+            print name, fpaths[name]
+    else:
+        import pickle
+        dataset = Dataset(args.store, stored=True, shared=True,
+                          timestamps=args.timestamps)
+        sources = dict(dataset.load())
+        aligned = dataset.features(
+            feature_dict=dataset.aligned_feature_dict or {})
+        for key in aligned:
+            sources["aligned_" + key] = aligned[key]
+        # The loaded modalities by default, as Dataset.load returns them
+        names = args.modalities or sorted(dataset.feature_dict)
+        features = dict((name, sources[name].materialize())
+                        for name in names)
+        with open(args.output, "wb") as fh:
+            pickle.dump(features, fh, pickle.HIGHEST_PROTOCOL)
+        print "Features pickled to", args.output
+
+
+def inspect(args):
+    meta_path = os.path.join(args.store, "meta.json")
+    if not os.path.exists(meta_path):
+        sys.exit("No feature store found at " + args.store)
+    with open(meta_path, "r") as fh:
+        meta = json.load(fh)
+    segments = meta["segments"]
+    summary = {"format": meta.get("format"), "version": meta.get("version"),
+               "videos": len(set(segment[0] for segment in segments)),
+               "segments": len(segments),
+               "duration": sum(segment[3] - segment[2]
+                               for segment in segments),
+               "shard": meta.get("shard"), "shards": meta.get("shards"),
+               "modalities": {}}
+    for name, info in meta["modalities"].iteritems():
+        entry = dict((key, value) for key, value in info.iteritems()
+                     if key != "token_counts")
+        if "token_counts" in info:
+            entry["tokens"] = sum(info["token_counts"])
+        summary["modalities"][name] = entry
+    if args.json:
+        print json.dumps(summary, indent=1, sort_keys=True)
+        return
+
+    print "%s version %s" % (summary["format"], summary["version"])
+    print "%d videos, %d segments, %.1f s" % (
+        summary["videos"], summary["segments"], summary["duration"])
+    if summary["shard"]:
+        print "shard %d of %d" % tuple(summary["shard"])
+    if summary["shards"]:
+        print "merged from %d stores" % len(summary["shards"])
+    print "%-22s %-10s %-5s %6s %-8s %10s  %s" % (
+        "modality", "type", "level", "dim", "dtype", "frames", "notes")
+    for name in sorted(summary["modalities"]):
+        info = summary["modalities"][name]
+        notes = []
+        if "aligned_from" in info:
+            notes.append("aligned to " + str(info["aligned_to"]))
+        if "joint_of" in info:
+            notes.append("joint tensor of " + ", ".join(info["joint_of"]))
+        if "pyramid_of" in info:
+            notes.append("pyramid of %s, %s bins" % (info["pyramid_of"],
+                                                     info["width"]))
+        if info.get("quantized"):
+            notes.append("quantized")
+        if info.get("normalized"):
+            notes.append("normalized")
+        if info.get("stats"):
+            notes.append(str(info["stats"]) + " stats")
+        if "tokens" in info:
+            notes.append("%d tokens" % info["tokens"])
+        print "%-22s %-10s %-5s %6s %-8s %10s  %s" % (
+            name, info.get("type", ""), info.get("level", ""),
+            info.get("dim", ""), info.get("dtype", ""),
+            info.get("frames", ""), ", ".join(notes))
+
+
+def query(args):
+    from dataset import Dataset
+    dataset = Dataset(args.store, stored=True, shared=True)
+    dataset.load()
+    starts, ends, values = dataset.query(args.modality, args.video_id,
+                                         args.t0, args.t1, args.overlap)
+    for i in range(min(len(starts), args.limit or len(starts))):
+        print "%.4f %.4f %s" % (starts[i], ends[i],
+                                " ".join("%g" % val for val in values[i]))
+    print >> sys.stderr, len(starts), "frames"
+
+
+def bench(args):
+    import benchmark
+    bench_parser = argparse.ArgumentParser(prog="cmsdk bench")
+    benchmark.add_arguments(bench_parser)
+    benchmark.main(bench_parser.parse_args(args.bench_args))
+
+
+def parser():
+    """
+    :returns: argparse.ArgumentParser of the subcommands
+    """
+    main_parser = argparse.ArgumentParser(
+        prog="cmsdk", description="CMU Multimodal Data SDK command line.")
+    subparsers = main_parser.add_subparsers()
+
+    sub = subparsers.add_parser("build", help="Load a dataset config and "
+                                "write its features into a store")
+    sub.add_argument("config", help="Dataset config CSV")
+    sub.add_argument("store", help="Feature store directory to write")
+    sub.add_argument("--shard", help="i/N to build the i-th of N shards")
+    sub.add_argument("--columns", action="append",
+                     help="modality=col,col,... feature columns to load, "
+                          "may be repeated")
+    sub.add_argument("--prefetch_workers", type=int, default=0)
+    sub.add_argument("--align", help="Modality to align the features to")
+    sub.add_argument("--stats", choices=["global", "video"],
+                     help="Compute normalization statistics")
+    sub.add_argument("--normalize", action="store_true",
+                     help="Store the modalities with statistics normalized")
+    sub.add_argument("--quantize", choices=["int8", "int16"])
+    sub.add_argument("--tolerance", type=float,
+                     help="Maximum quantization error")
+    sub.set_defaults(func=build)
+
+    sub = subparsers.add_parser("align", help="Align the modalities of a "
+                                "store to one of them")
+    sub.add_argument("store")
+    sub.add_argument("modality", help="Modality key to align to")
+    sub.add_argument("--output", help="Store to write, defaults to adding "
+                                      "the aligned modalities to the store")
+    sub.add_argument("--quantize", choices=["int8", "int16"])
+    sub.set_defaults(func=align)
+
+    sub = subparsers.add_parser("export", help="Export the features of a "
+                                "store to Parquet or pickle")
+    sub.add_argument("store")
+    sub.add_argument("output", help="Parquet directory or pickle file")
+    sub.add_argument("--format", choices=["parquet", "pickle"],
+                     default="parquet")
+    sub.add_argument("--modalities", nargs="+")
+    sub.add_argument("--timestamps", choices=["absolute", "relative"],
+                     default="absolute", help="Times of the pickle")
+    sub.set_defaults(func=export)
+
+    sub = subparsers.add_parser("inspect", help="Describe a store from its "
+                                "meta.json")
+    sub.add_argument("store")
+    sub.add_argument("--json", action="store_true")
+    sub.set_defaults(func=inspect)
+
+    sub = subparsers.add_parser("query", help="Print the frames of a video "
+                                "in a time range")
+    sub.add_argument("store")
+    sub.add_argument("modality")
+    sub.add_argument("video_id")
+    sub.add_argument("t0", type=float)
+    sub.add_argument("t1", type=float)
+    sub.add_argument("--overlap", action="store_true",
+                     help="Frames overlapping the range instead of starting "
+                          "in it")
+    sub.add_argument("--limit", type=int, help="Maximum frames to print")
+    sub.set_defaults(func=query)
+
+    sub = subparsers.add_parser("bench", add_help=False,
+                                help="Run the benchmark suite (see "
+                                     "benchmark.py)")
+    # The arguments of benchmark.py are parsed by bench
+    sub.set_defaults(func=bench)
+    return main_parser
+
+
+if __name__ == "__main__":
+    main_parser = parser()
+    args, extra = main_parser.parse_known_args()
+    if args.func is bench:
+        args.bench_args = extra
+    elif extra:
+        main_parser.error("unrecognized arguments: " + " ".join(extra))
+    args.func(args)
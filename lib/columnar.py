@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+The file contains the Apache Arrow and Parquet export of features, for
+readers such as Spark and pandas. A modality is a long table with one row
+per frame
+    video_id    dictionary encoded string
+    segment_id  dictionary encoded string
+    start       float64 absolute start time
+    end         float64 absolute end time
+    features    fixed size list of the feature values
+built from the contiguous arrays of the feature store layout, so the
+feature values are handed to Arrow as one buffer instead of one Python
+object per frame.
+
+A Parquet file holds one modality, with one row group per video. Its
+key-value metadata records the rows of every segment, which read_parquet
+uses to read only the row groups of the requested videos and to slice out
+the requested segments. pyarrow is needed only by this module.
+"""
+import json
+import numpy as np
+
+# pyarrow is imported on first use, see _require_pyarrow
+pa = pq = None
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+METADATA_KEY = b"cmsdk"
+
+
+def _require_pyarrow():
+    global pa, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is required for the Arrow and Parquet "
+                          "export, install it with pip install pyarrow")
+    pa, pq = pyarrow, pyarrow.parquet
+
+
+def _dictionary_column(codes, names):
+    return pa.DictionaryArray.from_arrays(
+        pa.array(codes.astype(np.int32)), pa.array(names, type=pa.string()))
+
+
+def _features_as(table, dim, fixed):
+    """
+    Table with the features column as a fixed size list if fixed, else as
+    a list. The value buffers are shared, Parquet writers that do not
+    handle fixed size lists store the features as lists of dim values
+    """
+    index = table.schema.get_field_index("features")
+    if index < 0:
+        return table
+    chunks = []
+    for chunk in table.column(index).chunks:
+        values = chunk.flatten()
+        if fixed:
+            chunks.append(pa.FixedSizeListArray.from_arrays(values, dim))
+        else:
+            offsets = pa.array(np.arange(0, len(values) + 1, max(dim, 1),
+                                         dtype=np.int32))
+            chunks.append(pa.ListArray.from_arrays(offsets, values))
+    column = pa.chunked_array(chunks, chunks[0].type if chunks else
+                              (pa.list_(pa.float32(), dim) if fixed
+                               else pa.list_(pa.float32())))
+    return table.set_column(index, "features", column)
+
+
+def modality_table(segments, intervals, values, offsets, info=None):
+    """
+    Arrow table of a modality from its arrays in the store layout, e.g.
+    as returned by store.modality_arrays or FeatureStore.arrays.
+    :param segments: Segment list as returned by store.segment_order
+    :param intervals: Array (frames, 2) of absolute start and end times
+    :param values: Array (frames, dim) of feature values
+    :param offsets: Array (segments + 1,) of the first frame of every
+                    segment
+    :param info: Optional dictionary of modality information, kept in the
+                 table metadata
+    :returns: pyarrow.Table
+    """
+    _require_pyarrow()
+    offsets = np.asarray(offsets, dtype=np.int64)
+    values = np.ascontiguousarray(values)
+    frames, dim = values.shape
+    segment_codes = np.repeat(np.arange(len(segments)), np.diff(offsets))
+    video_names = sorted(set(segment[0] for segment in segments))
+    video_codes = dict((video_id, i) for i, video_id
+                       in enumerate(video_names))
+    segment_names = sorted(set(segment[1] for segment in segments))
+    segment_name_codes = dict((segment_id, i) for i, segment_id
+                              in enumerate(segment_names))
+    video_of_segment = np.asarray([video_codes[segment[0]]
+                                   for segment in segments], dtype=np.int32)
+    id_of_segment = np.asarray([segment_name_codes[segment[1]]
+                                for segment in segments], dtype=np.int32)
+
+    features = pa.FixedSizeListArray.from_arrays(
+        pa.array(values.reshape(-1)), dim)
+    table = pa.Table.from_arrays(
+        [_dictionary_column(video_of_segment[segment_codes], video_names),
+         _dictionary_column(id_of_segment[segment_codes], segment_names),
+         pa.array(np.ascontiguousarray(intervals[:, 0])),
+         pa.array(np.ascontiguousarray(intervals[:, 1])),
+         features],
+        names=["video_id", "segment_id", "start", "end", "features"])
+    metadata = {"info": info or {}, "dim": int(dim),
+                "dtype": values.dtype.name,
+                "segments": [[segment[0], segment[1], segment[2], segment[3],
+                              int(offsets[i]), int(offsets[i + 1])]
+                             for i, segment in enumerate(segments)]}
+    return table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+
+
+def table_metadata(table):
+    """
+    Metadata written by modality_table: info, dim, dtype and segments, a
+    list of [video_id, segment_id, start, end, first_row, end_row]
+    """
+    return json.loads(table.schema.metadata[METADATA_KEY])
+
+
+def write_parquet(table, fpath):
+    """
+    Write a table of modality_table into a Parquet file, one row group per
+    video. The rows of every video and segment are recorded in the file
+    metadata.
+    """
+    _require_pyarrow()
+    metadata = table_metadata(table)
+    table = _features_as(table, metadata["dim"], False)
+    # Segments of a video are consecutive in the store layout
+    row_groups = []
+    for video_id, _, _, _, first, last in metadata["segments"]:
+        if last == first:
+            continue
+        if row_groups and row_groups[-1][0] == video_id:
+            row_groups[-1][2] = last
+        else:
+            row_groups.append([video_id, first, last])
+    metadata["row_groups"] = row_groups
+    table = table.replace_schema_metadata(
+        {METADATA_KEY: json.dumps(metadata)})
+    writer = pq.ParquetWriter(fpath, table.schema)
+    try:
+        for _, first, last in row_groups:
+            writer.write_table(table.slice(first, last - first),
+                               row_group_size=last - first)
+    finally:
+        writer.close()
+
+
+def read_parquet(fpath, video_ids=None, segments=None, columns=None):
+    """
+    Read the rows of some videos or segments of a Parquet file written by
+    write_parquet. Only the row groups of the selected videos are read.
+    :param video_ids: Optional iterable of video ids to read
+    :param segments: Optional iterable of (video_id, segment_id) to read
+    :param columns: Optional list of the columns to read
+    :returns: pyarrow.Table with the metadata of modality_table
+    """
+    _require_pyarrow()
+    parquet_file = pq.ParquetFile(fpath)
+    metadata = json.loads(parquet_file.metadata.metadata[METADATA_KEY])
+    video_ids = None if video_ids is None else set(video_ids)
+    segments = None if segments is None else set(segments)
+
+    # Row group and first row of every video
+    video_groups = dict((row_group[0], (i, row_group[1]))
+                        for i, row_group in enumerate(metadata["row_groups"]))
+    groups = {}
+    selected = []
+    slices = []
+    for segment in metadata["segments"]:
+        video_id, segment_id, _, _, first, last = segment
+        if (video_ids is not None and video_id not in video_ids) or \
+                (segments is not None
+                 and (video_id, segment_id) not in segments):
+            continue
+        row = selected[-1][5] if selected else 0
+        selected.append(segment[:4] + [row, row + last - first])
+        if last == first:
+            continue
+        group, group_first = video_groups[video_id]
+        if group not in groups:
+            groups[group] = parquet_file.read_row_group(group,
+                                                        columns=columns)
+        slices.append(groups[group].slice(first - group_first, last - first))
+
+    if slices:
+        table = pa.concat_tables(slices)
+    elif parquet_file.num_row_groups:
+        table = parquet_file.read_row_group(0, columns=columns).slice(0, 0)
+    else:
+        table = parquet_file.read(columns=columns)
+    table = _features_as(table, metadata["dim"], True)
+    metadata["segments"] = selected
+    del metadata["row_groups"]
+    return table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata)})
+
+
+def table_arrays(table):
+    """
+    Arrays of the store layout from a table of modality_table or
+    read_parquet with all its columns.
+    :returns: tuple (segments, intervals, values, offsets)
+    """
+    metadata = table_metadata(table)
+    segments = [[str(segment[0]), str(segment[1]), segment[2], segment[3]]
+                for segment in metadata["segments"]]
+    offsets = np.asarray([0] + [segment[5] for segment
+                                in metadata["segments"]], dtype=np.int64)
+    intervals = np.empty((table.num_rows, 2), dtype=np.float64)
+    intervals[:, 0] = table.column("start").to_pandas()
+    intervals[:, 1] = table.column("end").to_pandas()
+    chunks = [chunk.flatten().to_numpy()
+              for chunk in table.column("features").chunks]
+    values = (np.concatenate(chunks) if chunks
+              else np.zeros(0, dtype=metadata["dtype"]))
+    return (segments, intervals,
+            values.reshape(table.num_rows, metadata["dim"]), offsets)
+
+
+def feature_dict(table):
+    """
+    Features of a table of modality_table or read_parquet as a feature
+    dictionary {video_id: {segment_id: [tuples]}} with absolute times
+    """
+    segments, intervals, values, offsets = table_arrays(table)
+    features = {}
+    for i, (video_id, segment_id, _, _) in enumerate(segments):
+        features.setdefault(video_id, {})[segment_id] = [
+            (intervals[j, 0], intervals[j, 1], values[j])
+            for j in range(offsets[i], offsets[i + 1])]
+    return features
@@ -2,11 +2,26 @@
 """
 The file contains the class and methods for loading and aligning datasets
 """
+import copy
+import hashlib
+import os
 import pickle
+import tempfile
+import time
+from io import BytesIO
 import numpy as np
-from scipy.io import loadmat
-import pandas as pd
 import utils
+import store
+from intervals import IntervalIndex
+from loadstats import LoadStats
+from prefetch import Prefetcher
+from views import TimeShiftView, StoreView
+from normalization import RunningStats
+import windows
+import pyramid
+import tensor
+import columnar
+import quantization
 import warnings
 
 __author__ = "Prateek Vij"
@@ -16,27 +31,215 @@ __license__ = "GPL"
 __version__ = "1.0.1"
 __status__ = "Production"
 
+# Header names of the frame time column of FACET files, lowercase
+FACET_TIME_NAMES = ("timestamp", "time", "frametime", "frame_time")
+# Lines read to detect the layout of a FACET file
+FACET_SNIFF_LINES = 5
+# Value of the FACET cells that are empty or not numbers, and the cells
+# read as NaN
+FACET_FILL_VALUE = 0.0
+FACET_NAN_CELLS = ["nan", "NaN", "NAN", "-nan", "-NaN", "+nan"]
+# Fixed layouts of the FACET versions with their own loader: header line,
+# column of the frame time, values from the next column to the end less
+# the trailing cells
+FACET_LAYOUTS = {"facet1": {"header": False, "time_col": 1, "trailing": 1},
+                 "facet2": {"header": False, "time_col": 1, "trailing": 1},
+                 "old_facet": {"header": True, "time_col": 0,
+                               "trailing": 0}}
+
+
+def video_shard(video_id, shards):
+    """
+    Shard of a video when a dataset is split by video into shards parts.
+    The split depends only on the video id, so every machine loading a
+    shard of the same config agrees on it
+    """
+    return int(hashlib.md5(str(video_id)).hexdigest(), 16) % shards
+
+
+def _id_strings(column):
+    """
+    Segment ids of a pandas column as the strings used as dataset keys,
+    so that 3 and 3.0 both become '3'
+    """
+    if column.dtype.kind == 'f' and (column % 1 == 0).all():
+        column = column.astype(np.int64)
+    return column.astype(str)
+
+
+def _select(values, columns):
+    """
+    Entries of the list values at the indices columns, all of them if
+    columns is None
+    """
+    if columns is None:
+        return values
+    return [values[i] for i in columns]
+
+
+def _is_number(cell):
+    try:
+        float(cell)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_integer(cell):
+    try:
+        int(cell)
+        return True
+    except ValueError:
+        return False
+
+
+def _header_names(lines, first, last=None):
+    """
+    Names of the feature value columns of a CSV file, the cells from first
+    to last of its header line. None if the file is empty
+    """
+    if not lines:
+        return None
+    return [name.strip() for name in lines[0].strip().split(",")[first:last]]
+
+
+def _with_values(feats, segments, offsets, values):
+    """
+    Feature dictionary with the times of feats and the rows of values, in
+    the store layout of segments and offsets
+    """
+    result = {}
+    for i, (video_id, segment_id, _, _) in enumerate(segments):
+        segment_feats = feats.get(video_id, {}).get(segment_id)
+        if segment_feats is None:
+            continue
+        result.setdefault(video_id, {})[segment_id] = [
+            (feat[0], feat[1], values[offsets[i] + j])
+            for j, feat in enumerate(segment_feats)]
+    return result
+
+
+def _stacked_values(feats):
+    """
+    Values of a feature dictionary stacked in sorted segment order
+    """
+    return np.asarray([feat[2] for video_id in sorted(feats)
+                       for segment_id in sorted(feats[video_id])
+                       for feat in feats[video_id][segment_id]],
+                      dtype=np.float64)
+
+
+def token_counts(feats):
+    """
+    Column sums of the one-hot features of a modality, i.e. the number of
+    occurrences of every word or phoneme, None if there are no features
+    """
+    counts = None
+    for video_feats in feats.itervalues():
+        for segment_feats in video_feats.itervalues():
+            for feat in segment_feats or []:
+                if counts is None:
+                    counts = np.array(feat[2], dtype=np.float64)
+                else:
+                    counts += feat[2]
+    return counts
+
 
 class Dataset():
     """Primary class for loading and aligning dataset"""
 
-    def __init__(self, dataset_file, stored=False, timestamps='absolute'):
+    def __init__(self, dataset_file, stored=False, timestamps='absolute',
+                 profile_hook=None, prefetch_workers=0, prefetch_depth=32,
+                 prefetch_mb=256, shard=None, time_index=False,
+                 columns=None, shared=False, stats=None):
         """
         Initialise the Dataset class. Support two loading mechanism - 
-        from dataset files and from the pickle file, decided by the param
-        stored.
-        :param stored: True if loading from pickle, false if loading from 
-                       dataset feature files. Default False
+        from dataset files and from the pickle file or feature store, 
+        decided by the param stored.
+        :param stored: True if loading from pickle or feature store, false
+                       if loading from dataset feature files. Default False
         :param dataset_file: Filepath to the file required to load dataset 
-                             features. CSV or pickle file depending upon the
-                             loading mechanism
-        :timestamps: absolute or relative.
+                             features. CSV, pickle file or feature store
+                             directory depending upon the loading mechanism
+        :timestamps: absolute or relative. Features are always loaded with
+                     absolute times, relative times are a view computed
+                     when a segment is accessed (see features())
+        :param profile_hook: Optional callable, called after every loader
+                             and align_modality call as hook(stage,
+                             modality, method, filepath, seconds, frames).
+                             The counters of all calls are kept in
+                             self.stats, a loadstats.LoadStats object
+        :param prefetch_workers: Number of I/O threads reading the feature
+                                 files ahead of the loaders, 0 to read each
+                                 file when its loader needs it. Useful on
+                                 high-latency and network filesystems
+        :param prefetch_depth: Maximum number of files read ahead
+        :param prefetch_mb: Maximum size in MB of the files read ahead
+        :param shard: Optional tuple (i, N) to load only the i-th of N
+                      shards of the dataset, split by video_id (see
+                      video_shard). Used only when loading from the CSV
+        :param time_index: If True, load builds the per-video time index
+                           of every modality used by query. Otherwise a
+                           video is indexed on its first query
+        :param columns: Optional {modality: [columns]} selecting the feature
+                        columns to load, each a column name from the header
+                        of the feature files or an index into the feature
+                        values, e.g. {'modality_2': ['AU1', 'AU2', 3]}. The
+                        other columns are not converted. Used only when
+                        loading from the CSV
+        :param shared: If True and loading a feature store, e.g. one written
+                       by publish, the features are not copied: segments
+                       are read from the memory-mapped store when accessed,
+                       so all the processes attached to the store share one
+                       copy and loading only reads meta.json
+        :param stats: Optional groupby, global or video, or {modality:
+                      groupby}, to accumulate the statistics of
+                      compute_stats of the modalities while they are loaded
+                      from the CSV and aligned, without another pass over
+                      the features
         """
         self.feature_dict = None
         self.timestamps = timestamps
+        # Time base of self.feature_dict, absolute unless loaded from a
+        # pickle file, which holds the times it was saved with
+        self.feature_timestamps = 'absolute'
         self.stored = stored
+        self.shared = shared
         self.dataset_file = dataset_file
         self.phoneme_dict = utils.p2fa_phonemes
+        self.interval_cache = {}
+        self.stats = LoadStats(profile_hook)
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_mb = prefetch_mb
+        self.prefetcher = None
+        self.aligned_feature_dict = None
+        self.aligned_to = None
+        self.feature_stats = {}
+        self.labels = None
+        self.frame_cache = {}
+        self.build_time_index = time_index
+        self.time_index = {}
+        self.columns = columns or {}
+        # Selection of the modality being loaded, see select_columns
+        self.loading_columns = None
+        self.column_cache = {}
+        self.facet_schemas = {}
+        # {modality: {level: (intervals, means, coverage, offsets)}}, see
+        # build_pyramid
+        self.pyramids = {}
+        self.segment_positions = None
+        if shard is not None:
+            if (len(shard) != 2 or not 0 <= shard[0] < shard[1]):
+                raise ValueError("Param shard must be a tuple (i, N) with "
+                                 "0 <= i < N")
+            shard = (int(shard[0]), int(shard[1]))
+        self.shard = shard
+        for groupby in (stats.values() if isinstance(stats, dict)
+                        else [stats]):
+            if groupby not in (None, 'global', 'video'):
+                raise ValueError("Param stats must be 'global' or 'video'")
+        self.stats_groupby = stats
 
     def load(self):
         """
@@ -45,16 +248,780 @@ class Dataset():
          as dictionary key
         """
 
-        # Load from the pickle file if stored is True
-        if self.stored:
+        self.frame_cache = {}
+        self.time_index = {}
+        self.pyramids = {}
+        self.segment_positions = None
+        # Load from the feature store or pickle file if stored is True
+        if self.stored and store.is_store(self.dataset_file):
+            self.feature_dict = self.load_store(self.dataset_file,
+                                                self.shared)
+        elif self.stored:
             self.dataset_pickle = self.dataset_file
             self.feature_dict = pickle.load(open(self.dataset_pickle))
+            self.feature_timestamps = self.timestamps
             return self.feature_dict
+        else:
+            # Load the feature dictionary from the dataset files
+            self.dataset_csv = self.dataset_file
+            self.feature_dict = self.controller()
+
+        if self.build_time_index:
+            for modality, modality_feats in self.feature_dict.iteritems():
+                for video_id in modality_feats:
+                    self.video_index(modality, video_id)
+        return self.features()
+
+    def features(self, timestamps=None, feature_dict=None):
+        """
+        Loaded features with the requested timestamps. Switching between
+        absolute and relative timestamps does not reload or copy the
+        features, the times of a segment are shifted when it is accessed.
+        :param timestamps: absolute or relative, defaults to the timestamps
+                           passed to the constructor
+        :param feature_dict: Feature dictionary to present, defaults to the
+                             loaded features. Must be in the time base of
+                             self.feature_dict
+        :returns: self.feature_dict or a views.TimeShiftView of it
+        """
+        timestamps = timestamps or self.timestamps
+        if feature_dict is None:
+            feature_dict = self.feature_dict
+        if timestamps == self.feature_timestamps:
+            return feature_dict
+        return TimeShiftView(feature_dict, self.dataset_info, timestamps)
+
+    def load_store(self, store_path, shared=False):
+        """
+        Loads the feature dictionary from a feature store written by 
+        P2FA_Helper_v2(output_format='store') or store.write_store
+        :param store_path: Path to the feature store directory
+        :param shared: Return views.StoreView mappings reading the segments
+                       from the memory-mapped store instead of copies
+        :returns: Dictionary of features for the dataset with each modality 
+         as dictionary key
+        """
+        feature_store = store.FeatureStore(store_path)
+        self.dataset_info = feature_store.dataset_info()
+        self.modalities = {}
+        feat_dict = {}
+        aligned_feat_dict = {}
+        feat_names = {}
+        aligned_names = {}
+        for key, info in feature_store.modalities.iteritems():
+            stats = feature_store.stats(key)
+            if stats is not None:
+                self.feature_stats[key] = {"groupby": stats[0],
+                                           "groups": stats[1]}
+            if "joint_of" in info:
+                # Read with tensor.JointTensor.load
+                continue
+            if "pyramid_of" in info:
+                # Pyramid levels written by Dataset.save
+                level = info["width"]
+                level = (pyramid.SEGMENT_LEVEL
+                         if level == pyramid.SEGMENT_LEVEL else float(level))
+                intervals, means, offsets = feature_store.arrays(key)
+                self.pyramids.setdefault(str(info["pyramid_of"]), {})[
+                    level] = (intervals, means, feature_store.coverage(key),
+                              offsets)
+                continue
+            if "aligned_from" in info:
+                # Aligned features written by Dataset.save
+                self.aligned_to = str(info["aligned_to"])
+                aligned_names[str(info["aligned_from"])] = key
+                if not shared:
+                    aligned_feat_dict[str(info["aligned_from"])] = \
+                        feature_store.feature_dict(key)
+                continue
+            self.modalities[key] = {"type": str(info.get("type", key)),
+                                    "level": str(info.get("level", "s"))}
+            feat_names[key] = key
+            if not shared:
+                feat_dict[key] = feature_store.feature_dict(key)
+        if shared:
+            feat_dict = StoreView(feature_store, feat_names)
+            aligned_feat_dict = StoreView(feature_store, aligned_names)
+        if aligned_names:
+            self.aligned_feature_dict = aligned_feat_dict
+        return feat_dict
+
+    def save(self, store_path, normalize=False, quantize=None,
+             tolerance=None, modalities=None):
+        """
+        Write the loaded features, the aligned features of the last align
+        call, the pyramid levels of build_pyramid, the token counts of the
+        words and phonemes modalities and the statistics of compute_stats
+        into a feature store, which Dataset(store_path, stored=True) loads.
+        The stores of the shards of a dataset are combined with
+        store.merge_stores.
+        :param store_path: Path to the feature store directory
+        :param normalize: If True, the modalities with statistics are
+                          written normalized (see normalize)
+        :param quantize: Optional int8 or int16 to store all the modalities
+                         as integer codes with per-dimension scale and
+                         offset, or {name: int8 or int16} for some of them,
+                         aligned modalities being named aligned_<key>. The
+                         values are dequantized when the store is read
+        :param tolerance: Optional maximum absolute error allowed for the
+                          quantized loaded modalities, and for the features
+                          aligned from them if the dataset was aligned, as
+                          measured by quantization_report. ValueError is
+                          raised before writing if it is exceeded
+        :param modalities: Optional names of the modalities to write,
+                           aligned modalities being named aligned_<key>
+                           and pyramid levels pyramid_<level>_<key>.
+                           The other modalities of an existing store at
+                           store_path are kept
+        """
+        if self.feature_dict is None:
+            raise ValueError("Load the dataset before saving it")
+        if quantize and tolerance is not None:
+            self._check_quantization(quantize, tolerance, normalize)
+        writer = store.StoreWriter(store_path,
+                                   store.segment_order(self.dataset_info),
+                                   self.feature_timestamps)
+        for key, feats in self.feature_dict.iteritems():
+            if modalities is not None and key not in modalities:
+                continue
+            info = dict(self.modalities[key])
+            if info["type"] in ("words", "phonemes"):
+                counts = token_counts(feats)
+                if counts is not None:
+                    info["token_counts"] = counts.tolist()
+            self._save_modality(writer, key, feats, info, normalize,
+                                self._quantize_type(quantize, key))
+        for key, feats in (self.aligned_feature_dict or {}).iteritems():
+            if modalities is not None and "aligned_" + key not in modalities:
+                continue
+            info = dict(self.modalities[key])
+            info.update({"aligned_from": key, "aligned_to": self.aligned_to})
+            self._save_modality(writer, "aligned_" + key, feats, info,
+                                normalize,
+                                self._quantize_type(quantize,
+                                                    "aligned_" + key))
+        segments = store.segment_order(self.dataset_info)
+        for key, levels in self.pyramids.iteritems():
+            for level, (intervals, means, coverage, offsets) in \
+                    levels.iteritems():
+                name = "pyramid_" + pyramid.level_name(level) + "_" + key
+                if modalities is not None and name not in modalities:
+                    continue
+                intervals = np.array(intervals)
+                if self.feature_timestamps == 'relative':
+                    intervals += np.repeat([segment[2] for segment
+                                            in segments],
+                                           np.diff(offsets))[:, None]
+                info = dict(self.modalities[key])
+                info.update({"pyramid_of": key, "width": level})
+                writer.add_arrays(name, intervals, means, offsets, info)
+                writer.add_coverage(name, coverage)
+        writer.update_meta(shard=self.shard)
+        return writer
+
+    def publish(self, path=None, **save_args):
+        """
+        Write the loaded and aligned features into a feature store for
+        other processes to attach to with
+        Dataset(path, stored=True, shared=True).load(). The store is
+        written under a temporary name and renamed, so it is never attached
+        half written. By default it is written in shared memory (/dev/shm),
+        and it stays there until the directory is removed.
+        :param path: Path of the store, defaults to a new directory in
+                     /dev/shm, or in the temporary directory if there is no
+                     /dev/shm
+        :param save_args: Passed to save, e.g. quantize
+        :returns: path of the store
+        """
+        if path is None:
+            root = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            path = tempfile.mkdtemp(prefix="cmsdk-", dir=root)
+            os.rmdir(path)
+        elif os.path.exists(path):
+            raise IOError("Path " + path + " already exists")
+        tmp_path = tempfile.mkdtemp(prefix=".publish-",
+                                    dir=os.path.dirname(
+                                        os.path.abspath(path)))
+        self.save(tmp_path, **save_args)
+        os.rename(tmp_path, path)
+        return path
+
+    def _save_modality(self, writer, name, feats, info, normalize,
+                       quantize=None):
+        stats = self.feature_stats.get(name)
+        transform = None
+        if stats and normalize:
+            info["normalized"] = True
+            transform = self._stats_transform(name)
+        writer.add_modality(name, feats, info, transform=transform,
+                            quantize=quantize)
+        if stats:
+            writer.add_stats(name, stats["groupby"], stats["groups"])
+
+    def _quantize_type(self, quantize, name):
+        if isinstance(quantize, dict):
+            return quantize.get(name)
+        return quantize
+
+    def _check_quantization(self, quantize, tolerance, normalize):
+        failed = []
+        for quant_type in set(self._quantize_type(quantize, key)
+                              for key in self.feature_dict):
+            keys = [key for key in self.feature_dict
+                    if self._quantize_type(quantize, key) == quant_type]
+            if not quant_type or not keys:
+                continue
+            report = self.quantization_report(quant_type, keys,
+                                              self.aligned_to, tolerance,
+                                              normalize)
+            failed += [key for key in keys
+                       if not report[key]["within_tolerance"]]
+        if failed:
+            raise ValueError("Quantization error above " + str(tolerance)
+                             + " for " + ", ".join(sorted(failed)))
+
+    def quantization_report(self, quantize="int8", modalities=None,
+                            align_modality=None, tolerance=None,
+                            normalize=False):
+        """
+        Accuracy of storing modalities quantized, as save(quantize=...)
+        writes them, against storing them as float32.
+        :param quantize: int8 or int16
+        :param modalities: Modality keys, defaults to all the modalities
+        :param align_modality: Optional modality to align to, the features
+                               aligned from the dequantized values are then
+                               compared with those aligned from the float32
+                               values
+        :param tolerance: Optional maximum absolute error, of the aligned
+                          features if align_modality is given, else of the
+                          values
+        :param normalize: Measure the error of the normalized values, for
+                          the modalities with statistics (see save)
+        :returns: {modality: dictionary} with max_error, mean_error, rmse
+                  and nan_mismatch of the values (see
+                  quantization.error_stats), bound the largest possible
+                  error, bytes and float32_bytes the storage of the values,
+                  aligned_max_error, ... with align_modality, and
+                  within_tolerance with tolerance
+        """
+        if self.feature_dict is None:
+            raise ValueError("Load the dataset before measuring "
+                             "quantization")
+        segments = store.segment_order(self.dataset_info)
+        names = modalities or sorted(self.feature_dict)
+        report = {}
+        float_feats, quant_feats = {}, {}
+        for key in names:
+            feats = self.feature_dict[key]
+            _, values, offsets = store.modality_arrays(
+                feats, segments, self.feature_timestamps, np.float64)
+            if normalize and key in self.feature_stats:
+                transform = self._stats_transform(key)
+                for i, segment in enumerate(segments):
+                    lo, hi = offsets[i], offsets[i + 1]
+                    if lo < hi:
+                        values[lo:hi] = transform(segment[0], values[lo:hi])
+            stats = RunningStats(values.shape[1])
+            stats.update(values)
+            scale, offset = quantization.affine_params(stats.min, stats.max,
+                                                       quantize)
+            codes = quantization.quantize(values, scale, offset, quantize)
+            restored = quantization.dequantize(codes, scale, offset)
+            reference = values.astype(np.float32)
+            entry = quantization.error_stats(reference, restored)
+            entry.update({"bound": float(scale.max() / 2) if len(scale)
+                          else 0.0,
+                          "bytes": int(codes.nbytes),
+                          "float32_bytes": int(reference.nbytes)})
+            report[key] = entry
+            if align_modality is not None:
+                float_feats[key] = _with_values(feats, segments, offsets,
+                                                reference)
+                quant_feats[key] = _with_values(feats, segments, offsets,
+                                                restored)
+
+        if align_modality is not None:
+            alignments = self.get_alignments(align_modality)
+            shadow = copy.copy(self)
+            for key in names:
+                if key == align_modality:
+                    continue
+                shadow.feature_dict = float_feats
+                reference = _stacked_values(
+                    shadow.align_modality(key, alignments))
+                shadow.feature_dict = quant_feats
+                restored = _stacked_values(
+                    shadow.align_modality(key, alignments))
+                for name, value in quantization.error_stats(
+                        reference, restored).iteritems():
+                    report[key]["aligned_" + name] = value
+        if tolerance is not None:
+            for key, entry in report.iteritems():
+                error = entry.get("aligned_max_error", entry["max_error"])
+                entry["within_tolerance"] = error <= tolerance
+        return report
+
+    def to_arrow(self, modalities=None):
+        """
+        Arrow tables of the loaded features and of the aligned features of
+        the last align call, one long table per modality with one row per
+        frame (see columnar.py). Requires pyarrow.
+        :param modalities: Optional names of the modalities to convert,
+                           aligned modalities are named aligned_<key> as in
+                           the feature store
+        :returns: {name: pyarrow.Table}
+        """
+        if self.feature_dict is None:
+            raise ValueError("Load the dataset before exporting it")
+        segments = store.segment_order(self.dataset_info)
+        sources = [(key, feats, dict(self.modalities[key]))
+                   for key, feats in self.feature_dict.iteritems()]
+        for key, feats in (self.aligned_feature_dict or {}).iteritems():
+            info = dict(self.modalities[key])
+            info.update({"aligned_from": key, "aligned_to": self.aligned_to})
+            sources.append(("aligned_" + key, feats, info))
+        tables = {}
+        for name, feats, info in sources:
+            if modalities is not None and name not in modalities:
+                continue
+            intervals, values, offsets = store.modality_arrays(
+                feats, segments, self.feature_timestamps)
+            tables[name] = columnar.modality_table(segments, intervals,
+                                                   values, offsets, info)
+        return tables
 
-        # Load the feature dictionary from the dataset files
-        self.dataset_csv = self.dataset_file
-        self.feature_dict = self.controller()
-        return self.feature_dict
+    def to_parquet(self, path, modalities=None):
+        """
+        Write the tables of to_arrow as Parquet files <path>/<name>.parquet,
+        read back with columnar.read_parquet. Requires pyarrow.
+        :returns: {name: file path}
+        """
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        fpaths = {}
+        for name, table in self.to_arrow(modalities).iteritems():
+            fpaths[name] = os.path.join(path, name + ".parquet")
+            columnar.write_parquet(table, fpaths[name])
+        return fpaths
+
+    def to_tensor(self, modalities=None, dtype=np.float32):
+        """
+        Aligned features of the last align call in one contiguous array of
+        shape (steps, sum of dims), with the steps of every segment as
+        consecutive rows and every modality as a slice of columns (see
+        tensor.py). Segment and modality views of it need no copy.
+        :param modalities: Optional modality keys in column order, by
+                           default the modality the dataset was aligned to
+                           followed by the aligned modalities, sorted
+        :param dtype: dtype of the array
+        :returns: tensor.JointTensor, written into a store with its save
+                  method
+        """
+        if self.aligned_feature_dict is None:
+            raise ValueError("Align the dataset before building a tensor")
+        if modalities is None:
+            modalities = [self.aligned_to] + sorted(
+                key for key in self.aligned_feature_dict
+                if key != self.aligned_to)
+        sources = []
+        for key in modalities:
+            if key in self.aligned_feature_dict:
+                sources.append((key, self.aligned_feature_dict[key]))
+            elif key == self.aligned_to:
+                sources.append((key, self.feature_dict[key]))
+            else:
+                raise KeyError("Modality " + key + " is not aligned")
+        return tensor.joint_tensor(sources,
+                                   store.segment_order(self.dataset_info),
+                                   self.feature_timestamps, dtype)
+
+    def segments(self):
+        """
+        Segment index of the dataset, the order of the arrays returned by
+        load_labels and of the segments in a saved store
+        :returns: list of (video_id, segment_id)
+        """
+        return [(segment[0], segment[1])
+                for segment in store.segment_order(self.dataset_info)]
+
+    def load_labels(self, label_csv, video_col=0, segment_col=1,
+                    label_cols=2, header=None):
+        """
+        Read a label CSV and join it to the segments of the dataset in one
+        merge on (video_id, segment_id).
+        :param label_csv: Path to the label CSV, e.g. the MOSI
+                          OpinionLevelSentiment.csv with video_col=2,
+                          segment_col=3 and label_cols=4
+        :param video_col: Column of the video id, index or name
+        :param segment_col: Column of the segment id, index or name
+        :param label_cols: Column or list of columns of the labels
+        :param header: Passed to pandas.read_csv, None if the file has no
+                       header row
+        :returns: dictionary, also kept in self.labels, with
+                  segments    self.segments()
+                  values      array of labels aligned with segments, NaN
+                              where the label is missing. (n,) for one
+                              label column, (n, k) for k columns
+                  present     boolean array, True for labelled segments
+                  missing     list of segments without a label
+                  unmatched   list of labelled segments not in the dataset
+                  duplicates  number of label rows for an already
+                              labelled segment, the last one is kept
+        """
+        import pandas as pd
+        table = pd.read_csv(label_csv, header=header)
+        table = table.dropna(subset=[video_col, segment_col])
+        multiple = isinstance(label_cols, (list, tuple))
+        label_cols = list(label_cols) if multiple else [label_cols]
+        labels = pd.DataFrame({"video_id": table[video_col].astype(str),
+                               "segment_id": _id_strings(table[segment_col])})
+        value_names = ["label_" + str(i) for i in range(len(label_cols))]
+        for name, col in zip(value_names, label_cols):
+            labels[name] = table[col].values
+        duplicated = labels.duplicated(["video_id", "segment_id"],
+                                       keep="last")
+        labels = labels[~duplicated]
+
+        segments = self.segments()
+        index = pd.DataFrame({"video_id": [seg[0] for seg in segments],
+                              "segment_id": [seg[1] for seg in segments],
+                              "position": np.arange(len(segments))})
+        joined = pd.merge(index, labels, how="outer",
+                          on=["video_id", "segment_id"], indicator=True)
+        matched = joined[joined["_merge"] != "right_only"]
+        matched = matched.sort_values("position")
+        values = matched[value_names].values
+        if not multiple:
+            values = values[:, 0]
+        present = (matched["_merge"] == "both").values
+        unmatched = joined[joined["_merge"] == "right_only"]
+        self.labels = {
+            "segments": segments,
+            "values": values,
+            "present": present,
+            "missing": [segments[i] for i in np.flatnonzero(~present)],
+            "unmatched": zip(unmatched["video_id"], unmatched["segment_id"]),
+            "duplicates": int(duplicated.sum())}
+        return self.labels
+
+    def frame_arrays(self, modality, video_id, segment_id):
+        """
+        Features of a segment as arrays sorted by start time, converted
+        from the feature tuples once and cached until the next load.
+        :returns: tuple (starts, ends, values) of shapes (n,), (n,) and
+                  (n, dim), in the time base of self.feature_dict
+        """
+        key = (modality, video_id, segment_id)
+        if key not in self.frame_cache:
+            feats = self.feature_dict[modality][video_id][segment_id] or []
+            intervals, values = store.segment_arrays(feats, dtype=np.float64)
+            order = np.argsort(intervals[:, 0], kind="mergesort")
+            self.frame_cache[key] = (intervals[order, 0], intervals[order, 1],
+                                     values[order])
+        return self.frame_cache[key]
+
+    def video_index(self, modality, video_id):
+        """
+        Time index of the frames of a video in a modality: the frames of
+        all its segments, once each, sorted by start time, with the running
+        maximum of the end times. Built on first use and cached until the
+        next load.
+        :returns: tuple (starts, ends, values, max_ends)
+        """
+        key = (modality, video_id)
+        if key not in self.time_index:
+            if self.feature_timestamps != 'absolute':
+                raise ValueError("Time queries need features loaded with "
+                                 "absolute timestamps")
+            feats = []
+            for segment_feats in \
+                    self.feature_dict[modality][video_id].itervalues():
+                feats.extend(segment_feats or [])
+            intervals, values = store.segment_arrays(feats,
+                                                     dtype=np.float64)
+            order = np.lexsort((intervals[:, 1], intervals[:, 0]))
+            intervals, values = intervals[order], values[order]
+            # Frames windowed into several overlapping segments are kept once
+            keep = np.ones(len(intervals), dtype=bool)
+            keep[1:] = np.any(intervals[1:] != intervals[:-1], axis=1)
+            intervals, values = intervals[keep], values[keep]
+            starts = np.ascontiguousarray(intervals[:, 0])
+            ends = np.ascontiguousarray(intervals[:, 1])
+            max_ends = np.maximum.accumulate(ends) if len(ends) else ends
+            self.time_index[key] = (starts, ends, values, max_ends)
+        return self.time_index[key]
+
+    def query(self, modality, video_id, t0, t1, overlap=False):
+        """
+        Frames of a video in the time range [t0, t1), independent of the
+        segments of the config, found by binary search in O(log n + k).
+        :param modality: Modality key
+        :param video_id: Video id
+        :param t0: Start of the range in seconds from the video start
+        :param t1: End of the range
+        :param overlap: If False, the frames starting in [t0, t1). If True,
+                        the frames from the first one ending after t0 to
+                        the last one starting before t1, which are the
+                        frames overlapping the range when frames do not
+                        contain each other
+        :returns: tuple (starts, ends, values) of views into the index,
+                  not copies
+        """
+        starts, ends, values, max_ends = self.video_index(modality, video_id)
+        if overlap:
+            lo = np.searchsorted(max_ends, t0, "right")
+        else:
+            lo = np.searchsorted(starts, t0, "left")
+        hi = max(lo, np.searchsorted(starts, t1, "left"))
+        return starts[lo:hi], ends[lo:hi], values[lo:hi]
+
+    def window_stats(self, modality, window, hop,
+                     stats=("mean", "std", "min", "max")):
+        """
+        Sliding window functionals of a modality, e.g. the mean and std of
+        OpenFace features over 1 s windows every 0.5 s, computed with
+        prefix sums and reduceat over the frames of every segment (see
+        windows.py).
+        :param modality: Modality key
+        :param window: Window length in seconds
+        :param hop: Time between window starts in seconds
+        :param stats: Functionals among mean, std, min, max and count
+        :returns: {video_id: {segment_id: [(window_start, window_end,
+                  values)]}} where values concatenates the functionals in
+                  the order of stats, NaN for windows without frames
+        """
+        result = {}
+        for video_id, video_feats in self.feature_dict[modality].iteritems():
+            result[video_id] = {}
+            for segment_id in video_feats:
+                segment_data = self.dataset_info[video_id][segment_id]
+                start, end = segment_data["start"], segment_data["end"]
+                if self.feature_timestamps == 'relative':
+                    start, end = 0.0, end - start
+                starts, _, values = self.frame_arrays(modality, video_id,
+                                                      segment_id)
+                window_starts, window_ends = windows.window_bounds(
+                                                start, end, window, hop)
+                if not len(values):
+                    result[video_id][segment_id] = []
+                    continue
+                functionals = windows.window_stats(starts, values,
+                                                   window_starts,
+                                                   window_ends, stats)
+                result[video_id][segment_id] = [
+                    (window_starts[i], window_ends[i], functionals[i])
+                    for i in range(len(window_starts))]
+        return self.features(feature_dict={modality: result})[modality]
+
+    def build_pyramid(self, modality, widths=(0.1, 0.5,
+                                              pyramid.SEGMENT_LEVEL)):
+        """
+        Multi-resolution pyramid of a modality: for every level, bins of a
+        fixed width over every segment holding the time-weighted means of
+        the frames, the features align_modality gives for the bins, and the
+        time covered by frames (see pyramid.py). Only the finest level is
+        computed from the frames, a level is otherwise added up from the
+        widest built level whose width divides its own. Levels built
+        before, or loaded from a store, are reused, so adding a level to a
+        pyramid costs O(bins).
+        :param modality: Modality key
+        :param widths: Bin widths in seconds, and pyramid.SEGMENT_LEVEL for
+                       one bin per segment
+        :returns: {level: (intervals, means, coverage, offsets)} in the
+                  store layout and the time base of self.feature_dict,
+                  also kept in self.pyramids and written by save
+        """
+        if self.feature_dict is None:
+            raise ValueError("Load the dataset before building a pyramid")
+        levels = self.pyramids.setdefault(modality, {})
+        numeric = sorted(width for width in widths
+                         if width != pyramid.SEGMENT_LEVEL)
+        if pyramid.SEGMENT_LEVEL in widths:
+            numeric.append(pyramid.SEGMENT_LEVEL)
+        for width in numeric:
+            if width in levels:
+                continue
+            # Widest finer level that divides width, any level for the
+            # segment level
+            sources = [level for level in levels
+                       if level != pyramid.SEGMENT_LEVEL and (
+                           width == pyramid.SEGMENT_LEVEL
+                           or (level < width and abs(
+                               float(width) / level
+                               - round(float(width) / level)) < 1e-6))]
+            if not sources:
+                levels[width] = self._integrate_level(modality, width)
+                continue
+            source = max(sources)
+            factor = (None if width == pyramid.SEGMENT_LEVEL
+                      else int(round(float(width) / source)))
+            intervals, means, coverage, offsets = levels[source]
+            lengths = intervals[:, 1] - intervals[:, 0]
+            integrals = np.where(lengths[:, None] > 0,
+                                 means * lengths[:, None], 0.0)
+            intervals, integrals, coverage, offsets = pyramid.coarsen(
+                intervals, integrals, np.asarray(coverage), offsets, factor)
+            levels[width] = (intervals,
+                             pyramid.means(intervals, integrals, coverage),
+                             coverage, offsets)
+        return dict((width, levels[width]) for width in widths)
+
+    def _integrate_level(self, modality, width):
+        segments = store.segment_order(self.dataset_info)
+        frames = []
+        dim = 0
+        for video_id, segment_id, start, end in segments:
+            segment_feats = self.feature_dict[modality].get(video_id, {})
+            if segment_id in segment_feats:
+                starts, ends, values = self.frame_arrays(modality, video_id,
+                                                         segment_id)
+            else:
+                starts = ends = values = np.zeros(0)
+            if self.feature_timestamps == 'relative':
+                start, end = 0.0, end - start
+            frames.append((starts, ends, values,
+                           pyramid.bin_edges(start, end, width)))
+            if len(values):
+                dim = values.shape[1]
+        offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum([len(edges) - 1 for _, _, _, edges in frames],
+                  out=offsets[1:])
+        intervals = np.empty((offsets[-1], 2))
+        integrals = np.zeros((offsets[-1], dim))
+        coverage = np.zeros(offsets[-1])
+        for i, (starts, ends, values, edges) in enumerate(frames):
+            lo, hi = offsets[i], offsets[i + 1]
+            intervals[lo:hi, 0] = edges[:-1]
+            intervals[lo:hi, 1] = edges[1:]
+            if len(values):
+                integrals[lo:hi], coverage[lo:hi] = pyramid.integrate(
+                    starts, ends, values, edges)
+        return (intervals, pyramid.means(intervals, integrals, coverage),
+                coverage, offsets)
+
+    def pyramid_segment(self, modality, level, video_id, segment_id,
+                        normalize="interval"):
+        """
+        Bins of a segment at a level of build_pyramid, in O(1): the level
+        arrays are sliced at the offsets of the segment.
+        :param level: Bin width in seconds or pyramid.SEGMENT_LEVEL
+        :param normalize: interval for the means of align_modality, the
+                          time integral over the bin length, or coverage
+                          for the mean over the time covered by frames
+        :returns: tuple (intervals, values) of shapes (bins, 2) and
+                  (bins, dim)
+        """
+        if level not in self.pyramids.get(modality, {}):
+            raise KeyError("No pyramid level " + pyramid.level_name(level)
+                           + " for " + modality + ", call build_pyramid "
+                           "first")
+        if self.segment_positions is None:
+            self.segment_positions = dict(
+                (segment, i) for i, segment in enumerate(self.segments()))
+        i = self.segment_positions[(video_id, segment_id)]
+        intervals, means, coverage, offsets = self.pyramids[modality][level]
+        lo, hi = offsets[i], offsets[i + 1]
+        if normalize == "interval":
+            return intervals[lo:hi], means[lo:hi]
+        seg_intervals = np.asarray(intervals[lo:hi])
+        lengths = seg_intervals[:, 1] - seg_intervals[:, 0]
+        return seg_intervals, pyramid.means(
+            seg_intervals, means[lo:hi] * lengths[:, None], coverage[lo:hi],
+            normalize)
+
+    def compute_stats(self, modalities=None, groupby='global',
+                      aligned=False):
+        """
+        Per-dimension count, mean, variance, min and max of modalities,
+        accumulated segment by segment in a single streaming pass with
+        normalization.RunningStats. NaN and infinite values are left out.
+        :param modalities: Modality keys, defaults to all the modalities
+        :param groupby: global for one set of statistics per modality,
+                        video for one set per video
+        :param aligned: Use the aligned features of the last align call
+        :returns: {modality: {group: RunningStats}} where group is 'global'
+                  or the video id. Also kept in self.feature_stats and
+                  written by save. The param stats of the constructor
+                  accumulates them during load and align instead
+        """
+        if groupby not in ('global', 'video'):
+            raise ValueError("Param groupby must be 'global' or 'video'")
+        source = self.aligned_feature_dict if aligned else self.feature_dict
+        if source is None:
+            raise ValueError("Load " + ("and align " if aligned else "")
+                             + "the dataset before computing statistics")
+        result = {}
+        for modality in (modalities or sorted(source)):
+            key = "aligned_" + modality if aligned else modality
+            self.feature_stats[key] = {"groupby": groupby, "groups": {}}
+            for video_id, video_feats in source[modality].iteritems():
+                for segment_feats in video_feats.itervalues():
+                    self.update_stats(key, video_id, segment_feats)
+            result[modality] = self.feature_stats[key]["groups"]
+        return result
+
+    def reset_stats(self, modality, key):
+        """
+        Start the statistics of key if the param stats of the constructor
+        selects modality
+        :returns: key, or None if the statistics are not accumulated
+        """
+        groupby = self.stats_groupby
+        if isinstance(groupby, dict):
+            groupby = groupby.get(modality)
+        if groupby is None:
+            return None
+        self.feature_stats[key] = {"groupby": groupby, "groups": {}}
+        return key
+
+    def update_stats(self, key, video_id, segment_feats):
+        """
+        Add the values of a segment to the statistics of key
+        """
+        if not segment_feats:
+            return
+        stats = self.feature_stats[key]
+        group = 'global' if stats["groupby"] == 'global' else video_id
+        values = np.asarray([feat[2] for feat in segment_feats],
+                            dtype=np.float64)
+        if group not in stats["groups"]:
+            stats["groups"][group] = RunningStats(values.shape[1])
+        stats["groups"][group].update(values)
+
+    def _stats_transform(self, key):
+        stats = self.feature_stats[key]
+        groups = stats["groups"]
+        if stats["groupby"] == 'global':
+            return lambda video_id, values: groups['global'].apply(values)
+        return lambda video_id, values: groups[video_id].apply(values)
+
+    def normalize(self, modality, aligned=False):
+        """
+        Features of a modality normalized to zero mean and unit variance
+        with the statistics of compute_stats, one vectorized operation per
+        segment. NaN and infinite values become 0.
+        :param aligned: Normalize the aligned features of the modality
+        :returns: {video_id: {segment_id: [tuples]}} with float32 values
+        """
+        key = "aligned_" + modality if aligned else modality
+        if key not in self.feature_stats:
+            raise KeyError("No statistics for " + key + ", call "
+                           "compute_stats first")
+        transform = self._stats_transform(key)
+        source = self.aligned_feature_dict if aligned else self.feature_dict
+        normalized = {}
+        for video_id, video_feats in source[modality].iteritems():
+            normalized[video_id] = {}
+            for segment_id, segment_feats in video_feats.iteritems():
+                if not segment_feats:
+                    normalized[video_id][segment_id] = segment_feats
+                    continue
+                values = transform(video_id, [feat[2] for feat
+                                              in segment_feats])
+                normalized[video_id][segment_id] = [
+                    (feat[0], feat[1], values[i])
+                    for i, feat in enumerate(segment_feats)]
+        return self.features(feature_dict={modality: normalized})[modality]
 
     def controller(self):
         """
@@ -63,6 +1030,7 @@ class Dataset():
         """
 
         def validate_file(self):
+            import pandas as pd
             data = pd.read_csv(self.dataset_csv, header=None)
             data = np.asarray(data)
             #data = data[:,:7]
@@ -79,6 +1047,9 @@ class Dataset():
             for record in data[2:]:
                 video_id = str(record[0])
                 segment_id = str(record[1])
+                if (self.shard and video_shard(video_id, self.shard[1])
+                        != self.shard[0]):
+                    continue
                 if video_id not in self.dataset_info:
                     self.dataset_info[video_id] = {}
                 if segment_id in self.dataset_info[video_id]:
@@ -93,27 +1064,58 @@ class Dataset():
                 self.dataset_info[video_id][segment_id] = segment_data
             return
 
+        def load_plan(self):
+            # One task per loader call, in the order of the calls
+            tasks = []
+            for key in self.modalities:
+                for video_id, video_data in self.dataset_info.iteritems():
+                    for segment_id, segment_data in video_data.iteritems():
+                        tasks.append((key, video_id, segment_id,
+                                      str(segment_data[key]),
+                                      segment_data["start"],
+                                      segment_data["end"]))
+            return tasks
+
         def load_features(self):
-            feat_dict = {}
-            data = self.dataset_info
+            feat_dict = dict((key, {}) for key in self.modalities)
             modalities = self.modalities
-            timestamps = self.timestamps
-            for key, value in modalities.iteritems():
-                api = value['type']
-                level = value['level']
-                loader_method = Dataset.__dict__["load_" + api]
-                modality_feats = {}
-                print "Loading features for ", api
-                for video_id, video_data in data.iteritems():
-                    video_feats = {}
-                    for segment_id, segment_data in video_data.iteritems():
-                        filepath = str(segment_data[key])
-                        start = segment_data["start"]
-                        end = segment_data["end"]
-                        video_feats[segment_id] = loader_method(self,
-                                                                filepath, start, end, timestamps, level)
-                    modality_feats[video_id] = video_feats
-                feat_dict[key] = modality_feats
+            tasks = load_plan(self)
+            stats_keys = dict((key, self.reset_stats(key, key))
+                              for key in modalities)
+            if self.prefetch_workers:
+                self.prefetcher = Prefetcher([task[3] for task in tasks],
+                                             self.prefetch_workers,
+                                             self.prefetch_depth,
+                                             self.prefetch_mb << 20)
+            try:
+                current = None
+                for position, task in enumerate(tasks):
+                    key, video_id, segment_id, filepath, start, end = task
+                    if key != current:
+                        current = key
+                        self.stats.end()
+                        api = modalities[key]['type']
+                        level = modalities[key]['level']
+                        loader_method = Dataset.__dict__["load_" + api]
+                        self.loading_columns = self.columns.get(key)
+                        print "Loading features for ", api
+                        self.stats.begin("load", key, "load_" + api)
+                    if self.prefetcher:
+                        self.prefetcher.advance(position)
+                    call_start = time.time()
+                    feats = loader_method(self, filepath, start, end,
+                                          'absolute', level)
+                    self.stats.call(filepath, time.time() - call_start,
+                                    len(feats or []))
+                    feat_dict[key].setdefault(video_id, {})[segment_id] = feats
+                    if stats_keys[key]:
+                        self.update_stats(key, video_id, feats)
+                self.stats.end()
+            finally:
+                self.loading_columns = None
+                if self.prefetcher:
+                    self.prefetcher.close()
+                    self.prefetcher = None
 
             return feat_dict
 
@@ -122,6 +1124,114 @@ class Dataset():
 
         return feat_dict
 
+    def prefetched(self, filepath):
+        """
+        Content of filepath read ahead by the prefetcher, None if the file
+        was not read ahead
+        """
+        if self.prefetcher is None:
+            return None
+        return self.prefetcher.take(filepath)
+
+    def read_lines(self, filepath):
+        """
+        Read the lines of a text feature file, counting the file, its size
+        and its lines to self.stats
+        """
+        content = self.prefetched(filepath)
+        if content is not None:
+            lines = BytesIO(content).readlines()
+        else:
+            with open(filepath, 'r') as f_handle:
+                lines = f_handle.readlines()
+        self.stats.file_read(filepath, sum(len(line) for line in lines),
+                             len(lines))
+        return lines
+
+    def read_mat(self, filepath):
+        """
+        Read the features matrix of a .mat feature file, counting the file,
+        its size and the matrix rows to self.stats
+        """
+        from scipy.io import loadmat
+        content = self.prefetched(filepath)
+        if content is not None:
+            feats = loadmat(BytesIO(content))['features']
+        else:
+            feats = loadmat(filepath)['features']
+        self.stats.file_read(filepath, os.path.getsize(filepath),
+                             feats.shape[0])
+        return feats
+
+    def select_columns(self, names=None):
+        """
+        Indices into the feature values of the columns selected (param
+        columns) for the modality being loaded, resolved once per header.
+        :param names: Names of the feature value columns from the header of
+                      the file, None if it has no header
+        :returns: list of indices, None to keep all the columns
+        """
+        selection = self.loading_columns
+        if selection is None:
+            return None
+        key = (tuple(selection), tuple(names) if names is not None else None)
+        if key not in self.column_cache:
+            indices = []
+            for column in selection:
+                if isinstance(column, (int, long, np.integer)):
+                    if names is not None and not (-len(names) <= column
+                                                  < len(names)):
+                        raise IndexError("Column index " + str(column)
+                                         + " out of range")
+                    indices.append(int(column))
+                elif names is None:
+                    raise ValueError("Column " + str(column) + " selected "
+                                     "by name in a file without header")
+                elif column not in names:
+                    raise KeyError("Column " + str(column) + " not in the "
+                                   "file header")
+                else:
+                    indices.append(names.index(column))
+            self.column_cache[key] = indices
+        return self.column_cache[key]
+
+    def read_interval_file(self, filepath, start_col, end_col, value_col):
+        """
+        Parse a video level time-distributed CSV file once and index its
+        intervals. The last file read is kept, as consecutive segments of a
+        video share the file.
+        :param start_col: Column of the feature start time
+        :param end_col: Column of the feature end time
+        :param value_col: First column of the feature values
+        :returns: tuple (feat_starts, feat_ends, feats, index) where feats
+                  is a 2D array and index an intervals.IntervalIndex
+        """
+        columns = self.select_columns()
+        key = (filepath, start_col, end_col, value_col,
+               None if columns is None else tuple(columns))
+        if key in self.interval_cache:
+            return self.interval_cache[key]
+
+        feat_starts, feat_ends, feats = [], [], []
+        for line in self.read_lines(filepath):
+            line = line.strip()
+            if not line:
+                break
+            splits = line.split(",")
+            feat_starts.append(float(splits[start_col]))
+            feat_ends.append(float(splits[end_col]))
+            feats.append([float(val) for val
+                          in _select(splits[value_col:], columns)])
+        feat_starts = np.asarray(feat_starts)
+        feat_ends = np.asarray(feat_ends)
+        feats = np.asarray(feats)
+        if feats.dtype == object:
+            # Rows of different lengths are kept as separate arrays
+            feats = [np.asarray(feat_val) for feat_val in feats]
+        index = IntervalIndex(feat_starts, feat_ends)
+        self.interval_cache = {key: (feat_starts, feat_ends, feats, index)}
+        return self.interval_cache[key]
+
     def load_opensmile(self, filepath, start, end, timestamps='absolute', level='s'):
         """
         Load OpenSmile Features from the file corresponding to the param
@@ -144,8 +1254,12 @@ class Dataset():
             end_time = end - start
 
         if level == 's' or start == 0.0:
-            feats = open(filepath).readlines()[-1].strip().split(',')[1:]
-            feats = [float(feat_val) for feat_val in feats]
+            lines = self.read_lines(filepath)
+            names = [line.split()[1] for line in lines
+                     if line.lower().startswith("@attribute")][1:]
+            columns = self.select_columns(names or None)
+            feats = lines[-1].strip().split(',')[1:]
+            feats = [float(feat_val) for feat_val in _select(feats, columns)]
             feat_val = np.asarray(feats, dtype=np.float32)
             features.append((start_time, end_time, feat_val))
         else:
@@ -168,8 +1282,10 @@ class Dataset():
         """
         features = []
         time_period = 0.01
-        f_content = loadmat(filepath)
-        feats = f_content['features']
+        feats = self.read_mat(filepath)
+        columns = self.select_columns()
+        if columns is not None:
+            feats = feats[:, columns]
         start_time, end_time = start, end
         if timestamps == "relative":
             start_time, end_time = 0.0, end - start
@@ -212,37 +1328,24 @@ class Dataset():
             start_time, end_time = 0.0, end - start
 
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1]) + start_time
-                    feat_end = float(line.split(",")[2]) + start_time
-                    feat_val = [float(val) for val in line.split(",")[3:]]
-                    feat_val = np.asarray(feat_val)
-                    features.append((feat_start, feat_end, feat_val))
+            columns = self.select_columns()
+            for line in self.read_lines(filepath):
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[1]) + start_time
+                feat_end = float(line.split(",")[2]) + start_time
+                feat_val = [float(val) for val
+                            in _select(line.split(",")[3:], columns)]
+                feat_val = np.asarray(feat_val)
+                features.append((feat_start, feat_end, feat_val))
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-                    feat_end = float(line.split(",")[2])
-                    feat_time = feat_end - feat_start
-                    if ((feat_start <= start and feat_end > end)
-                        or (feat_start >= start and feat_end < end)
-                        or (feat_start <= start
-                            and start - feat_start < feat_time / 2)
-                        or (feat_start >= start
-                            and end - feat_start > feat_time / 2)):
-
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_end - start + start_time
-                        feat_val = [float(val) for val in line.split(",")[3:]]
-                        feat_val = np.asarray(feat_val)
-                        features.append((feat_start, feat_end, feat_val))
+            feat_starts, feat_ends, feats, index = self.read_interval_file(
+                                                    filepath, 1, 2, 3)
+            for i in index.window(start, end):
+                feat_start = feat_starts[i] - start + start_time
+                feat_end = feat_ends[i] - start + start_time
+                features.append((feat_start, feat_end, feats[i]))
         return features
 
     def load_embeddings(self, filepath, start, end, timestamps='absolute', level='v'):
@@ -264,37 +1367,24 @@ class Dataset():
             start_time, end_time = 0.0, end - start
 
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0]) + start_time
-                    feat_end = float(line.split(",")[1]) + start_time
-                    feat_val = [float(val) for val in line.split(",")[2:]]
-                    feat_val = np.asarray(feat_val)
-                    features.append((feat_start, feat_end, feat_val))
+            columns = self.select_columns()
+            for line in self.read_lines(filepath):
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[0]) + start_time
+                feat_end = float(line.split(",")[1]) + start_time
+                feat_val = [float(val) for val
+                            in _select(line.split(",")[2:], columns)]
+                feat_val = np.asarray(feat_val)
+                features.append((feat_start, feat_end, feat_val))
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-                    feat_end = float(line.split(",")[2])
-                    feat_time = feat_end - feat_start
-                    if ((feat_start <= start and feat_end > end)
-                        or (feat_start >= start and feat_end < end)
-                        or (feat_start <= start
-                            and start - feat_start < feat_time / 2)
-                        or (feat_start >= start
-                            and end - feat_start > feat_time / 2)):
-
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_end - start + start_time
-                        feat_val = [float(val) for val in line.split(",")[3:]]
-                        feat_val = np.asarray(feat_val)
-                        features.append((feat_start, feat_end, feat_val))
+            feat_starts, feat_ends, feats, index = self.read_interval_file(
+                                                    filepath, 1, 2, 3)
+            for i in index.window(start, end):
+                feat_start = feat_starts[i] - start + start_time
+                feat_end = feat_ends[i] - start + start_time
+                features.append((feat_start, feat_end, feats[i]))
         return features
 
     def load_words(self, filepath, start, end, timestamps='absolute', level='v'):
@@ -316,39 +1406,26 @@ class Dataset():
             start_time, end_time = 0.0, end - start
 
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0]) + start_time
-                    feat_end = float(line.split(",")[1]) + start_time
-                    feat_val = [float(val) for val in line.split(",")[2:]]
-                    feat_val = np.asarray(feat_val)
-                    #print (feat_start, feat_end)
-                    #assert False
-                    features.append((feat_start, feat_end, feat_val))
+            columns = self.select_columns()
+            for line in self.read_lines(filepath):
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[0]) + start_time
+                feat_end = float(line.split(",")[1]) + start_time
+                feat_val = [float(val) for val
+                            in _select(line.split(",")[2:], columns)]
+                feat_val = np.asarray(feat_val)
+                #print (feat_start, feat_end)
+                #assert False
+                features.append((feat_start, feat_end, feat_val))
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-                    feat_end = float(line.split(",")[2])
-                    feat_time = feat_end - feat_start
-                    if ((feat_start <= start and feat_end > end)
-                        or (feat_start >= start and feat_end < end)
-                        or (feat_start <= start
-                            and start - feat_start < feat_time / 2)
-                        or (feat_start >= start
-                            and end - feat_start > feat_time / 2)):
-
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_end - start + start_time
-                        feat_val = [float(val) for val in line.split(",")[3:]]
-                        feat_val = np.asarray(feat_val)
-                        features.append((feat_start, feat_end, feat_val))
+            feat_starts, feat_ends, feats, index = self.read_interval_file(
+                                                    filepath, 1, 2, 3)
+            for i in index.window(start, end):
+                feat_start = feat_starts[i] - start + start_time
+                feat_end = feat_ends[i] - start + start_time
+                features.append((feat_start, feat_end, feats[i]))
         return features
 
     def load_openface(self, filepath, start, end, timestamps='absolute', level='v'):
@@ -371,95 +1448,188 @@ class Dataset():
         if timestamps == "relative":
             start_time, end_time = 0.0, end - start
 
+        lines = self.read_lines(filepath)
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0]) + start_time
+            columns = self.select_columns(_header_names(lines, 1))
+            for line in lines[1:]:
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[0]) + start_time
+                feat_end = feat_start + time_period
+                feat_val = [float(val) for val
+                            in _select(line.split(",")[1:], columns)]
+                feat_val = np.asarray(feat_val, dtype=np.float32)
+                features.append((feat_start, feat_end, feat_val))
+
+        else:
+            columns = self.select_columns(_header_names(lines, 2))
+            for line in lines[1:]:
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[1])
+
+                if (feat_start >= start and feat_start < end):
+                    # To adjust the timestamps
+                    feat_start = feat_start - start + start_time
                     feat_end = feat_start + time_period
-                    feat_val = [float(val) for val in line.split(",")[1:]]
+                    feat_val = [float(val) for val
+                                in _select(line.split(",")[2:], columns)]
                     feat_val = np.asarray(feat_val, dtype=np.float32)
                     features.append((feat_start, feat_end, feat_val))
-
-        else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-
-                    if (feat_start >= start and feat_start < end):
-                        # To adjust the timestamps
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_start + time_period
-                        feat_val = [float(val) for val in line.split(",")[2:]]
-                        feat_val = np.asarray(feat_val, dtype=np.float32)
-                        features.append((feat_start, feat_end, feat_val))
         return features
 
-    def load_old_facet(self, filepath, start, end, timestamps='absolute', level='v'):
+    def facet_schema(self, filepath, lines, layout=None):
         """
-        Load FACET features from the file corresponding to the param 
-        filepath
-        :param start: Start time of the segment
-        :param end: End time of the segment
-        :param filepath: Path to the opensmile feature files
-        :param level: 's' if the file contains features only for the segment,
-                      i.e. interval (start, end), 'v' if for the entire video 
-        :param timestamps: relative or absolute
-        :returns: List of tuples (feat_start, feat_end, feat_value)
-                  corresponding to the features in the interval.
+        Layout of a FACET CSV file, cached per file. The FACET exports
+        differ in whether they have a header, in the column of the frame
+        time, which a frame number may precede, and in a trailing comma on
+        every line. A layout of FACET_LAYOUTS is used as is, otherwise the
+        layout is detected from the first lines: the time column is named
+        in the header, or it is column 0 when that holds floats, or column
+        1 when column 0 is a strictly increasing frame number followed by
+        floats. ValueError is raised for any other file.
+        :param lines: First lines of the file, the header if any and at
+                      least one row of features
+        :param layout: Optional key of FACET_LAYOUTS
+        :returns: dictionary with header (True if the first line is a
+                  header), time_col, first and last (the feature value
+                  columns first to last - 1) and names (the header names of
+                  the value columns, None without header)
         """
-        features = []
-        time_period = 0.03333
-
-        start_time, end_time = start, end
-        if timestamps == "relative":
-            start_time, end_time = 0.0, end - start
-
-        if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0]) + start_time
-                    feat_end = feat_start + time_period
-                    feat_val = [float(val) for val in line.split(",")[1:]]
-                    feat_val = np.asarray(feat_val, dtype=np.float32)
-                    features.append((feat_start, feat_end, feat_val))
-
+        if (filepath, layout) in self.facet_schemas:
+            return self.facet_schemas[(filepath, layout)]
+        lines = [line.strip() for line in lines if line.strip()]
+        if layout is not None:
+            fixed = FACET_LAYOUTS[layout]
+            header = fixed["header"]
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
+            header = not _is_number(lines[0].split(",")[0])
+        rows = [line.split(",") for line in lines[int(header):]]
+        if not rows:
+            raise ValueError("No features in FACET file " + filepath)
+
+        if layout is not None:
+            time_col = fixed["time_col"]
+            last = len(rows[0]) - fixed["trailing"]
+        else:
+            time_col = None
+            if header:
+                names = [name.strip().lower()
+                         for name in lines[0].split(",")]
+                for i, name in enumerate(names):
+                    if name in FACET_TIME_NAMES:
+                        time_col = i
                         break
-                    feat_start = float(line.split(",")[0])
-
-                    if (feat_start >= start and feat_start < end):
-                        # To adjust the timestamps
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_start + time_period
-                        feat_val = [float(val) for val in line.split(",")[1:]]
-                        feat_val = np.asarray(feat_val, dtype=np.float32)
-                        features.append((feat_start, feat_end, feat_val))
-        return features
-
-    # note that this is implicity new facet
-    def load_facet(self, filepath, start, end, timestamps='absolute', level='v'):
+            if time_col is None:
+                time_col = self._sniff_time_col(filepath, rows)
+            last = len(rows[0])
+            if rows[0][-1].strip() == "":
+                last -= 1
+        schema = {"header": header, "time_col": time_col,
+                  "first": time_col + 1, "last": last,
+                  "names": (_header_names(lines, time_col + 1, last)
+                            if header else None)}
+        self.facet_schemas[(filepath, layout)] = schema
+        return schema
+
+    def _sniff_time_col(self, filepath, rows):
+        def floats(col):
+            cells = [row[col].strip() if len(row) > col else ""
+                     for row in rows]
+            return (all(_is_number(cell) for cell in cells)
+                    and not all(_is_integer(cell) for cell in cells))
+
+        frames = [row[0].strip() for row in rows]
+        if all(_is_integer(frame) for frame in frames):
+            # Frame numbers, with gaps where FACET dropped frames
+            counted = all(int(frames[i + 1]) > int(frames[i])
+                          for i in range(len(frames) - 1))
+            if counted and len(rows[0]) > 2 and floats(1):
+                return 1
+        elif floats(0):
+            return 0
+        raise ValueError("Cannot detect the time column of FACET file "
+                         + filepath + ", load it with one of "
+                         + ", ".join("load_" + key
+                                     for key in sorted(FACET_LAYOUTS)))
+
+    def read_facet_file(self, filepath, layout=None):
+        """
+        Parse a FACET CSV file of any of the FACET layouts in bulk, see
+        facet_schema for param layout. Cells
+        that are not numbers, e.g. left empty when no face is detected,
+        become FACET_FILL_VALUE; cells written as NaN stay NaN. The last
+        file read is kept, as consecutive segments of a video share it.
+        :returns: tuple (feat_starts, feats) where feats is a float32
+                  array (frames, dim)
+        """
+        import pandas as pd
+        key = (filepath, "facet", layout,
+               None if self.loading_columns is None
+               else tuple(self.loading_columns))
+        if key in self.interval_cache:
+            return self.interval_cache[key]
+
+        content = self.prefetched(filepath)
+        if content is None:
+            with open(filepath, 'rb') as f_handle:
+                content = f_handle.read()
+        lines = content.split("\n", FACET_SNIFF_LINES)[:FACET_SNIFF_LINES]
+        if not content.strip():
+            self.stats.file_read(filepath, len(content), 0)
+            self.interval_cache = {key: (np.zeros(0),
+                                         np.zeros((0, 0), np.float32))}
+            return self.interval_cache[key]
+        schema = self.facet_schema(filepath, lines, layout)
+        columns = self.select_columns(schema["names"])
+        value_cols = range(schema["first"], schema["last"])
+        selected = _select(value_cols, columns)
+        usecols = sorted(set([schema["time_col"]] + selected))
+        # Empty cells are filled in the text, so that the columns parse as
+        # numbers. Two passes fill runs of empty cells
+        fill = "," + repr(float(FACET_FILL_VALUE))
+        filled = content.replace(",,", fill + ",").replace(",,", fill + ",")
+        filled = filled.replace(",\r", fill + "\r").replace(",\n",
+                                                           fill + "\n")
+        if filled.endswith(","):
+            filled += fill[1:]
+
+        frame = pd.read_csv(BytesIO(filled), header=None,
+                            skiprows=int(schema["header"]), usecols=usecols,
+                            keep_default_na=False, na_values=FACET_NAN_CELLS,
+                            float_precision="round_trip")
+        self.stats.file_read(filepath, len(content),
+                             len(frame) + int(schema["header"]))
+        feat_starts = frame[schema["time_col"]].values.astype(np.float64)
+        feats = np.empty((len(frame), len(selected)), dtype=np.float32)
+        for i, column in enumerate(selected):
+            cells = frame[column]
+            values = cells.values
+            if cells.dtype == object:
+                # Text in the column, the NaN spellings are already NaN
+                values = pd.to_numeric(cells, errors='coerce').values
+                values[np.isnan(values) & cells.notnull().values] = \
+                    FACET_FILL_VALUE
+            feats[:, i] = values
+        self.interval_cache = {key: (feat_starts, feats)}
+        return self.interval_cache[key]
+
+    def load_facet(self, filepath, start, end, timestamps='absolute',
+                   level='v', layout=None):
         """
         Load FACET features from the file corresponding to the param 
-        filepath
+        filepath. The layout of the file is detected from its first lines,
+        see facet_schema; load_facet1, load_facet2 and load_old_facet read
+        the fixed layouts of their FACET versions.
         :param start: Start time of the segment
         :param end: End time of the segment
-        :param filepath: Path to the opensmile feature files
+        :param filepath: Path to the FACET feature file
         :param level: 's' if the file contains features only for the segment,
                       i.e. interval (start, end), 'v' if for the entire video 
         :param timestamps: relative or absolute
+        :param layout: Optional key of FACET_LAYOUTS, the layout of the file
         :returns: List of tuples (feat_start, feat_end, feat_value)
                   corresponding to the features in the interval.
         """
@@ -470,158 +1640,84 @@ class Dataset():
         if timestamps == "relative":
             start_time, end_time = 0.0, end - start
 
+        feat_starts, feats = self.read_facet_file(filepath, layout)
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1]) + start_time
-                    feat_end = feat_start + time_period
-                    feat_val = [float(val) for val in line.split(",")[2:-1]]
-                    feat_val = np.asarray(feat_val, dtype=np.float32)
-                    features.append((feat_start, feat_end, feat_val))
-
+            for i in range(len(feat_starts)):
+                feat_start = feat_starts[i] + start_time
+                features.append((feat_start, feat_start + time_period,
+                                 feats[i]))
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[1:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0])
-
-                    if (feat_start >= start and feat_start < end):
-                        # To adjust the timestamps
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_start + time_period
-                        # print line.split(",")[1:-1]
-                        #assert False
-                        feat_val = []
-                        for val in line.split(",")[1:-1]:
-                            try:
-                                feat_val.append(float(val))
-                            except:
-                                feat_val.append(0.0)
-                        #feat_val = [float(val) for val in line.split(",")[2:-1]]
-                        feat_val = np.asarray(feat_val, dtype=np.float32)
-                        features.append((feat_start, feat_end, feat_val))
+            for i in np.flatnonzero((feat_starts >= start)
+                                    & (feat_starts < end)):
+                # To adjust the timestamps
+                feat_start = feat_starts[i] - start + start_time
+                features.append((feat_start, feat_start + time_period,
+                                 feats[i]))
         return features
 
     def load_facet1(self, filepath, start, end, timestamps='absolute', level='v'):
         """
-        Load FACET features from the file corresponding to the param 
-        filepath
-        :param start: Start time of the segment
-        :param end: End time of the segment
-        :param filepath: Path to the opensmile feature files
-        :param level: 's' if the file contains features only for the segment,
-                      i.e. interval (start, end), 'v' if for the entire video 
-        :param timestamps: relative or absolute
-        :returns: List of tuples (feat_start, feat_end, feat_value)
-                  corresponding to the features in the interval.
+        Load FACET features from a file without header of frame number,
+        frame time and values, with a trailing comma. See load_facet
         """
-        features = []
-        time_period = 0.03333
+        return self.load_facet(filepath, start, end, timestamps, level,
+                               "facet1")
 
-        start_time, end_time = start, end
-        if timestamps == "relative":
-            start_time, end_time = 0.0, end - start
+    def load_facet2(self, filepath, start, end, timestamps='absolute', level='v'):
+        """
+        Load FACET features in the layout of load_facet1
+        """
+        return self.load_facet(filepath, start, end, timestamps, level,
+                               "facet2")
 
-        if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[0:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1]) + start_time
-                    feat_end = feat_start + time_period
-                    feat_val = [float(val) for val in line.split(",")[2:-1]]
-                    feat_val = np.asarray(feat_val, dtype=np.float32)
-                    features.append((feat_start, feat_end, feat_val))
+    def load_old_facet(self, filepath, start, end, timestamps='absolute', level='v'):
+        """
+        Load FACET features from a file with a header line, of frame time
+        and values. See load_facet
+        """
+        return self.load_facet(filepath, start, end, timestamps, level,
+                               "old_facet")
 
-        else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[0:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-
-                    if (feat_start >= start and feat_start < end):
-                        # To adjust the timestamps
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_start + time_period
-                        # print line.split(",")[1:-1]
-                        #assert False
-                        feat_val = []
-                        for val in line.split(",")[2:-1]:
-                            try:
-                                feat_val.append(float(val))
-                            except:
-                                feat_val.append(0.0)
-                        #feat_val = [float(val) for val in line.split(",")[2:-1]]
-                        feat_val = np.asarray(feat_val, dtype=np.float32)
-                        features.append((feat_start, feat_end, feat_val))
-        return features
 
-    def load_facet2(self, filepath, start, end, timestamps='absolute', level='v'):
+    def load_npz(self, filepath, start, end, timestamps='absolute', level='v'):
         """
-        Load FACET features from the file corresponding to the param 
-        filepath
+        Load features from the per video npz file corresponding to the
+        param filepath, as written by P2FA_Helper_v2(output_format='npz')
         :param start: Start time of the segment
         :param end: End time of the segment
-        :param filepath: Path to the opensmile feature files
-        :param level: 's' if the file contains features only for the segment,
-                      i.e. interval (start, end), 'v' if for the entire video 
+        :param filepath: Path to the npz feature file
+        :param level: Ignored, npz files always hold the entire video and
+                      are windowed to the interval (start, end)
         :param timestamps: relative or absolute
         :returns: List of tuples (feat_start, feat_end, feat_value)
                   corresponding to the features in the interval.
+        Note: timestamps in npz files are always absolute
         """
         features = []
-        time_period = 0.03333
-
         start_time, end_time = start, end
         if timestamps == "relative":
             start_time, end_time = 0.0, end - start
 
-        if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[0:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1]) + start_time
-                    feat_end = feat_start + time_period
-                    feat_val = [float(val) for val in line.split(",")[2:-1]]
-                    feat_val = np.asarray(feat_val, dtype=np.float32)
-                    features.append((feat_start, feat_end, feat_val))
-
-        else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines()[0:]:
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[1])
-
-                    if (feat_start >= start and feat_start < end):
-                        # To adjust the timestamps
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_start + time_period
-                        # print line.split(",")[1:-1]
-                        #assert False
-                        feat_val = []
-                        for val in line.split(",")[2:-1]:
-                            try:
-                                feat_val.append(float(val))
-                            except:
-                                feat_val.append(0.0)
-                        #feat_val = [float(val) for val in line.split(",")[2:-1]]
-                        feat_val = np.asarray(feat_val, dtype=np.float32)
-                        features.append((feat_start, feat_end, feat_val))
+        columns = self.select_columns()
+        key = (filepath, "npz", None if columns is None else tuple(columns))
+        if key not in self.interval_cache:
+            content = self.prefetched(filepath)
+            intervals, feats, _ = store.read_video_npz(
+                            filepath if content is None else BytesIO(content))
+            self.stats.file_read(filepath, os.path.getsize(filepath),
+                                 len(intervals))
+            if columns is not None:
+                feats = np.asarray(feats)[:, columns]
+            index = IntervalIndex(intervals[:, 0], intervals[:, 1])
+            self.interval_cache = {key: (intervals[:, 0], intervals[:, 1],
+                                         feats, index)}
+        feat_starts, feat_ends, feats, index = self.interval_cache[key]
+        for i in index.window(start, end):
+            feat_start = feat_starts[i] - start + start_time
+            feat_end = feat_ends[i] - start + start_time
+            features.append((feat_start, feat_end, feats[i]))
         return features
 
-
     def load_misc(self, filepath, start, end, timestamps='absolute', level='v'):
         """
         Load customizable time-distributed features from the file
@@ -641,39 +1737,26 @@ class Dataset():
             start_time, end_time = 0.0, end - start
 
         if level == 's':
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0]) + start_time
-                    feat_end = float(line.split(",")[1]) + start_time
-                    feat_val = [float(val) for val in line.split(",")[2:]]
-                    feat_val = np.asarray(feat_val)
-                    #print (feat_start, feat_end)
-                    #assert False
-                    features.append((feat_start, feat_end, feat_val))
+            columns = self.select_columns()
+            for line in self.read_lines(filepath):
+                line = line.strip()
+                if not line:
+                    break
+                feat_start = float(line.split(",")[0]) + start_time
+                feat_end = float(line.split(",")[1]) + start_time
+                feat_val = [float(val) for val
+                            in _select(line.split(",")[2:], columns)]
+                feat_val = np.asarray(feat_val)
+                #print (feat_start, feat_end)
+                #assert False
+                features.append((feat_start, feat_end, feat_val))
         else:
-            with open(filepath, 'r') as f_handle:
-                for line in f_handle.readlines():
-                    line = line.strip()
-                    if not line:
-                        break
-                    feat_start = float(line.split(",")[0])
-                    feat_end = float(line.split(",")[1])
-                    feat_time = feat_end - feat_start
-                    if ((feat_start <= start and feat_end > end)
-                        or (feat_start >= start and feat_end < end)
-                        or (feat_start <= start
-                            and start - feat_start < feat_time / 2)
-                        or (feat_start >= start
-                            and end - feat_start > feat_time / 2)):
-
-                        feat_start = feat_start - start + start_time
-                        feat_end = feat_end - start + start_time
-                        feat_val = [float(val) for val in line.split(",")[3:]]
-                        feat_val = np.asarray(feat_val)
-                        features.append((feat_start, feat_end, feat_val))
+            feat_starts, feat_ends, feats, index = self.read_interval_file(
+                                                    filepath, 0, 1, 3)
+            for i in index.window(start, end):
+                feat_start = feat_starts[i] - start + start_time
+                feat_end = feat_ends[i] - start + start_time
+                features.append((feat_start, feat_end, feats[i]))
         return features
 
 
@@ -684,10 +1767,23 @@ class Dataset():
         for modality in modalities:
             if modality == align_modality:
                 continue
-            aligned_modality = self.align_modality(modality, alignments)
+            self.stats.begin("align", modality, "align_modality")
+            call_start = time.time()
+            stats_key = self.reset_stats(modality, "aligned_" + modality)
+            aligned_modality = self.align_modality(modality, alignments,
+                                                   stats_key=stats_key)
+            self.stats.add_rows(sum(len(feats) for video_feats in
+                                    self.feature_dict[modality].itervalues()
+                                    for feats in video_feats.itervalues()))
+            self.stats.call(None, time.time() - call_start,
+                            sum(len(feats) for video_feats in
+                                aligned_modality.itervalues()
+                                for feats in video_feats.itervalues()))
+            self.stats.end()
             aligned_feat_dict[modality] = aligned_modality
         self.aligned_feature_dict = aligned_feat_dict
-        return aligned_feat_dict
+        self.aligned_to = align_modality
+        return self.features(feature_dict=aligned_feat_dict)
 
     def get_alignments(self, modality):
         alignments = {}
@@ -703,7 +1799,8 @@ class Dataset():
             alignments[video_id] = segment_alignments
         return alignments
 
-    def align_modality(self, modality, alignments, merge_type="mean"):
+    def align_modality(self, modality, alignments, merge_type="mean",
+                       stats_key=None):
         aligned_feat_dict = {}
         modality_feat_dict = self.feature_dict[modality]
         warning_hist = set() # Keep track of all the warnings
@@ -713,10 +1810,11 @@ class Dataset():
 
             for segment_id, feat_intervals in segments.iteritems():
                 aligned_segment_feat = []
+                segment_feats = modality_feat_dict[video_id][segment_id]
 
                 for start_interval, end_interval in feat_intervals:
                     time_interval = end_interval - start_interval
-                    feats = modality_feat_dict[video_id][segment_id]
+                    feats = segment_feats
                     try:
                         a = len(feats[0][2])
                     except:
@@ -744,6 +1842,9 @@ class Dataset():
                                           aligned_feat)
                     aligned_segment_feat.append(aligned_feat_tuple)
                 aligned_video_feats[segment_id] = aligned_segment_feat
+                if stats_key:
+                    self.update_stats(stats_key, video_id,
+                                      aligned_segment_feat)
             aligned_feat_dict[video_id] = aligned_video_feats
 
         return aligned_feat_dict
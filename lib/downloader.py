@@ -1,33 +1,396 @@
 import argparse
-import urllib2
+import hashlib
+import httplib
+import json
 import os.path
+import shutil
+import tarfile
+import threading
+import time
+import urlparse
+from Queue import Queue, Empty
 from subprocess import call
 import sys
 
-parser = argparse.ArgumentParser(description="Specify the datasets you want to download.")
-parser.add_argument("--dataset", help="Specify the name of the dataset you want, in uppercase letters.", type=str)
-
-args = parser.parse_args()
-
 datasets = {
     "MOSI": "http://sorena.multicomp.cs.cmu.edu/downloads/MOSI.tar.gz",
     "POM": "url.for.pom.tar",
     "IEMOCAP": "url.for.iemocap.tar"
 }
 
-if args.dataset == None:
-    print "\nTry python downloader.py -h for usage information\n"
-elif args.dataset not in datasets.keys():
-    print "\nThe dataset you specified is not provided! Please check the available datasets:\n"
-    for dataset in datasets.keys():
-        print dataset + "\n"
-else:
+# Known digests of the archives, as "<algorithm>:<hexdigest>"
+checksums = {}
+
+block_sz = 1 << 20 # read buffer size
+chunk_sz = 16 << 20 # size of the byte ranges fetched in parallel
+max_retries = 3
+
+
+def connect(url):
+    """
+    Open a persistent connection to the host of url
+    """
+    parts = urlparse.urlsplit(url)
+    if parts.scheme == "https":
+        return httplib.HTTPSConnection(parts.netloc, timeout=60)
+    return httplib.HTTPConnection(parts.netloc, timeout=60)
+
+
+def request_path(url):
+    parts = urlparse.urlsplit(url)
+    return urlparse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+
+
+def probe(url, redirects=5):
+    """
+    Follow redirects and find the size of the file and whether the server
+    accepts byte range requests.
+    :returns: tuple (url, size, accepts_ranges), size is None if unknown
+    """
+    for _ in range(redirects + 1):
+        conn = connect(url)
+        conn.request("GET", request_path(url), headers={"Range": "bytes=0-0"})
+        response = conn.getresponse()
+        if response.status != 200:
+            response.read()
+        # A server ignoring the range sends the whole file, which is dropped
+        conn.close()
+        if response.status in (301, 302, 303, 307, 308):
+            url = urlparse.urljoin(url, response.getheader("Location"))
+            continue
+        if response.status == 206:
+            content_range = response.getheader("Content-Range", "")
+            size = content_range.rsplit("/", 1)[-1]
+            if size.isdigit():
+                return url, int(size), True
+        if response.status in (200, 206):
+            length = response.getheader("Content-Length")
+            return url, int(length) if length else None, False
+        raise IOError("HTTP error {} for {}".format(response.status, url))
+    raise IOError("Too many redirects for " + url)
+
+
+def load_state(state_path, url, file_size, chunk_count):
+    """
+    Read the set of completed chunks of an interrupted download, if the
+    state file belongs to the same url, size and chunking
+    """
+    if not os.path.exists(state_path):
+        return set()
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except ValueError:
+        return set()
+    if (state.get("url") != url or state.get("size") != file_size
+            or state.get("chunk_size") != chunk_sz):
+        return set()
+    return set(i for i in state.get("done", []) if 0 <= i < chunk_count)
+
+
+def save_state(state_path, url, file_size, done):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"url": url, "size": file_size, "chunk_size": chunk_sz,
+                   "done": sorted(done)}, f)
+    os.rename(tmp_path, state_path)
+
+
+def show_progress(file_size_dl, file_size):
+    sys.stdout.write('\r')
+    if file_size:
+        percent = file_size_dl * 100. / file_size
+        sys.stdout.write("[%-20s] [%3.2f%%]" % ('='*int(percent/5), percent))
+    else:
+        sys.stdout.write("%d bytes" % file_size_dl)
+    sys.stdout.flush()
+
+
+def fetch_chunks(url, file_path, file_size, chunks, done, state_path,
+                 workers):
+    """
+    Fetch byte ranges into the preallocated file_path using a pool of
+    threads, each holding one persistent connection
+    """
+    pending = Queue()
+    for chunk in chunks:
+        pending.put(chunk)
+    lock = threading.Lock()
+    progress = {"bytes": sum(min(chunk_sz, file_size - i * chunk_sz)
+                             for i in done)}
+    errors = []
+
+    def fetch(conn, chunk):
+        first = chunk * chunk_sz
+        last = min(first + chunk_sz, file_size) - 1
+        conn.request("GET", request_path(url),
+                     headers={"Range": "bytes={}-{}".format(first, last)})
+        response = conn.getresponse()
+        if response.status != 206:
+            response.read()
+            raise IOError("HTTP error {} for range {}-{}".format(
+                          response.status, first, last))
+        received = 0
+        with open(file_path, "r+b") as f:
+            f.seek(first)
+            while True:
+                buffer = response.read(block_sz)
+                if not buffer:
+                    break
+                f.write(buffer)
+                received += len(buffer)
+                with lock:
+                    progress["bytes"] += len(buffer)
+        if received != last - first + 1:
+            with lock:
+                progress["bytes"] -= received
+            raise IOError("Incomplete range {}-{}".format(first, last))
+
+    def worker():
+        conn = connect(url)
+        while not errors:
+            try:
+                chunk = pending.get_nowait()
+            except Empty:
+                break
+            for attempt in range(max_retries):
+                try:
+                    fetch(conn, chunk)
+                    break
+                except (IOError, httplib.HTTPException) as e:
+                    conn.close()
+                    conn = connect(url)
+                    if attempt == max_retries - 1:
+                        errors.append(e)
+                        return
+            with lock:
+                done.add(chunk)
+                save_state(state_path, url, file_size, done)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+    while any(t.is_alive() for t in threads):
+        show_progress(progress["bytes"], file_size)
+        time.sleep(0.2)
+    show_progress(progress["bytes"], file_size)
+    if errors:
+        raise errors[0]
+
+
+def fetch_stream(url, file_path, file_size):
+    """
+    Fetch the whole file over a single connection, used when the server
+    does not accept range requests
+    """
+    conn = connect(url)
+    conn.request("GET", request_path(url))
+    response = conn.getresponse()
+    if response.status != 200:
+        raise IOError("HTTP error {} for {}".format(response.status, url))
+    file_size_dl = 0
+    with open(file_path, 'wb') as f:
+        while True:
+            buffer = response.read(block_sz)
+            if not buffer:
+                break
+            file_size_dl += len(buffer)
+            f.write(buffer)
+            show_progress(file_size_dl, file_size)
+    conn.close()
+
+
+def verify(file_path, checksum):
+    """
+    Compare the digest of file_path with checksum, "<algorithm>:<hexdigest>"
+    """
+    algorithm, expected = checksum.split(":", 1)
+    digest = hashlib.new(algorithm)
+    with open(file_path, "rb") as f:
+        for buffer in iter(lambda: f.read(block_sz), b""):
+            digest.update(buffer)
+    return digest.hexdigest() == expected.lower()
+
+
+def download(url, file_path, workers=4, checksum=None):
+    """
+    Download url to file_path. Large files on servers accepting range
+    requests are fetched as byte ranges in parallel, and the completed
+    ranges are recorded in file_path + ".state" so that an interrupted
+    download resumes where it stopped.
+    :param workers: Number of parallel connections
+    :param checksum: Optional "<algorithm>:<hexdigest>" to verify
+    """
+    url, file_size, accepts_ranges = probe(url)
+    print "Downloading: {}, size: {}".format(os.path.basename(file_path),
+                                             file_size)
+    state_path = file_path + ".state"
+    if accepts_ranges and file_size > chunk_sz:
+        chunk_count = (file_size + chunk_sz - 1) // chunk_sz
+        done = load_state(state_path, url, file_size, chunk_count)
+        if (not done or not os.path.exists(file_path)
+                or os.path.getsize(file_path) != file_size):
+            done = set()
+            with open(file_path, "wb") as f:
+                f.truncate(file_size)
+        else:
+            print "Resuming, {} of {} parts already downloaded".format(
+                  len(done), chunk_count)
+        chunks = [i for i in range(chunk_count) if i not in done]
+        fetch_chunks(url, file_path, file_size, chunks, done, state_path,
+                     workers)
+    else:
+        fetch_stream(url, file_path, file_size)
+    print
+
+    if checksum:
+        print "Verifying checksum..."
+        if not verify(file_path, checksum):
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            raise IOError("Checksum mismatch for " + file_path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+
+class ProgressReader():
+    """
+    File-like wrapper of an HTTP response that reports progress and
+    computes the digest of the bytes read
+    """
+
+    def __init__(self, response, file_size, algorithm=None):
+        self.response = response
+        self.file_size = file_size
+        self.file_size_dl = 0
+        self.digest = hashlib.new(algorithm) if algorithm else None
+
+    def read(self, size=-1):
+        buffer = self.response.read(block_sz if size is None or size < 0
+                                    else size)
+        self.file_size_dl += len(buffer)
+        if self.digest:
+            self.digest.update(buffer)
+        show_progress(self.file_size_dl, self.file_size)
+        return buffer
+
+
+def is_within(directory, path):
+    directory = os.path.realpath(directory)
+    return os.path.realpath(path).startswith(directory + os.sep)
+
+
+def stream_extract(url, target, checksum=None, overwrite=False):
+    """
+    Download a .tar.gz archive and extract it while it is received, without
+    storing the archive. Members are extracted into a hidden directory next
+    to target, which is renamed to target once the archive is complete.
+    :param target: Path of the dataset directory to create
+    :param checksum: Optional "<algorithm>:<hexdigest>" of the archive
+    :param overwrite: Replace target if it exists, else raise an error
+    """
+    target = target.rstrip(os.sep)
+    name = os.path.basename(target)
+    parent = os.path.dirname(target) or "."
+    partial = os.path.join(parent, "." + name + ".partial")
+    if os.path.exists(target) and not overwrite:
+        raise IOError(target + " already exists, use --overwrite to replace it")
+    if os.path.exists(partial):
+        shutil.rmtree(partial)
+    os.makedirs(partial)
+
+    url, file_size, _ = probe(url)
+    print "Downloading and extracting: {}, size: {}".format(name, file_size)
+    conn = connect(url)
+    conn.request("GET", request_path(url))
+    response = conn.getresponse()
+    if response.status != 200:
+        raise IOError("HTTP error {} for {}".format(response.status, url))
+    reader = ProgressReader(response, file_size,
+                            checksum.split(":", 1)[0] if checksum else None)
+    try:
+        archive = tarfile.open(fileobj=reader, mode="r|gz",
+                               bufsize=block_sz)
+        for member in archive:
+            member_path = os.path.join(partial, member.name)
+            if not is_within(partial, member_path):
+                raise IOError("Unsafe path in archive: " + member.name)
+            if member.issym() or member.islnk():
+                link_path = os.path.join(os.path.dirname(member_path),
+                                         member.linkname)
+                if member.islnk():
+                    link_path = os.path.join(partial, member.linkname)
+                if not is_within(partial, link_path):
+                    raise IOError("Unsafe link in archive: " + member.name)
+            archive.extract(member, partial)
+        archive.close()
+        # Read what is left after the end of the tar stream for the digest
+        while reader.read(block_sz):
+            pass
+        print
+        if checksum and reader.digest.hexdigest() != \
+                checksum.split(":", 1)[1].lower():
+            raise IOError("Checksum mismatch for " + url)
+    except:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+
+    # Archives normally hold a single top level directory named as target
+    extracted = partial
+    entries = os.listdir(partial)
+    if entries == [name] and os.path.isdir(os.path.join(partial, name)):
+        extracted = os.path.join(partial, name)
+    previous = os.path.join(parent, "." + name + ".old")
+    if os.path.exists(target):
+        if os.path.exists(previous):
+            shutil.rmtree(previous)
+        os.rename(target, previous)
+    os.rename(extracted, target)
+    shutil.rmtree(partial, ignore_errors=True)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Specify the datasets you want to download.")
+    parser.add_argument("--dataset", help="Specify the name of the dataset you want, in uppercase letters.", type=str)
+    parser.add_argument("--workers", help="Number of parallel connections.", type=int, default=4)
+    parser.add_argument("--checksum", help="Expected digest of the archive as <algorithm>:<hexdigest>.", type=str)
+    parser.add_argument("--stream", help="Extract while downloading, without storing the archive or asking questions.", action="store_true")
+    parser.add_argument("--overwrite", help="Replace an existing dataset folder when streaming.", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.dataset == None:
+        print "\nTry python downloader.py -h for usage information\n"
+        return
+    elif args.dataset not in datasets.keys():
+        print "\nThe dataset you specified is not provided! Please check the available datasets:\n"
+        for dataset in datasets.keys():
+            print dataset + "\n"
+        return
+
     url = datasets[args.dataset]
     file_name = url.split('/')[-1]
     file_path = os.path.join('temp', file_name) # temp path for storing the zip file
     output_path = os.path.join("..", "datasets") # path for the folder storing the directory
     target = os.path.join("..", "datasets", file_name.split(".")[0]) # path of the dataset directory
-    
+    checksum = args.checksum or checksums.get(args.dataset)
+
+    if args.stream:
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        try:
+            stream_extract(url, target, checksum, args.overwrite)
+        except IOError as e:
+            print "\n{}\n".format(e)
+            sys.exit(1)
+        print "{} dataset should be good to go. Refer to the README.md on how to load the data.".format(file_name.split(".")[0])
+        return
+
     giveup_or_down = None
     if os.path.exists(target):
         while giveup_or_down not in ['Y', 'N']:
@@ -39,37 +402,15 @@ else:
             call(['rm', '-r', target])
 
     extract_or_down = None
-    if os.path.exists(file_path):
+    if os.path.exists(file_path) and not os.path.exists(file_path + ".state"):
         while extract_or_down not in ['E', 'D']:
             extract_or_down = raw_input("Zip file already exists in temp, do you want to extract it or re-download? [E]xtract\\[D]ownload\n")
             extract_or_down = extract_or_down.upper()
     if extract_or_down == None or extract_or_down == 'D':
         call(['mkdir', '-p', 'temp'])
-
-        file_name = url.split('/')[-1]
-        file_path = os.path.join('temp', file_name)
-
-        u = urllib2.urlopen(url)
-        with open(file_path, 'wb') as f:
-            meta = u.info()
-            file_size = int(meta.getheaders("Content-Length")[0])
-            print "Downloading: {}, size: {}".format(file_name, file_size)
-
-            file_size_dl = 0
-            block_sz = 8192
-            while True:
-                buffer = u.read(block_sz)
-                if not buffer:
-                    break
-                file_size_dl += len(buffer)
-                f.write(buffer)
-                sys.stdout.write('\r')
-                # status = r"%10d bytes [%3.2f%%]" % (file_size_dl, file_size_dl * 100. / file_size)
-                sys.stdout.write("[%-20s] [%3.2f%%]" % ('='*int((file_size_dl * 100. / file_size)/5), file_size_dl * 100. / file_size))
-                # status = status + chr(8) * (len(status) + 1)
-                # sys.stdout.write(status)
-                sys.stdout.flush()
-
+        if extract_or_down == 'D' and os.path.exists(file_path):
+            os.remove(file_path)
+        download(url, file_path, args.workers, checksum)
 
     print "\nExtracting dataset...\n"
     call(["tar", "-xzf", file_path])
@@ -77,4 +418,8 @@ else:
     call(['rm', '-r', 'temp'])
     if os.path.exists(file_name.split(".")[0]):
         call(['rm', '-r', file_name.split(".")[0]])
-    print "{} dataset should be good to go. Refer to the README.md on how to load the data.".format(file_name.split(".")[0])
\ No newline at end of file
+    print "{} dataset should be good to go. Refer to the README.md on how to load the data.".format(file_name.split(".")[0])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+The file contains the converter and reader for the binary embedding cache.
+A text (or word2vec binary) embedding file is converted once into
+    <prefix>.f32        raw little-endian float32 matrix, one row per word,
+                        followed by a single zero row used for OOV words
+    <prefix>.vocab      "rows dim" header line followed by one word per line
+    <prefix>.hash.npy   sorted 64-bit hashes of the vocabulary words
+    <prefix>.rows.npy   matrix row of each entry in <prefix>.hash.npy
+All the files are memory-mapped on load, so opening the cache does not
+depend on the size of the vocabulary and concurrent processes share pages.
+"""
+import argparse
+import hashlib
+import struct
+from os.path import exists
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+CACHE_SUFFIXES = (".f32", ".vocab", ".hash.npy", ".rows.npy")
+
+
+def word_hash(word):
+    """
+    Stable 64-bit hash of a word, used as the vocabulary index key
+    """
+    if isinstance(word, unicode):
+        word = word.encode("utf-8")
+    return struct.unpack("<Q", hashlib.md5(word).digest()[:8])[0]
+
+
+def find_cache(path):
+    """
+    Return the cache prefix for path if path is a cache prefix or one of
+    the cache files and all the cache files exist, else None
+    """
+    if not path:
+        return None
+    prefix = path
+    for suffix in CACHE_SUFFIXES:
+        if path.endswith(suffix):
+            prefix = path[:-len(suffix)]
+            break
+    if all(exists(prefix + suffix) for suffix in CACHE_SUFFIXES):
+        return prefix
+    return None
+
+
+def _iter_text_vectors(fpath, has_header):
+    """
+    Yields (word, vector) from a text embedding file. Words containing
+    spaces are supported as the vector length is fixed by the first row
+    """
+    dim = None
+    with open(fpath, "r") as fh:
+        if has_header:
+            dim = int(fh.readline().split()[1])
+        for line in fh:
+            splits = line.rstrip().split(" ")
+            if len(splits) < 2:
+                continue
+            if dim is None:
+                dim = len(splits) - 1
+            word = " ".join(splits[:-dim])
+            yield word, np.asarray(splits[-dim:], dtype=np.float32)
+
+
+def _iter_binary_vectors(fpath):
+    """
+    Yields (word, vector) from a word2vec binary embedding file
+    """
+    with open(fpath, "rb") as fh:
+        rows, dim = [int(val) for val in fh.readline().split()]
+        vec_bytes = 4 * dim
+        for _ in range(rows):
+            chars = []
+            while True:
+                ch = fh.read(1)
+                if ch == " " or ch == "":
+                    break
+                if ch != "\n":
+                    chars.append(ch)
+            vector = np.frombuffer(fh.read(vec_bytes), dtype="<f4")
+            yield "".join(chars), vector
+
+
+def convert(src_path, prefix, embed_type="glove", embed_model_type="text"):
+    """
+    Convert an embedding file into the binary cache layout.
+    :param src_path: Path to the glove, word2vec or spanish embedding file
+    :param prefix: Path prefix of the cache files to create
+    :param embed_type: glove, w2v or spanish. glove files have no header
+                       line, w2v and spanish files start with "rows dim"
+    :param embed_model_type: text or binary, binary is valid only for w2v
+    :returns: prefix of the created cache
+    """
+    if embed_type not in ("w2v", "glove", "spanish"):
+        raise ValueError("Param embed_type must be 'w2v' or 'glove' or "
+                         "'spanish'")
+    if embed_model_type not in ("text", "binary"):
+        raise ValueError("Param embed_model_type must be either text or "
+                         "binary")
+
+    if embed_model_type == "binary":
+        vectors = _iter_binary_vectors(src_path)
+    else:
+        vectors = _iter_text_vectors(src_path, embed_type != "glove")
+
+    # Later duplicates win, as they did in the dict based loaders
+    rows = {}
+    words = []
+    dim = 0
+    with open(prefix + ".f32", "wb") as fh:
+        for word, vector in vectors:
+            if not dim:
+                dim = len(vector)
+            elif len(vector) != dim:
+                raise ValueError("Inconsistent vector length for word " + word)
+            rows[word_hash(word)] = len(words)
+            words.append(word)
+            vector.astype("<f4").tofile(fh)
+        np.zeros(dim, dtype="<f4").tofile(fh)
+
+    if len(rows) != len(set(words)):
+        raise ValueError("Hash collision in the vocabulary of " + src_path)
+
+    with open(prefix + ".vocab", "w") as fh:
+        fh.write("%d %d\n" % (len(words), dim))
+        for word in words:
+            fh.write(word + "\n")
+
+    hashes = np.fromiter(rows.iterkeys(), dtype=np.uint64, count=len(rows))
+    row_ids = np.fromiter(rows.itervalues(), dtype=np.int64, count=len(rows))
+    order = np.argsort(hashes)
+    np.save(prefix + ".hash.npy", hashes[order])
+    np.save(prefix + ".rows.npy", row_ids[order])
+    return prefix
+
+
+class EmbeddingCache():
+    """
+    Memory-mapped embedding matrix with a hashed vocabulary index
+    """
+
+    def __init__(self, path):
+        """
+        Open the cache.
+        :param path: Cache prefix or path to any of the cache files
+        """
+        self.prefix = find_cache(path)
+        if self.prefix is None:
+            raise IOError("No embedding cache found at " + str(path))
+        with open(self.prefix + ".vocab", "r") as fh:
+            self.rows, self.vector_size = [int(val) for val in
+                                           fh.readline().split()]
+        self.oov_row = self.rows
+        self.vectors = np.memmap(self.prefix + ".f32", dtype="<f4", mode="r",
+                                 shape=(self.rows + 1, self.vector_size))
+        self.hashes = np.load(self.prefix + ".hash.npy", mmap_mode="r")
+        self.row_ids = np.load(self.prefix + ".rows.npy", mmap_mode="r")
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, word):
+        return self.row_id(word) != self.oov_row
+
+    def __getitem__(self, word):
+        row = self.row_id(word)
+        if row == self.oov_row:
+            raise KeyError(word)
+        return self.vectors[row]
+
+    def row_id(self, word):
+        """
+        Matrix row of word, or self.oov_row if word is not in the vocabulary
+        """
+        return int(self.row_ids_for([word])[0])
+
+    def row_ids_for(self, words):
+        """
+        Map a sequence of words to matrix rows in one vectorized lookup.
+        :returns: int64 array of rows, self.oov_row for OOV words
+        """
+        keys = np.fromiter((word_hash(word) for word in words),
+                           dtype=np.uint64, count=len(words))
+        if not len(self.hashes):
+            return np.full(len(keys), self.oov_row, dtype=np.int64)
+        pos = np.searchsorted(self.hashes, keys)
+        pos[pos == len(self.hashes)] = 0
+        found = np.asarray(self.hashes[pos]) == keys
+        return np.where(found, self.row_ids[pos], self.oov_row)
+
+
+class EmbeddingTable():
+    """
+    In-memory counterpart of EmbeddingCache for embedding models parsed from
+    text files or loaded through gensim. The matrix carries the same
+    trailing zero row that is shared by all the OOV words
+    """
+
+    def __init__(self, words, vectors, dtype=np.float32, has_oov_row=False):
+        """
+        :param words: Vocabulary words, one per row of vectors. Later
+                      duplicates win
+        :param vectors: Embedding matrix of shape (len(words), dim)
+        :param dtype: dtype of the matrix, float64 keeps the values parsed
+                      from text files exact
+        :param has_oov_row: True if vectors already ends with the zero OOV
+                            row, the matrix is then used without a copy
+        """
+        vectors = np.asarray(vectors, dtype=dtype)
+        if not has_oov_row:
+            vectors = np.vstack([vectors,
+                                 np.zeros((1, vectors.shape[1]),
+                                          dtype=dtype)])
+        self.vectors = vectors
+        self.rows = len(vectors) - 1
+        self.vector_size = vectors.shape[1]
+        self.oov_row = self.rows
+        self.index = dict((word, row) for row, word in enumerate(words))
+
+    @classmethod
+    def from_text(cls, fpath, dtype=np.float32, has_header=False):
+        """
+        Parse a text embedding file of "word values..." lines. The lines
+        are counted first and every line is parsed straight into its row
+        of the matrix, so the peak memory is the matrix itself.
+        :param has_header: True to skip a first "rows dim" line
+        """
+        rows, dim = 0, None
+        with open(fpath, "r") as fh:
+            if has_header:
+                fh.readline()
+            for line in fh:
+                if line.strip():
+                    rows += 1
+                    if dim is None:
+                        dim = len(line.split()) - 1
+        words = []
+        vectors = np.zeros((rows + 1, dim or 0), dtype=dtype)
+        with open(fpath, "r") as fh:
+            if has_header:
+                fh.readline()
+            for line in fh:
+                splits = line.split()
+                if not splits:
+                    continue
+                if len(splits) != dim + 1:
+                    raise ValueError("Line " + str(len(words) + 1) + " of "
+                                     + fpath + " does not hold " + str(dim)
+                                     + " values")
+                vectors[len(words)] = np.asarray(splits[1:], dtype=dtype)
+                words.append(splits[0])
+        return cls(words, vectors, dtype, has_oov_row=True)
+
+    @classmethod
+    def from_keyed_vectors(cls, model):
+        """
+        Build the table from a gensim KeyedVectors model
+        """
+        words = [None] * len(model.vocab)
+        for word, vocab in model.vocab.iteritems():
+            words[vocab.index] = word
+        return cls(words, model.syn0)
+
+    def __len__(self):
+        return self.rows
+
+    def __contains__(self, word):
+        return word in self.index
+
+    def __getitem__(self, word):
+        return self.vectors[self.index[word]]
+
+    def row_id(self, word):
+        """
+        Matrix row of word, or self.oov_row if word is not in the vocabulary
+        """
+        return self.index.get(word, self.oov_row)
+
+    def row_ids_for(self, words):
+        """
+        Map a sequence of words to matrix rows.
+        :returns: int64 array of rows, self.oov_row for OOV words
+        """
+        get = self.index.get
+        oov_row = self.oov_row
+        return np.fromiter((get(word, oov_row) for word in words),
+                           dtype=np.int64, count=len(words))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an embedding file "
+                                     "into the memory-mappable binary cache.")
+    parser.add_argument("src", help="Path to the embedding file")
+    parser.add_argument("prefix", help="Path prefix of the cache files")
+    parser.add_argument("--embed_type", default="glove",
+                        help="glove, w2v or spanish")
+    parser.add_argument("--embed_model_type", default="text",
+                        help="text or binary")
+    args = parser.parse_args()
+    convert(args.src, args.prefix, args.embed_type, args.embed_model_type)
+    print "Embedding cache written to", args.prefix
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+The file contains the sorted interval index used to window full video
+feature and P2FA files into segments. Dataset and P2FA_Helper_v2 both use
+it, so a feature is included in a segment by the same rule everywhere.
+"""
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+def half_overlap_mask(feat_starts, feat_ends, start, end):
+    """
+    Vectorized inclusion rule of a feature interval in the segment
+    (start, end): the feature covers the segment, lies inside it, or more
+    than half of it overlaps the segment.
+    :returns: boolean array, True for the included features
+    """
+    feat_time = feat_ends - feat_starts
+    return (((feat_starts <= start) & (feat_ends > end))
+            | ((feat_starts >= start) & (feat_ends < end))
+            | ((feat_starts <= start) & (start - feat_starts < feat_time / 2))
+            | ((feat_starts >= start) & (end - feat_starts > feat_time / 2)))
+
+
+class IntervalIndex():
+    """
+    Intervals sorted by start time, with the running maximum of the end
+    times, answering window queries by binary search
+    """
+
+    def __init__(self, starts, ends):
+        """
+        :param starts: Start times of the intervals, in any order
+        :param ends: End times of the intervals
+        """
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        self.order = np.argsort(starts, kind="mergesort")
+        self.starts = starts[self.order]
+        self.ends = ends[self.order]
+        if len(self.ends):
+            self.max_ends = np.maximum.accumulate(self.ends)
+        else:
+            self.max_ends = self.ends
+        # The search bounds assume no interval ends before it starts
+        self.well_formed = bool(np.all(self.ends >= self.starts))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def candidates(self, start, end):
+        """
+        Sorted positions [lo, hi) that may satisfy half_overlap_mask.
+        Included features either start at or after start, or end after
+        min(start, end), and they start no later than max(start, end).
+        Malformed intervals fall back to scanning the whole index.
+        """
+        if not self.well_formed:
+            return 0, len(self.starts)
+        lo = min(np.searchsorted(self.max_ends, min(start, end), "right"),
+                 np.searchsorted(self.starts, start, "left"))
+        hi = np.searchsorted(self.starts, max(start, end), "right")
+        return lo, max(lo, hi)
+
+    def window(self, start, end):
+        """
+        Indices of the intervals included in the segment (start, end) under
+        the half overlap rule, in their original order.
+        """
+        lo, hi = self.candidates(start, end)
+        mask = half_overlap_mask(self.starts[lo:hi], self.ends[lo:hi],
+                                 start, end)
+        return np.sort(self.order[lo:hi][mask])
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+The file contains the instrumentation of Dataset. A LoadStats object keeps
+one record per (stage, modality, method), e.g. ("load", "modality_2",
+"load_facet") or ("align", "modality_2", "align_modality"), holding
+    calls         loader or align_modality calls
+    wall_time     seconds spent in the calls
+    files_opened  feature files read from disk (cached files are not read)
+    bytes_read    bytes of the files read
+    rows_parsed   rows (lines, matrix rows or frames) parsed from the files
+    frames_kept   feature tuples returned by the calls
+    peak_rss_mb   peak resident memory of the process after the calls
+and the wall time, calls and frames of every feature file, to find the
+modality or file that dominates a slow build.
+"""
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+COUNTERS = ["calls", "wall_time", "files_opened", "bytes_read",
+            "rows_parsed", "frames_kept", "peak_rss_mb"]
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of the process in MB, None if not available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on OS X and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return peak / float(1 << 20)
+    return peak / 1024.0
+
+
+class LoadStats():
+    """
+    Timing, throughput and memory counters of Dataset loads and alignments
+    """
+
+    def __init__(self, hook=None):
+        """
+        :param hook: Optional profiling hook, called after every loader and
+                     align_modality call as hook(stage, modality, method,
+                     filepath, seconds, frames). filepath is None for
+                     align_modality calls
+        """
+        self.hook = hook
+        self.records = {}
+        self.files = {}
+        self.current = None
+
+    def record(self, stage, modality, method):
+        key = (stage, modality, method)
+        if key not in self.records:
+            self.records[key] = dict((name, 0) for name in COUNTERS)
+            self.records[key]["peak_rss_mb"] = None
+        return self.records[key]
+
+    def begin(self, stage, modality, method):
+        """
+        Make (stage, modality, method) the record the file reads count to
+        """
+        self.current = (stage, modality, method)
+        self.record(stage, modality, method)
+
+    def end(self):
+        if self.current is not None:
+            self.records[self.current]["peak_rss_mb"] = peak_rss_mb()
+        self.current = None
+
+    def file_read(self, filepath, bytes_read, rows):
+        """
+        Count a feature file read from disk to the current record
+        """
+        if self.current is None:
+            return
+        record = self.records[self.current]
+        record["files_opened"] += 1
+        record["bytes_read"] += bytes_read
+        record["rows_parsed"] += rows
+
+    def call(self, filepath, seconds, frames):
+        """
+        Count a loader or align_modality call to the current record
+        :param filepath: Feature file of the loader call, None for align
+        :param seconds: Wall time of the call
+        :param frames: Number of feature tuples returned
+        """
+        if self.current is None:
+            return
+        record = self.records[self.current]
+        record["calls"] += 1
+        record["wall_time"] += seconds
+        record["frames_kept"] += frames
+        if filepath is not None:
+            file_stats = self.files.setdefault(
+                filepath, {"modality": self.current[1], "calls": 0,
+                           "wall_time": 0.0, "frames_kept": 0})
+            file_stats["calls"] += 1
+            file_stats["wall_time"] += seconds
+            file_stats["frames_kept"] += frames
+        if self.hook is not None:
+            self.hook(self.current[0], self.current[1], self.current[2],
+                      filepath, seconds, frames)
+
+    def add_rows(self, rows):
+        """
+        Count rows parsed without reading a file, e.g. by align_modality
+        """
+        if self.current is not None:
+            self.records[self.current]["rows_parsed"] += rows
+
+    def slowest_files(self, count=10):
+        """
+        :returns: list of (filepath, file stats) by decreasing wall time
+        """
+        return sorted(self.files.iteritems(),
+                      key=lambda item: -item[1]["wall_time"])[:count]
+
+    def as_dict(self):
+        """
+        JSON serializable copy of the records and file counters
+        """
+        records = []
+        for (stage, modality, method), record in sorted(
+                self.records.iteritems()):
+            entry = {"stage": stage, "modality": modality, "method": method}
+            entry.update(record)
+            records.append(entry)
+        return {"records": records, "files": dict(self.files)}
+
+    def report(self, files=5):
+        """
+        Print the records, slowest first, and the slowest files
+        """
+        print "%-6s %-12s %-16s %6s %9s %6s %10s %9s %9s %9s" % (
+            "stage", "modality", "method", "calls", "time(s)", "files",
+            "MB read", "rows", "frames", "peak MB")
+        for (stage, modality, method), record in sorted(
+                self.records.iteritems(),
+                key=lambda item: -item[1]["wall_time"]):
+            print "%-6s %-12s %-16s %6d %9.3f %6d %10.2f %9d %9d %9s" % (
+                stage, modality, method, record["calls"],
+                record["wall_time"], record["files_opened"],
+                record["bytes_read"] / float(1 << 20), record["rows_parsed"],
+                record["frames_kept"],
+                "%.1f" % record["peak_rss_mb"]
+                if record["peak_rss_mb"] is not None else "-")
+        if files and self.files:
+            print "\nSlowest files"
+            for filepath, file_stats in self.slowest_files(files):
+                print "%9.3fs %6d calls %-12s %s" % (
+                    file_stats["wall_time"], file_stats["calls"],
+                    file_stats["modality"], filepath)
+
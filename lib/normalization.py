@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+The file contains the streaming feature statistics used to normalize
+modalities. RunningStats accumulates per-dimension count, mean, sum of
+squared deviations, min and max one block of frames at a time, combining
+blocks with the pairwise update of Chan et al., which stays accurate for
+long streams where the sum of squares formula does not. Values that are
+NaN or infinite, as FACET writes when no face is detected, are left out
+of the statistics and normalized to 0.
+"""
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+STATS_FIELDS = ("count", "mean", "m2", "min", "max")
+
+
+class RunningStats():
+    """
+    One-pass, NaN-aware per-dimension statistics of a stream of frames
+    """
+
+    def __init__(self, dim):
+        """
+        :param dim: Number of feature dimensions
+        """
+        self.dim = dim
+        self.count = np.zeros(dim, dtype=np.int64)
+        self.mean = np.zeros(dim, dtype=np.float64)
+        self.m2 = np.zeros(dim, dtype=np.float64)
+        self.min = np.full(dim, np.inf)
+        self.max = np.full(dim, -np.inf)
+
+    def update(self, values):
+        """
+        Add a block of frames.
+        :param values: Array of shape (frames, dim)
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, self.dim)
+        if not len(values):
+            return
+        finite = np.isfinite(values)
+        count = finite.sum(axis=0)
+        filled = np.where(finite, values, 0.0)
+        mean = filled.sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(finite, values - mean, 0.0) ** 2).sum(axis=0)
+        self._combine(count, mean, m2,
+                      np.where(finite, values, np.inf).min(axis=0),
+                      np.where(finite, values, -np.inf).max(axis=0))
+
+    def merge(self, other):
+        """
+        Add the frames accumulated by another RunningStats
+        """
+        self._combine(other.count, other.mean, other.m2, other.min,
+                      other.max)
+
+    def _combine(self, count, mean, m2, min_val, max_val):
+        total = self.count + count
+        safe_total = np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_total
+        self.count = total
+        self.min = np.minimum(self.min, min_val)
+        self.max = np.maximum(self.max, max_val)
+
+    @property
+    def var(self):
+        return self.m2 / np.maximum(self.count, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def apply(self, values, dtype=np.float32):
+        """
+        Normalize a block of frames to zero mean and unit variance. Values
+        that are NaN or infinite become 0, as do the dimensions with no
+        variance.
+        :returns: normalized array of the shape of values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        std = self.std
+        scale = np.where(std > 0, 1.0 / np.where(std > 0, std, 1.0), 0.0)
+        out = (values - self.mean) * scale
+        out[~np.isfinite(out)] = 0.0
+        return out.astype(dtype)
+
+    def to_dict(self):
+        return dict((field, getattr(self, field)) for field in STATS_FIELDS)
+
+    @classmethod
+    def from_dict(cls, fields):
+        stats = cls(len(fields["mean"]))
+        for field in STATS_FIELDS:
+            setattr(stats, field, np.array(fields[field]))
+        return stats
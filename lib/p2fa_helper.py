@@ -3,11 +3,16 @@
 The file contains the class and methods for loading textual features
 from P2FA files. Phonemes and words are loaded as one-hot embeddings
 """
+import hashlib
+import json
 import numpy as np 
-import pandas as pd
-from os import system
-from os.path import join
+from os import system, stat
+from os.path import join, exists
 import utils
+import embedding_cache
+import store
+from embedding_cache import EmbeddingTable
+from intervals import IntervalIndex
 
 __author__ = "Prateek Vij"
 __copyright__ = "Copyright 2017, Carnegie Mellon University"
@@ -23,7 +28,8 @@ class P2FA_Helper_v2():
     """
 
     def __init__(self, p2fa_csv, output_dir="./", embed_type = "w2v",
-                embed_model_path=None, embed_model_type='text'):
+                embed_model_path=None, embed_model_type='text',
+                output_format='csv', store_path=None, manifest_path=None):
         """
         Initialise P2FA helper class.
         :param p2fa_csv: Path to csv file containing fpaths of p2fa files
@@ -33,9 +39,21 @@ class P2FA_Helper_v2():
                 shall be created to store different features
         :param embed_type: Embeddding type - glove or w2v depending upon the
                 type of embedding dictionary you provide in embed_model_path
-        :param embed_model_path: Path to the embedding dictionary
+        :param embed_model_path: Path to the embedding dictionary, or the
+                prefix of a binary cache created by embedding_cache.convert,
+                which is detected and memory-mapped instead of parsed
         :param embed_dict_type: text or binary, valid only for word2vec model
                 file.
+        :param output_format: csv - one text file per segment, npz - one
+                binary file per video with absolute timestamps, store - one
+                feature store for the whole dataset (see store.py) that
+                can be opened with Dataset(store_path, stored=True)
+        :param store_path: Path to the feature store directory, used only
+                for output_format store. Defaults to output_dir/store and
+                is required if output_dir is a list
+        :param manifest_path: Path to the manifest of incremental loads.
+                Defaults to output_dir/p2fa_manifest.json, or the phonemes
+                directory if output_dir is a list
         return None
         """
         self.p2fa_csv = p2fa_csv
@@ -50,6 +68,15 @@ class P2FA_Helper_v2():
         self.embed_model = None
         self.word_dict = {}
         self.embed_model_type = embed_model_type
+        self.embed_stats = {}
+        self.output_format = output_format
+        self.store_path = store_path
+        self.store_writer = None
+        self.previous_store = None
+        self.manifest_path = manifest_path
+        self.dirty = None
+        self.fingerprints = {}
+        self.tier_cache = {}
 
         if self.embed_model_path:
             self.feat_count += 1
@@ -76,15 +103,34 @@ class P2FA_Helper_v2():
 
         else:
             raise ValueError("Invalid value for the param output_dir")
+
+        if output_format not in ("csv", "npz", "store"):
+            raise ValueError("Param output_format must be 'csv', 'npz' or "
+                             "'store'")
+        if output_format == "store" and not self.store_path:
+            if not isinstance(output_dir, str):
+                raise ValueError("Param store_path is required if output_dir "
+                                 "is a list")
+            self.store_path = join(output_dir, "store")
+        if not self.manifest_path:
+            self.manifest_path = join(output_dir if isinstance(output_dir, str)
+                                      else self.phonemes_dir,
+                                      "p2fa_manifest.json")
         return
 
-    def load(self):
+    def load(self, incremental=False):
         """
         Calls method validate_csv, compute phonemes, words, and
         word_embedding features and store them.
+        :param incremental: If True, only the segments whose P2FA file or
+                extraction parameters changed since the run recorded in
+                the manifest are re-extracted and rewritten. The returned
+                dictionaries then hold only the re-extracted segments.
         :return feature dictionary for phonemes, words, and embeddings
         """
         self.validate_csv()
+        if incremental:
+            self.plan_incremental()
         phonemes_feat_dict = self.load_phonemes()
         print "Loaded phonemes"
         # phonemes_feat_dict = None
@@ -98,6 +144,8 @@ class P2FA_Helper_v2():
             else:
                 embed_feat_dict = self.load_glove()
             self.feat_dict.append(embed_feat_dict)
+        if incremental:
+            self.save_manifest()
         return self.feat_dict
 
     def load_spanish(self):
@@ -125,6 +173,7 @@ class P2FA_Helper_v2():
         :raise Exception if file format is not correct
         :returns None
         """
+        import pandas as pd
         data = pd.read_csv(self.p2fa_csv, header=None)
         data = np.asarray(data)
         self.p2fa_feat_level = str(data[1][-1])
@@ -145,6 +194,133 @@ class P2FA_Helper_v2():
             self.dataset_info[video_id][segment_id] = segment_data
         return
 
+    def file_fingerprint(self, filepath):
+        """
+        md5 digest of the content of a P2FA file, computed once per file
+        """
+        if filepath not in self.fingerprints:
+            digest = hashlib.md5()
+            with open(filepath, "rb") as fh:
+                for block in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(block)
+            self.fingerprints[filepath] = digest.hexdigest()
+        return self.fingerprints[filepath]
+
+    def extraction_params(self):
+        """
+        Parameters that affect the extracted features, recorded in the
+        manifest. The embedding model is identified by size and mtime.
+        """
+        embed_model = None
+        if self.embed_model_path:
+            model_file = self.embed_model_path
+            cache_prefix = embedding_cache.find_cache(model_file)
+            if cache_prefix:
+                model_file = cache_prefix + ".f32"
+            model_stat = stat(model_file)
+            embed_model = [self.embed_type, self.embed_model_type,
+                           model_file, model_stat.st_size,
+                           int(model_stat.st_mtime)]
+        return {"level": self.p2fa_feat_level,
+                "output_format": self.output_format,
+                "embed_model": embed_model}
+
+    def segment_sources(self):
+        """
+        Current P2FA file fingerprint and interval of every segment
+        :returns {video_id: {segment_id: [fingerprint, start, end]}}
+        """
+        sources = {}
+        for video_id, video_data in self.dataset_info.iteritems():
+            sources[video_id] = {}
+            for segment_id, segment_data in video_data.iteritems():
+                fingerprint = self.file_fingerprint(segment_data["p2fa_file"])
+                sources[video_id][segment_id] = [fingerprint,
+                                                 segment_data["start"],
+                                                 segment_data["end"]]
+        return sources
+
+    def plan_incremental(self):
+        """
+        Compare the current P2FA files and parameters with the manifest of
+        the previous run and decide which segments each stage re-extracts.
+        Sets self.dirty to {stage: set of (video_id, segment_id)} and
+        restores the vocabulary of the previous run so that the one-hot
+        indices of unchanged segments stay valid.
+        """
+        manifest = {}
+        if exists(self.manifest_path):
+            with open(self.manifest_path, "r") as fh:
+                manifest = json.load(fh)
+        old_params = manifest.get("params", {})
+        old_sources = manifest.get("segments", {})
+        params = self.extraction_params()
+        sources = self.segment_sources()
+
+        every = set()
+        changed = set()
+        for video_id, video_sources in sources.iteritems():
+            for segment_id, source in video_sources.iteritems():
+                every.add((video_id, segment_id))
+                old_source = old_sources.get(video_id, {}).get(segment_id)
+                if old_source != source:
+                    changed.add((video_id, segment_id))
+
+        rebuild = (not manifest or old_params.get("level") != params["level"]
+                   or old_params.get("output_format")
+                   != params["output_format"])
+        if rebuild:
+            changed = every
+            self.vocabulary = []
+        else:
+            self.vocabulary = [w.encode("utf-8") for w
+                               in manifest.get("vocabulary", [])]
+
+        embed_changed = changed
+        if old_params.get("embed_model") != params["embed_model"]:
+            embed_changed = every
+
+        # npz files hold whole videos, so a changed segment dirties its video
+        if self.output_format == "npz":
+            changed_videos = set(video_id for video_id, _ in changed)
+            changed = set(key for key in every if key[0] in changed_videos)
+            changed_videos = set(video_id for video_id, _ in embed_changed)
+            embed_changed = set(key for key in every
+                                if key[0] in changed_videos)
+
+        self.dirty = {"phonemes": changed, "words": changed | embed_changed,
+                      "embeddings": embed_changed}
+        self.manifest = {"params": params, "segments": sources}
+        print "Incremental load: {} of {} segments changed".format(
+                len(changed), len(every))
+
+    def save_manifest(self):
+        """
+        Record the sources, parameters and vocabulary of the current run
+        """
+        self.manifest["vocabulary"] = self.vocabulary
+        with open(self.manifest_path, "w") as fh:
+            json.dump(self.manifest, fh)
+
+    def selected_segments(self, stage, exclude=None):
+        """
+        Segments a stage has to extract, all of them unless an incremental
+        load is in progress.
+        :param stage: phonemes, words or embeddings
+        :param exclude: Optional {video_id: {segment_id: ...}} to skip
+        :returns dictionary in the format of self.dataset_info
+        """
+        selected = {}
+        for video_id, video_data in self.dataset_info.iteritems():
+            for segment_id, segment_data in video_data.iteritems():
+                if (self.dirty is not None
+                        and (video_id, segment_id) not in self.dirty[stage]):
+                    continue
+                if exclude and segment_id in exclude.get(video_id, {}):
+                    continue
+                selected.setdefault(video_id, {})[segment_id] = segment_data
+        return selected
+
     def load_phonemes(self):
         """
         Load phonemes as one-hot embeddings from P2FA files and store them
@@ -152,8 +328,7 @@ class P2FA_Helper_v2():
         :returns segment wise feature dictionary for phoneme
         """
         features = {}
-        system("mkdir -p "+self.phonemes_dir)
-        data = self.dataset_info
+        data = self.selected_segments("phonemes")
         for video_id, video_data in data.iteritems():
             video_feats = {}
             for segment_id, segment_data in video_data.iteritems():
@@ -164,19 +339,8 @@ class P2FA_Helper_v2():
                 segment_feats = self.load_phonemes_for_seg(filepath,
                                                             start, end, level)
                 video_feats[segment_id] = segment_feats
-                fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.phonemes_dir,fname)
-                with open(fpath,"wb") as fh:
-                    # Writing each feature in csv file for segment
-                    for f in segment_feats:
-                        f_start = str(f[0])
-                        f_end = str(f[1])
-                        f_val = [str(val) for val in f[2].tolist()]
-                        str2write = ",".join([f_start, f_end] + f_val)
-                        str2write += "\n"
-                        fh.write(str2write)
-
             features[video_id] = video_feats
+        self.write_feats("phonemes", self.phonemes_dir, features)
         return features
 
     def load_words(self):
@@ -186,25 +350,18 @@ class P2FA_Helper_v2():
         :returns segment wise feature dictionary for words
         """
         word_dict = {}
-        system("mkdir -p "+self.words_dir)
-        data = self.dataset_info
-        for video_id, video_data in data.iteritems():
-            video_word_dict = {}
-            for segment_id, segment_data in video_data.iteritems():
-                filepath = str(segment_data["p2fa_file"])
-                start = segment_data["start"]
-                end = segment_data["end"]
-                level = self.p2fa_feat_level
-                segment_feats = self.load_words_for_seg(filepath, start,
-                                                        end, level)
-                words = [ str(val[2]).lower() for val in segment_feats ]
-                for w in words:
-                    if w not in self.vocabulary:
-                        self.vocabulary.append(w)
-                video_word_dict[segment_id] = segment_feats
-                
-            word_dict[video_id] = video_word_dict
-        
+        vocabulary_size = len(self.vocabulary)
+        self.parse_words(self.selected_segments("words"), word_dict)
+        if self.dirty is not None and len(self.vocabulary) > vocabulary_size:
+            # New words change the one-hot length of every segment
+            print "Vocabulary grew, rewriting all the word features"
+            every = set((video_id, segment_id) for video_id, video_data
+                        in self.dataset_info.iteritems()
+                        for segment_id in video_data)
+            self.dirty["words"] = every
+            self.dirty["embeddings"] = every
+            self.parse_words(self.selected_segments("words", word_dict),
+                             word_dict)
         self.word_dict = word_dict
 
         features = {}
@@ -218,20 +375,32 @@ class P2FA_Helper_v2():
                     value = np.zeros(len(self.vocabulary))
                     value[self.vocabulary.index(word_feat[2].lower())] = 1
                     video_feats[segment_id].append((start, end, value))
-                fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.words_dir, fname)
-                with open(fpath,"wb") as fh:
-                    # Writing each feature in csv file for segment
-                    for f in video_feats[segment_id]:
-                        f_start = str(f[0])
-                        f_end = str(f[1])
-                        f_val = [str(val) for val in f[2].tolist()]
-                        str2write = ",".join([f_start, f_end] + f_val)
-                        str2write += "\n"
-                        fh.write(str2write)
             features[video_id] = video_feats
+        self.write_feats("words", self.words_dir, features)
         return features
 
+    def parse_words(self, data, word_dict):
+        """
+        Read the words of the segments in data into word_dict and extend
+        the vocabulary with them.
+        :param data: segments in the format of self.dataset_info
+        :param word_dict: {video_id: {segment_id: [(start, end, word)]}}
+        """
+        for video_id, video_data in data.iteritems():
+            video_word_dict = word_dict.setdefault(video_id, {})
+            for segment_id, segment_data in video_data.iteritems():
+                filepath = str(segment_data["p2fa_file"])
+                start = segment_data["start"]
+                end = segment_data["end"]
+                level = self.p2fa_feat_level
+                segment_feats = self.load_words_for_seg(filepath, start,
+                                                        end, level)
+                words = [ str(val[2]).lower() for val in segment_feats ]
+                for w in words:
+                    if w not in self.vocabulary:
+                        self.vocabulary.append(w)
+                video_word_dict[segment_id] = segment_feats
+
     def load_spanish_words(self):
         """
         Load words as one-hot embeddings from P2FA files and store them
@@ -239,7 +408,6 @@ class P2FA_Helper_v2():
         :returns segment wise feature dictionary for words
         """
         word_dict = {}
-        system("mkdir -p "+self.words_dir)
         data = self.dataset_info
         for video_id, video_data in data.iteritems():
             video_word_dict = {}
@@ -271,18 +439,8 @@ class P2FA_Helper_v2():
                     value = np.zeros(len(self.vocabulary))
                     value[self.vocabulary.index(word_feat[2].lower())] = 1
                     video_feats[segment_id].append((start, end, value))
-                fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.words_dir, fname)
-                with open(fpath,"wb") as fh:
-                    # Writing each feature in csv file for segment
-                    for f in video_feats[segment_id]:
-                        f_start = str(f[0])
-                        f_end = str(f[1])
-                        f_val = [str(val) for val in f[2].tolist()]
-                        str2write = ",".join([f_start, f_end] + f_val)
-                        str2write += "\n"
-                        fh.write(str2write)
             features[video_id] = video_feats
+        self.write_feats("words", self.words_dir, features)
         return features
 
     def load_w2v(self):
@@ -293,45 +451,16 @@ class P2FA_Helper_v2():
         :returns segment wise feature dictionary for embeddings
         :Note: Do not provide KeyedVector file in binary format
         """
-        from gensim.models.keyedvectors import KeyedVectors
-        from gensim.models import Word2Vec
-        
-        is_binary = True if self.embed_model_type == "binary" else False
-        model = KeyedVectors.load_word2vec_format(self.embed_model_path, 
-                                                  binary = is_binary )
-        print "Word2Vec model Loaded"
-        self.embed_model = model
-        self.embed_length = model.vector_size
-        if not self.word_dict:
-            self.load_words()
-        
-        features = {}
-        system("mkdir -p "+self.embedding_dir)
-        for video_id, video_word_data in self.word_dict.iteritems():
-            video_feats = {}
-            for segment_id, segment_word_data in video_word_data.iteritems():
-                video_feats[segment_id] = []
-                for word_feat in segment_word_data:
-                    start, end, word = word_feat
-                    try:
-                        embed = self.embed_model[word]
-                    except:
-                        embed = np.zeros(self.embed_length)
-                    video_feats[segment_id].append((start, end, embed))
+        if not self.load_embed_cache():
+            from gensim.models.keyedvectors import KeyedVectors
 
-                fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.embedding_dir, fname)
-                with open(fpath,"wb") as fh:
-                    # Writing each feature in csv file for segment
-                    for f in video_feats[segment_id]:
-                        f_start = str(f[0])
-                        f_end = str(f[1])
-                        f_val = [str(val) for val in f[2].tolist()]
-                        str2write = ",".join([f_start, f_end] + f_val)
-                        str2write += "\n"
-                        fh.write(str2write)
-            features[video_id] = video_feats
-        return features
+            is_binary = True if self.embed_model_type == "binary" else False
+            model = KeyedVectors.load_word2vec_format(self.embed_model_path, 
+                                                      binary = is_binary )
+            print "Word2Vec model Loaded"
+            self.embed_model = EmbeddingTable.from_keyed_vectors(model)
+            self.embed_length = self.embed_model.vector_size
+        return self.embed_words()
 
     def load_glove(self):
         """
@@ -339,94 +468,167 @@ class P2FA_Helper_v2():
         store them in directory path mentioned in self.embedding_dir.
         :returns segment wise feature dictionary for embeddings
         """
-        self.embed_model = {}
-        self.embed_length = 0
-        with open(self.embed_model_path, "r") as fh:
-            for line in fh:
-                splits = line.rstrip().split()
-                word = splits[0]
-                embedding = np.asarray([float(val) for val in splits[1:]])
-                self.embed_model[word] = embedding
-                if not self.embed_length:
-                    self.embed_length = len(embedding)
-
-        if not self.word_dict:
-            self.load_words()
-        
-        features = {}
-        system("mkdir -p "+self.embedding_dir)
-        for video_id, video_word_data in self.word_dict.iteritems():
-            video_feats = {}
-            for segment_id, segment_word_data in video_word_data.iteritems():
-                video_feats[segment_id] = []
-                for word_feat in segment_word_data:
-                    start, end, word = word_feat
-                    try:
-                        embed = self.embed_model[word]
-                    except:
-                        embed = np.zeros(self.embed_length)
-                    video_feats[segment_id].append((start, end, embed))
-
-                fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.embedding_dir, fname)
-                with open(fpath,"wb") as fh:
-                    # Writing each feature in csv file for segment
-                    for f in video_feats[segment_id]:
-                        f_start = str(f[0])
-                        f_end = str(f[1])
-                        f_val = [str(val) for val in f[2].tolist()]
-                        str2write = ",".join([f_start, f_end] + f_val)
-                        str2write += "\n"
-                        fh.write(str2write)
-            features[video_id] = video_feats
-        return features
+        if not self.load_embed_cache():
+            # float64 as parsed, so the embedding CSVs keep their values
+            self.embed_model = EmbeddingTable.from_text(
+                                    self.embed_model_path, np.float64)
+            self.embed_length = self.embed_model.vector_size
+        return self.embed_words()
 
     def load_spanish_wv(self):
-        self.embed_model = {}
-        self.embed_length = 0
-        with open(self.embed_model_path, "r") as fh:
-            i = 0
-            for line in fh:
-                i += 1
-                if i == 1:
-                    continue
-                line = line.split()
-                word = line[0]
-                embedding = [float(x) for x in line[1:]]
-                self.embed_model[word] = embedding
-                if not self.embed_length:
-                    self.embed_length = len(embedding)
-
+        if not self.load_embed_cache():
+            self.embed_model = EmbeddingTable.from_text(
+                                    self.embed_model_path, np.float64,
+                                    has_header=True)
+            self.embed_length = self.embed_model.vector_size
+        return self.embed_words()
+
+    def load_embed_cache(self):
+        """
+        Memory-map the embedding model if embed_model_path points to a
+        binary cache created by embedding_cache.convert.
+        :returns True if the cache was found and loaded, False otherwise
+        """
+        if not embedding_cache.find_cache(self.embed_model_path):
+            return False
+        self.embed_model = embedding_cache.EmbeddingCache(
+                                                self.embed_model_path)
+        self.embed_length = self.embed_model.vector_size
+        print "Embedding cache memory-mapped"
+        return True
+
+    def embed_words(self):
+        """
+        Compute the embeddings of every segment from self.embed_model and
+        store them in the directory path mentioned in self.embedding_dir.
+        The words of a segment are mapped to matrix rows, OOV words to the
+        shared zero row, and the (tokens, embed_length) block of the
+        segment is gathered at once. OOV statistics are kept in
+        self.embed_stats.
+        :returns segment wise feature dictionary for embeddings
+        """
         if not self.word_dict:
             self.load_words()
 
+        model = self.embed_model
+        selected = self.selected_segments("embeddings")
+        oov_counts = {}
+        segment_oov = {}
+        token_count, oov_count = 0, 0
         features = {}
-        system("mkdir -p "+self.embedding_dir)
         for video_id, video_word_data in self.word_dict.iteritems():
             video_feats = {}
             for segment_id, segment_word_data in video_word_data.iteritems():
-                video_feats[segment_id] = []
-                for word_feat in segment_word_data:
-                    start, end, word = word_feat
-                    try:
-                        embed = self.embed_model[word]
-                    except:
-                        embed = np.zeros(self.embed_length)
-                    video_feats[segment_id].append((start, end, embed))
+                if segment_id not in selected.get(video_id, {}):
+                    continue
+                words = [word_feat[2] for word_feat in segment_word_data]
+                row_ids = model.row_ids_for(words)
+                block = model.vectors[row_ids]
+                video_feats[segment_id] = [(word_feat[0], word_feat[1],
+                                            block[i]) for i, word_feat
+                                           in enumerate(segment_word_data)]
+
+                oov = row_ids == model.oov_row
+                for i in np.flatnonzero(oov):
+                    oov_counts[words[i]] = oov_counts.get(words[i], 0) + 1
+                token_count += len(words)
+                oov_count += int(oov.sum())
+                segment_oov[(video_id, segment_id)] = (oov.mean()
+                                                       if len(words) else 0.0)
+            features[video_id] = video_feats
+        self.write_feats("embeddings", self.embedding_dir, features)
+
+        self.embed_stats = {
+            "tokens": token_count,
+            "oov_tokens": oov_count,
+            "oov_rate": float(oov_count) / token_count if token_count else 0.0,
+            "oov_words": oov_counts,
+            "segment_oov_rate": segment_oov
+        }
+        print "Embedded {} tokens, OOV rate {:.2%} ({} distinct OOV words)"\
+                .format(token_count, self.embed_stats["oov_rate"],
+                        len(oov_counts))
+        return features
 
+    def write_feats(self, name, out_dir, features):
+        """
+        Store the features of a P2FA stage in self.output_format.
+        csv writes out_dir/<video_id>_<segment_id>.csv, npz writes
+        out_dir/<video_id>.npz and store adds the modality name to the
+        feature store at self.store_path.
+        :param name: phonemes, words or embeddings
+        :param out_dir: Output directory of the stage
+        :param features: segment wise feature dictionary of the stage
+        """
+        if self.output_format == "store":
+            if self.store_writer is None:
+                if self.dirty is not None and store.is_store(self.store_path):
+                    # Opened before StoreWriter resets the modalities of a
+                    # store whose segment list changed
+                    self.previous_store = store.FeatureStore(self.store_path)
+                timestamps = ("relative" if self.p2fa_feat_level == 's'
+                              else "absolute")
+                self.store_writer = store.StoreWriter(self.store_path,
+                            store.segment_order(self.dataset_info), timestamps)
+            info = {"type": name, "level": "s"}
+            if self.dirty is not None:
+                features = self.merge_previous(name, features)
+            self.store_writer.add_modality(name, features, info)
+            return
+
+        system("mkdir -p "+out_dir)
+        for video_id, video_feats in features.iteritems():
+            if self.output_format == "npz":
+                starts = None
+                if self.p2fa_feat_level == 's':
+                    starts = dict((segment_id, segment_data["start"])
+                                  for segment_id, segment_data
+                                  in self.dataset_info[video_id].iteritems())
+                fpath = join(out_dir, video_id+".npz")
+                store.write_video_npz(fpath, video_feats, starts)
+                continue
+
+            for segment_id, segment_feats in video_feats.iteritems():
                 fname = video_id+"_"+segment_id+".csv"
-                fpath = join(self.embedding_dir, fname)
+                fpath = join(out_dir, fname)
                 with open(fpath,"wb") as fh:
                     # Writing each feature in csv file for segment
-                    for f in video_feats[segment_id]:
+                    for f in segment_feats:
                         f_start = str(f[0])
                         f_end = str(f[1])
                         f_val = [str(val) for val in f[2]]
                         str2write = ",".join([f_start, f_end] + f_val)
                         str2write += "\n"
                         fh.write(str2write)
-            features[video_id] = video_feats
-        return features
+
+    def merge_previous(self, name, features):
+        """
+        Add the segments an incremental load did not re-extract, read from
+        the feature store of the previous run by video_id and segment_id.
+        :param name: phonemes, words or embeddings
+        :param features: segment wise feature dictionary of the re-extracted
+                segments
+        :returns segment wise feature dictionary of every segment
+        """
+        previous = {}
+        if (self.previous_store is not None
+                and name in self.previous_store.modalities):
+            previous = self.previous_store.feature_dict(name,
+                                                self.store_writer.timestamps)
+        merged = {}
+        for video_id, video_data in self.dataset_info.iteritems():
+            for segment_id in video_data:
+                if segment_id in features.get(video_id, {}):
+                    segment_feats = features[video_id][segment_id]
+                elif segment_id in previous.get(video_id, {}):
+                    segment_feats = previous[video_id][segment_id]
+                else:
+                    raise ValueError("Segment " + segment_id + " of video "
+                                     + video_id + " is missing in the store "
+                                     + self.store_path + ", load without "
+                                     "incremental to rebuild it")
+                merged.setdefault(video_id, {})[segment_id] = segment_feats
+        return merged
 
     def get_vocabulary(self):
         """
@@ -436,144 +638,84 @@ class P2FA_Helper_v2():
         """
         return self.vocabulary
 
-    def load_phonemes_for_seg(self, filepath, start, end, level):
-        features = []
-        if level == 's':
-            with open(filepath,'r') as f_handle:
-                # Read the file content after the first 12 header lines
-                f_content = f_handle.readlines()[12:]
-
-            for i in range(len(f_content)):
-                line = f_content[i].strip()
-                if not line:
-                    continue
-
-                # When phonemes are over, stop reading the file
-                if line == '"IntervalTier"':
-                    break           
-
-                if i%3 == 0:
-                    feat_start = float(line)
-
-                elif i%3 == 1:
-                    feat_end = float(line)
-
-                else:
-                    if line.startswith('"') and line.endswith('"'):
-                        phoneme_val = line[1:-1]
-                        feat_val = utils.phoneme_hotkey_enc(phoneme_val)    
-                        features.append((feat_start, feat_end, feat_val))
-                    else:
-                        raise ValueError("File format error at line "+str(i))
-        else:
-            # Read the file content after the first 12 header lines
-            with open(filepath,'r') as f_handle:
-                f_content = f_handle.readlines()[12:]
-
-            for i in range(len(f_content)):
-                line = f_content[i].strip()
-                if not line:
-                    continue
-
-                # When phonemes are over, stop reading the file
-                if line == '"IntervalTier"':
-                    break           
-
-                if i%3 == 0:
-                    feat_start = float(line)
-
-                elif i%3 == 1:
-                    feat_end = float(line)
-
-                else:
-                    if line.startswith('"') and line.endswith('"'):
-                        feat_time = feat_end - feat_start
-
-                        # Ensuring the feature lies in the segment
-                        if ((feat_start <= start and feat_end > end) 
-                           or (feat_start >= start and feat_end < end)
-                           or (feat_start <= start 
-                              and start-feat_start < feat_time/2)
-                           or (feat_start >= start
-                              and end - feat_start > feat_time/2)):
-
-                            phoneme_val = line[1:-1]
-                            feat_val = utils.phoneme_hotkey_enc(phoneme_val)
-                            features.append((feat_start, feat_end, feat_val))
-                    else:
-                        raise ValueError("File format error at line "+str(i))
-
-        return features
-
-    def load_words_for_seg(self, filepath, start, end, level):
-        features = []
+    def read_tier(self, filepath, tier):
+        """
+        Read the phoneme or word tier of a P2FA file into a list of
+        (feat_start, feat_end, label) and its IntervalIndex. The last file
+        read is kept, as consecutive segments of a video share the file.
+        Silences ("sp") are dropped from the word tier.
+        :param tier: phonemes or words
+        :returns tuple (intervals, index)
+        """
+        key = (filepath, tier)
+        if key in self.tier_cache:
+            return self.tier_cache[key]
 
-        file_offset = 0
         header_offset = 12
         with open(filepath,'r') as f_handle:
             f_content = f_handle.readlines()[header_offset:]
+
+        if tier == "words":
+            file_offset = 0
             for i in range(len(f_content)):
                 line = f_content[i].rstrip()
                 if line == '"IntervalTier"':
                     file_offset = i + 5
-        
-        f_content = f_content[file_offset:]
-        if level == 's':
-            for i in range(len(f_content)):
-                line = f_content[i].strip()
-                if not line:
-                    continue
+            f_content = f_content[file_offset:]
 
-                if i%3 == 0:
-                    feat_start = float(line)
+        intervals = []
+        for i in range(len(f_content)):
+            line = f_content[i].strip()
+            if not line:
+                continue
 
-                elif i%3 == 1:
-                    feat_end = float(line)
+            # When phonemes are over, stop reading the file
+            if tier == "phonemes" and line == '"IntervalTier"':
+                break
 
-                else:
-                    if line.startswith('"') and line.endswith('"'):
-                        word = line[1:-1].lower()
-                        if word == "sp":
-                            continue
-                        feat_val = word
-                        features.append((feat_start, feat_end, feat_val))
-                    else:
-                        raise ValueError("File format error at line "+str(i))
-        else:
-            for i in range(len(f_content)):
-                line = f_content[i].strip()
-                if not line:
-                    continue
+            if i%3 == 0:
+                feat_start = float(line)
 
-                if i%3 == 0:
-                    feat_start = float(line)
-
-                elif i%3 == 1:
-                    feat_end = float(line)
+            elif i%3 == 1:
+                feat_end = float(line)
 
+            else:
+                if line.startswith('"') and line.endswith('"'):
+                    label = line[1:-1]
+                    if tier == "words":
+                        label = label.lower()
+                        if label == "sp":
+                            continue
+                    intervals.append((feat_start, feat_end, label))
                 else:
-                    if line.startswith('"') and line.endswith('"'):
-                        feat_time = feat_end - feat_start
-
-                        # Ensuring the feature lies in the segment
-                        if ((feat_start <= start and feat_end > end) 
-                           or (feat_start >= start and feat_end < end)
-                           or (feat_start <= start 
-                              and start-feat_start < feat_time/2)
-                           or (feat_start >= start
-                              and end - feat_start > feat_time/2)):
-
-                            word = line[1:-1].lower()
-                            if word == "sp":
-                                continue
-                            feat_val = word
-                           
-                            features.append((feat_start, feat_end, feat_val))
-                    else:
-                        raise ValueError("File format error at line "+str(i))
+                    raise ValueError("File format error at line "+str(i))
+
+        index = IntervalIndex([f[0] for f in intervals],
+                              [f[1] for f in intervals])
+        self.tier_cache = {key: (intervals, index)}
+        return self.tier_cache[key]
+
+    def segment_intervals(self, filepath, tier, start, end, level):
+        """
+        Intervals of a tier that belong to the segment (start, end). For
+        level 'v' the half overlap rule of intervals.half_overlap_mask is
+        applied, for level 's' the whole file belongs to the segment.
+        """
+        intervals, index = self.read_tier(filepath, tier)
+        if level == 's':
+            return intervals
+        return [intervals[i] for i in index.window(start, end)]
 
+    def load_phonemes_for_seg(self, filepath, start, end, level):
+        features = []
+        for feat_start, feat_end, phoneme_val in self.segment_intervals(
+                                filepath, "phonemes", start, end, level):
+            feat_val = utils.phoneme_hotkey_enc(phoneme_val)
+            features.append((feat_start, feat_end, feat_val))
         return features
 
+    def load_words_for_seg(self, filepath, start, end, level):
+        return self.segment_intervals(filepath, "words", start, end, level)
 
     def load_spanish_words_for_seg(self, filepath, start, end, level):
         features = []
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+The file contains the read-ahead buffer used by Dataset to overlap disk
+reads with parsing. A pool of I/O threads reads the raw bytes of the
+feature files in the order the loaders will need them, bounded by the
+number of files and bytes held in the buffer, while the loaders parse the
+files already read.
+"""
+import os
+import threading
+import time
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+class Prefetcher():
+    """
+    Reads a planned sequence of files ahead of their use
+    """
+
+    def __init__(self, plan, workers=4, depth=32, max_bytes=256 << 20):
+        """
+        Start the I/O threads.
+        :param plan: File paths in the order of use, one entry per use, so
+                     plan[i] is the file of the i-th loader call. Repeated
+                     paths are read once and kept until their last use
+        :param workers: Number of I/O threads
+        :param depth: Maximum number of files held in the buffer
+        :param max_bytes: Maximum number of bytes held in the buffer. A
+                          larger file is read when the buffer is empty
+        """
+        self.depth = depth
+        self.max_bytes = max_bytes
+        self.order = []
+        self.last_use = {}
+        for position, path in enumerate(plan):
+            if path not in self.last_use:
+                self.order.append(path)
+            self.last_use[path] = position
+        self.data = {}
+        self.sizes = {}
+        self.reserved = set()
+        self.in_flight = 0
+        self.bytes_in_flight = 0
+        self.next = 0
+        self.position = 0
+        self.closed = False
+        self.hits = 0
+        self.misses = 0
+        self.wait_time = 0.0
+        self.cond = threading.Condition()
+        self.threads = []
+        for _ in range(max(workers, 1)):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def _size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _has_room(self, size):
+        if not self.in_flight:
+            return True
+        return (self.in_flight < self.depth
+                and self.bytes_in_flight + size <= self.max_bytes)
+
+    def _can_reserve(self, path):
+        """
+        False if path was passed, or if the I/O threads wait for room that
+        only later uses would free
+        """
+        if self.last_use[path] < self.position:
+            return False
+        if self.next < len(self.order):
+            return self._has_room(self._size(self.order[self.next]))
+        return False
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                # Files are reserved strictly in plan order, so the buffer
+                # never fills with files needed after the one being waited on
+                while True:
+                    if self.closed or self.next >= len(self.order):
+                        return
+                    path = self.order[self.next]
+                    size = self._size(path)
+                    if self.last_use[path] < self.position:
+                        # Already passed, never needed
+                        self.next += 1
+                        continue
+                    if self._has_room(size):
+                        break
+                    self.cond.wait()
+                self.next += 1
+                self.reserved.add(path)
+                self.sizes[path] = size
+                self.in_flight += 1
+                self.bytes_in_flight += size
+            try:
+                with open(path, "rb") as f_handle:
+                    content = f_handle.read()
+            except (IOError, OSError):
+                # The loader reads the file itself and raises the error
+                content = None
+            with self.cond:
+                if path in self.reserved:
+                    self.data[path] = content
+                self.cond.notify_all()
+
+    def _release(self, path):
+        if path in self.reserved:
+            self.reserved.discard(path)
+            self.data.pop(path, None)
+            self.in_flight -= 1
+            self.bytes_in_flight -= self.sizes.pop(path)
+
+    def advance(self, position):
+        """
+        Move to the position-th use of the plan, releasing the files whose
+        last use is before it
+        """
+        with self.cond:
+            self.position = position
+            for path in list(self.reserved):
+                if self.last_use[path] < position:
+                    self._release(path)
+            self.cond.notify_all()
+
+    def take(self, path):
+        """
+        Raw bytes of path, waiting for the I/O threads if needed.
+        :returns: file content, or None if the file is not planned, failed
+                  to read, or cannot be buffered now; the caller then reads
+                  it directly
+        """
+        if path not in self.last_use:
+            self.misses += 1
+            return None
+        wait_start = time.time()
+        with self.cond:
+            while path not in self.data:
+                if self.closed or (path not in self.reserved
+                                   and not self._can_reserve(path)):
+                    self.misses += 1
+                    return None
+                self.cond.wait()
+            content = self.data[path]
+        self.wait_time += time.time() - wait_start
+        if content is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return content
+
+    def close(self):
+        """
+        Stop the I/O threads and drop the buffer
+        """
+        with self.cond:
+            self.closed = True
+            for path in list(self.reserved):
+                self._release(path)
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""
+The file contains the multi-resolution pyramid of time-distributed
+features. A level splits every segment into bins of a fixed width, the
+last bin of a segment ending at the segment end, and the segment level has
+one bin per segment. For every bin it holds
+    means       time integral of the values over the bin, the sum of
+                value * overlap over the frames, divided by the bin length
+    coverage    time of the bin covered by frames
+so the means of a bin are the features Dataset.align_modality gives for
+the bin interval, and means * length / coverage is the mean over the time
+covered by frames. Only the finest level is integrated from the frames,
+with prefix sums over the frames sorted by start and by end time. A level
+whose width is a multiple of a finer one adds up the integrals of its bins
+with a single reduceat over the bins of all the segments.
+
+The levels are kept in the store layout, the bins of every segment being
+the slice offsets[i]:offsets[i + 1] of the arrays.
+"""
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+SEGMENT_LEVEL = "segment"
+
+
+def level_name(level):
+    """
+    Name of a level in a store, e.g. 0.1 or segment
+    """
+    if level == SEGMENT_LEVEL:
+        return SEGMENT_LEVEL
+    return "%g" % level
+
+
+def bin_edges(start, end, width):
+    """
+    Edges of the bins of width seconds from start, the last one ending at
+    end. A segment shorter than width has one bin.
+    :param width: Bin width in seconds, or SEGMENT_LEVEL for one bin
+    """
+    if width == SEGMENT_LEVEL:
+        return np.asarray([start, end], dtype=np.float64)
+    if width <= 0:
+        raise ValueError("Bin width must be positive")
+    # Rounding keeps a length of exactly k widths at k bins
+    count = max(int(np.ceil(round((end - start) / width, 9))), 1)
+    edges = start + width * np.arange(count + 1, dtype=np.float64)
+    edges[-1] = max(end, start)
+    return edges
+
+
+def integrate(starts, ends, values, edges):
+    """
+    Time integral of the frames over every bin. The integral of a frame
+    up to time t is value * (min(t, end) - start) once it started, so the
+    integral of all the frames up to every edge is two prefix sums over
+    the frames, sorted by start and by end time. NaN and infinite values
+    are left out of the integrals.
+    :param starts: Start times of the frames, shape (n,)
+    :param ends: End times of the frames, shape (n,)
+    :param values: Feature values of the frames, shape (n, dim)
+    :param edges: Sorted bin edges, shape (bins + 1,)
+    :returns: tuple (integrals, coverage) of shapes (bins, dim) and (bins,)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count, dim = values.shape
+    # Times from the first edge keep the products small
+    origin = edges[0]
+    starts = np.asarray(starts, dtype=np.float64) - origin
+    ends = np.maximum(np.asarray(ends, dtype=np.float64) - origin, starts)
+    edges = edges - origin
+    # The last column integrates 1, the coverage
+    weights = np.ones((count, dim + 1))
+    weights[:, :dim] = np.where(np.isfinite(values), values, 0.0)
+
+    def prefix(times):
+        order = np.argsort(times, kind="mergesort")
+        sums = np.zeros((count + 1, dim + 1))
+        timed = np.zeros((count + 1, dim + 1))
+        np.cumsum(weights[order], axis=0, out=sums[1:])
+        np.cumsum(weights[order] * times[order, None], axis=0,
+                  out=timed[1:])
+        k = np.searchsorted(times[order], edges, "right")
+        return edges[:, None] * sums[k] - timed[k]
+
+    cumulative = prefix(starts) - prefix(ends)
+    integrals = np.diff(cumulative, axis=0)
+    return integrals[:, :dim], integrals[:, dim]
+
+
+def coarsen(intervals, integrals, coverage, offsets, factor=None):
+    """
+    Level of bins factor times wider than a level, adding up its bins
+    within every segment.
+    :param intervals: Bins of the finer level, shape (bins, 2)
+    :param integrals: Time integrals of the bins, shape (bins, dim)
+    :param coverage: Covered time of the bins, shape (bins,)
+    :param offsets: First bin of every segment, shape (segments + 1,)
+    :param factor: Integer ratio of the widths, None for one bin per
+                   segment
+    :returns: tuple (intervals, integrals, coverage, offsets) of the
+              coarser level
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    if factor is None:
+        new_counts = np.minimum(counts, 1)
+    else:
+        new_counts = -(-counts // factor)
+    new_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(new_counts, out=new_offsets[1:])
+    # First finer bin of every coarser bin
+    first = np.repeat(offsets[:-1], new_counts)
+    segment_ends = np.repeat(offsets[1:], new_counts)
+    if factor is None:
+        last = segment_ends - 1
+    else:
+        first += factor * (np.arange(new_offsets[-1])
+                           - np.repeat(new_offsets[:-1], new_counts))
+        last = np.minimum(first + factor, segment_ends) - 1
+    new_intervals = np.empty((len(first), 2))
+    new_intervals[:, 0] = intervals[first, 0]
+    new_intervals[:, 1] = intervals[last, 1]
+    if not len(first):
+        return (new_intervals, integrals[:0], coverage[:0], new_offsets)
+    return (new_intervals, np.add.reduceat(integrals, first, axis=0),
+            np.add.reduceat(coverage, first), new_offsets)
+
+
+def means(intervals, integrals, coverage, normalize="interval"):
+    """
+    Mean values of bins from their time integrals.
+    :param normalize: interval to divide by the bin length, as
+                      Dataset.align_modality does, coverage to divide by
+                      the time covered by frames, NaN for bins without
+                      frames
+    """
+    if normalize == "interval":
+        lengths = intervals[:, 1] - intervals[:, 0]
+    elif normalize == "coverage":
+        lengths = np.asarray(coverage, dtype=np.float64)
+    else:
+        raise ValueError("Param normalize must be interval or coverage")
+    lengths = np.where(lengths > 0, lengths, np.nan)
+    return integrals / lengths[:, None]
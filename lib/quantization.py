@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+The file contains the affine quantization of feature values used by the
+quantized feature store. Every dimension is mapped linearly from its range
+[min, max] onto the codes of an int8 or int16, so a value is stored as
+    code = round((value - offset) / scale)
+    value = code * scale + offset
+with an error of at most scale / 2. The lowest code of the integer type is
+reserved for NaN, FACET writes NaN when no face is detected, and infinite
+values are clipped to the range.
+"""
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+QUANT_DTYPES = {"int8": np.int8, "int16": np.int16}
+
+
+def code_range(dtype):
+    """
+    :returns: tuple (nan_code, lowest value code, highest value code)
+    """
+    info = np.iinfo(dtype)
+    return info.min, info.min + 1, info.max
+
+
+def affine_params(min_val, max_val, dtype):
+    """
+    Per-dimension scale and offset mapping [min_val, max_val] onto the
+    value codes of dtype. Dimensions without finite values or with a
+    single value get a scale of 1.
+    :param min_val: Per-dimension minimum, e.g. RunningStats.min
+    :param max_val: Per-dimension maximum, e.g. RunningStats.max
+    :param dtype: int8 or int16, name or numpy type
+    :returns: tuple (scale, offset) of float64 arrays
+    """
+    _, low, high = code_range(np.dtype(QUANT_DTYPES.get(dtype, dtype)))
+    min_val = np.asarray(min_val, dtype=np.float64)
+    max_val = np.asarray(max_val, dtype=np.float64)
+    finite = np.isfinite(min_val) & np.isfinite(max_val)
+    min_val = np.where(finite, min_val, 0.0)
+    spread = np.where(finite, max_val - min_val, 0.0)
+    scale = np.where(spread > 0, spread / float(high - low), 1.0)
+    offset = min_val - low * scale
+    return scale, offset
+
+
+def quantize(values, scale, offset, dtype):
+    """
+    Codes of a block of values, NaN to the lowest code.
+    :param values: Array of shape (frames, dim)
+    :returns: array of dtype and of the shape of values
+    """
+    dtype = np.dtype(QUANT_DTYPES.get(dtype, dtype))
+    nan_code, low, high = code_range(dtype)
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.rint((values - offset) / scale)
+    np.clip(codes, low, high, out=codes)
+    codes[np.isnan(values)] = nan_code
+    return codes.astype(dtype)
+
+
+def dequantize(codes, scale, offset, dtype=np.float32):
+    """
+    Values of a block of codes, the lowest code to NaN.
+    :param codes: Integer array of shape (frames, dim)
+    :returns: array of dtype and of the shape of codes
+    """
+    codes = np.asarray(codes)
+    nan_code, _, _ = code_range(codes.dtype)
+    values = codes * scale + offset
+    values[codes == nan_code] = np.nan
+    return values.astype(dtype)
+
+
+def error_stats(reference, approximation):
+    """
+    Error of approximation against reference over the values finite in
+    both, and the number of values NaN in only one of them.
+    :returns: dictionary with max_error, mean_error, rmse and nan_mismatch
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+    approximation = np.asarray(approximation, dtype=np.float64)
+    finite = np.isfinite(reference) & np.isfinite(approximation)
+    errors = np.abs(reference - approximation)[finite]
+    return {"max_error": float(errors.max()) if errors.size else 0.0,
+            "mean_error": float(errors.mean()) if errors.size else 0.0,
+            "rmse": (float(np.sqrt((errors ** 2).mean())) if errors.size
+                     else 0.0),
+            "nan_mismatch": int((np.isnan(reference)
+                                 != np.isnan(approximation)).sum())}
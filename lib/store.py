@@ -0,0 +1,649 @@
+#!/usr/bin/env python
+"""
+The file contains the reader and writer for the binary feature formats.
+
+A store holds the features of a whole dataset in one directory
+    meta.json                   segment list and modality information
+    <modality>.intervals.npy    (frames, 2) float64 absolute start, end times
+    <modality>.features.npy     (frames, dim) feature values
+    <modality>.offsets.npy      (segments + 1,) first frame of each segment
+    <modality>.stats.npz        optional normalization statistics, one row
+                                per group (see normalization.py)
+    <modality>.quant.npy        (2, dim) scale and offset of a modality
+                                stored as int8 or int16 codes (see
+                                quantization.py)
+    <modality>.coverage.npy     (frames,) optional time covered by the
+                                frames of every bin of a pyramid level
+                                (see pyramid.py)
+The frames of every modality follow the order of the segment list, so the
+features of a segment are a contiguous slice of the memory-mapped arrays.
+Stores of disjoint segments, e.g. the shards of a dataset, are combined
+by merge_stores.
+
+A video npz file holds the features of a single video as the arrays
+intervals (absolute times), features and segments (segment id per frame).
+"""
+import json
+import os
+from os.path import join, isdir, exists
+import numpy as np
+from normalization import RunningStats, STATS_FIELDS
+import quantization
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+STORE_FORMAT = "cmsdk-store"
+STORE_VERSION = 1
+
+
+def is_store(path):
+    """
+    True if path is a feature store directory
+    """
+    return isdir(path) and exists(join(path, "meta.json"))
+
+
+def segment_order(dataset_info):
+    """
+    Deterministic segment list of a dataset_info dictionary.
+    :returns: list of [video_id, segment_id, start, end]
+    """
+    segments = []
+    for video_id in sorted(dataset_info):
+        video_data = dataset_info[video_id]
+        for segment_id in sorted(video_data, key=_segment_sort_key):
+            segment_data = video_data[segment_id]
+            segments.append([video_id, segment_id,
+                             float(segment_data["start"]),
+                             float(segment_data["end"])])
+    return segments
+
+
+def _segment_sort_key(segment_id):
+    try:
+        return (0, float(segment_id), segment_id)
+    except ValueError:
+        return (1, 0.0, segment_id)
+
+
+def segment_arrays(feats, dim=None, dtype=np.float32):
+    """
+    Convert a list of (feat_start, feat_end, feat_val) tuples into arrays.
+    :returns: tuple (intervals, values) of shapes (n, 2) and (n, dim)
+    """
+    if not feats:
+        return (np.zeros((0, 2)), np.zeros((0, dim or 0), dtype=dtype))
+    intervals = np.asarray([(feat[0], feat[1]) for feat in feats],
+                           dtype=np.float64)
+    values = np.asarray([feat[2] for feat in feats], dtype=dtype)
+    return intervals, values.reshape(len(feats), -1)
+
+
+def _feature_dim(feats):
+    for video_feats in feats.itervalues():
+        for segment_feats in video_feats.itervalues():
+            if segment_feats:
+                return len(segment_feats[0][2])
+    return 0
+
+
+def _segment_offsets(feats, segments):
+    """
+    First frame of every segment of a modality in the store layout
+    :returns: int64 array of shape (segments + 1,)
+    """
+    counts = np.zeros(len(segments), dtype=np.int64)
+    for i, (video_id, segment_id, _, _) in enumerate(segments):
+        counts[i] = len(feats.get(video_id, {}).get(segment_id) or [])
+    offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _fill_arrays(feats, segments, offsets, intervals, values, timestamps,
+                 transform=None, encode=None):
+    """
+    Copy the features of every segment into its slice of intervals and
+    values, with absolute times. encode(values) converts the values of a
+    segment, after transform, to the dtype of the values array
+    """
+    dim = values.shape[1]
+    dtype = values.dtype if encode is None else np.float64
+    for i, (video_id, segment_id, start, _) in enumerate(segments):
+        if offsets[i] == offsets[i + 1]:
+            continue
+        seg_intervals, seg_values = segment_arrays(
+                        feats[video_id][segment_id], dim, dtype)
+        if timestamps == "relative":
+            seg_intervals += start
+        if transform is not None:
+            seg_values = transform(video_id, seg_values)
+        if encode is not None:
+            seg_values = encode(seg_values)
+        intervals[offsets[i]:offsets[i + 1]] = seg_intervals
+        values[offsets[i]:offsets[i + 1]] = seg_values
+
+
+def modality_layout(feats, segments):
+    """
+    Frames of every segment and dimension of a modality in the store
+    layout, to allocate the arrays filled by modality_arrays
+    :returns: tuple (offsets, dim)
+    """
+    return _segment_offsets(feats, segments), _feature_dim(feats)
+
+
+def modality_arrays(feats, segments, timestamps="absolute",
+                    dtype=np.float32, out=None):
+    """
+    Features of a modality as the contiguous arrays of the store layout,
+    in memory.
+    :param feats: Feature dictionary {video_id: {segment_id: [tuples]}}
+    :param segments: Segment list as returned by segment_order
+    :param timestamps: absolute or relative, the time base of feats
+    :param out: Optional tuple (intervals, values) of arrays to fill, of
+                the shapes given by modality_layout, e.g. columns of a
+                larger array. dtype is then ignored
+    :returns: tuple (intervals, values, offsets) with absolute times
+    """
+    offsets = _segment_offsets(feats, segments)
+    if out is None:
+        intervals = np.empty((offsets[-1], 2), dtype=np.float64)
+        values = np.empty((offsets[-1], _feature_dim(feats)), dtype=dtype)
+    else:
+        intervals, values = out
+    _fill_arrays(feats, segments, offsets, intervals, values, timestamps)
+    return intervals, values, offsets
+
+
+def _write_json(fpath, content):
+    tmp_path = fpath + ".tmp"
+    with open(tmp_path, "w") as fh:
+        json.dump(content, fh, indent=1)
+    os.rename(tmp_path, fpath)
+
+
+class StoreWriter():
+    """
+    Writes modalities into a feature store, one modality at a time
+    """
+
+    def __init__(self, path, segments, timestamps="absolute"):
+        """
+        Open the store for writing, creating it if it does not exist.
+        :param path: Path to the store directory
+        :param segments: Segment list as returned by segment_order
+        :param timestamps: absolute or relative, the time base of the
+                           features passed to add_modality
+        """
+        self.path = path
+        self.segments = [list(segment) for segment in segments]
+        self.timestamps = timestamps
+        if not isdir(path):
+            os.makedirs(path)
+        self.meta = {"format": STORE_FORMAT, "version": STORE_VERSION,
+                     "segments": self.segments, "modalities": {}}
+        if is_store(path):
+            with open(join(path, "meta.json"), "r") as fh:
+                meta = json.load(fh)
+            if [seg[:2] for seg in meta["segments"]] == \
+                    [seg[:2] for seg in self.segments]:
+                self.meta = meta
+        _write_json(join(path, "meta.json"), self.meta)
+
+    def add_modality(self, name, feats, info=None, dtype=np.float32,
+                     transform=None, quantize=None):
+        """
+        Write the features of a modality, replacing any previous version.
+        :param name: Name of the modality in the store
+        :param feats: Feature dictionary {video_id: {segment_id: [tuples]}}
+        :param info: Dictionary of modality information (type, level, ...)
+        :param dtype: Storage dtype of the feature values
+        :param transform: Optional callable transform(video_id, values)
+                          returning the values to store for a segment
+        :param quantize: Optional int8 or int16 to store the values as
+                         codes of that type, with the per-dimension scale
+                         and offset of a first pass over the values. dtype
+                         is then ignored
+        """
+        dim = _feature_dim(feats)
+        offsets = _segment_offsets(feats, self.segments)
+        encode = None
+        if quantize:
+            if quantize not in quantization.QUANT_DTYPES:
+                raise ValueError("Param quantize must be one of "
+                                 + ", ".join(sorted(
+                                     quantization.QUANT_DTYPES)))
+            stats = RunningStats(dim)
+            for video_id, segment_id, _, _ in self.segments:
+                segment_feats = feats.get(video_id, {}).get(segment_id)
+                if not segment_feats:
+                    continue
+                seg_values = segment_arrays(segment_feats, dim,
+                                            np.float64)[1]
+                if transform is not None:
+                    seg_values = transform(video_id, seg_values)
+                stats.update(seg_values)
+            scale, offset = quantization.affine_params(stats.min, stats.max,
+                                                       quantize)
+            dtype = quantization.QUANT_DTYPES[quantize]
+            encode = lambda values: quantization.quantize(values, scale,
+                                                          offset, dtype)
+
+        intervals, values = self._create(name, int(offsets[-1]), dim, dtype)
+        _fill_arrays(feats, self.segments, offsets, intervals, values,
+                     self.timestamps, transform, encode)
+        if quantize:
+            info = dict(info or {}, quantized=quantize)
+            self._write_quantization(name, scale, offset)
+        self._commit(name, intervals, values, offsets, info)
+
+    def add_arrays(self, name, intervals, values, offsets, info=None,
+                   dtype=np.float32):
+        """
+        Write a modality already in the store layout, e.g. a level of
+        pyramid.py, replacing any previous version.
+        :param intervals: Array (frames, 2) of absolute start and end times
+        :param values: Array (frames, dim) of feature values
+        :param offsets: Array (segments + 1,) of the first frame of every
+                        segment of the store
+        """
+        if len(offsets) != len(self.segments) + 1:
+            raise ValueError("Param offsets must have one entry per "
+                             "segment of the store and one more")
+        created_intervals, created_values = self._create(
+                        name, len(values), values.shape[1], dtype)
+        created_intervals[:] = intervals
+        created_values[:] = values
+        self._commit(name, created_intervals, created_values,
+                     np.asarray(offsets, dtype=np.int64), info)
+
+    def add_coverage(self, name, coverage):
+        """
+        Write the covered time of every frame of a modality written by
+        add_arrays
+        :param coverage: Array (frames,)
+        """
+        tmp_path = join(self.path, name + ".coverage.tmp.npy")
+        np.save(tmp_path, np.asarray(coverage, dtype=np.float64))
+        os.rename(tmp_path, join(self.path, name + ".coverage.npy"))
+        self.meta["modalities"][name]["coverage"] = True
+        _write_json(join(self.path, "meta.json"), self.meta)
+
+    def _write_quantization(self, name, scale, offset):
+        """
+        Write the scale and offset of a quantized modality, before _commit
+        records it as quantized
+        """
+        prefix = join(self.path, name)
+        np.save(prefix + ".quant.tmp.npy", np.vstack([scale, offset]))
+        os.rename(prefix + ".quant.tmp.npy", prefix + ".quant.npy")
+
+    def _create(self, name, frames, dim, dtype):
+        """
+        Create the memory-mapped arrays of a modality. They are written
+        under temporary names and renamed by _commit, so readers holding
+        the previous version mapped are not affected
+        :returns: tuple (intervals, values) of shapes (frames, 2) and
+                  (frames, dim)
+        """
+        prefix = join(self.path, name)
+        intervals = np.lib.format.open_memmap(prefix + ".intervals.tmp.npy",
+                                              mode="w+", dtype=np.float64,
+                                              shape=(frames, 2))
+        values = np.lib.format.open_memmap(prefix + ".features.tmp.npy",
+                                           mode="w+", dtype=dtype,
+                                           shape=(frames, dim))
+        return intervals, values
+
+    def _commit(self, name, intervals, values, offsets, info):
+        """
+        Flush the arrays created by _create, move them in place and record
+        the modality in meta.json
+        """
+        prefix = join(self.path, name)
+        intervals.flush()
+        values.flush()
+        frames, dim = values.shape
+        dtype = values.dtype
+        del intervals, values
+        np.save(prefix + ".offsets.tmp.npy", offsets)
+        for suffix in (".intervals", ".features", ".offsets"):
+            os.rename(prefix + suffix + ".tmp.npy", prefix + suffix + ".npy")
+
+        modality_info = dict(info or {})
+        modality_info.update({"dim": int(dim), "dtype": np.dtype(dtype).name,
+                              "frames": int(frames)})
+        self.meta["modalities"][name] = modality_info
+        _write_json(join(self.path, "meta.json"), self.meta)
+
+    def add_stats(self, name, groupby, groups):
+        """
+        Write the normalization statistics of a modality in the store.
+        :param groupby: global or video
+        :param groups: {group: normalization.RunningStats}
+        """
+        keys = sorted(groups)
+        arrays = dict((field, np.asarray([getattr(groups[key], field)
+                                          for key in keys]))
+                      for field in STATS_FIELDS)
+        tmp_path = join(self.path, name + ".stats.tmp.npz")
+        np.savez(tmp_path, groups=np.asarray(keys, dtype=np.str_), **arrays)
+        os.rename(tmp_path, join(self.path, name + ".stats.npz"))
+        self.meta["modalities"][name]["stats"] = groupby
+        _write_json(join(self.path, "meta.json"), self.meta)
+
+    def update_meta(self, **entries):
+        """
+        Add dataset level entries, e.g. the shard of the dataset, to
+        meta.json
+        """
+        self.meta.update(entries)
+        _write_json(join(self.path, "meta.json"), self.meta)
+
+
+def write_store(path, feature_dict, dataset_info, modalities=None,
+                timestamps="absolute"):
+    """
+    Write a complete feature dictionary into a new store.
+    :param feature_dict: {modality: {video_id: {segment_id: [tuples]}}}
+    :param dataset_info: {video_id: {segment_id: {"start":, "end":}}}
+    :param modalities: Optional {modality: info dictionary}
+    """
+    writer = StoreWriter(path, segment_order(dataset_info), timestamps)
+    for name, feats in feature_dict.iteritems():
+        info = (modalities or {}).get(name)
+        writer.add_modality(name, feats, info)
+    return writer
+
+
+class FeatureStore():
+    """
+    Memory-mapped reader for a feature store
+    """
+
+    def __init__(self, path, mmap_mode="r"):
+        """
+        :param path: Path to the store directory
+        :param mmap_mode: Passed to np.load, None to read arrays in memory
+        """
+        if not is_store(path):
+            raise IOError("No feature store found at " + str(path))
+        self.path = path
+        self.mmap_mode = mmap_mode
+        with open(join(path, "meta.json"), "r") as fh:
+            self.meta = json.load(fh)
+        self.segments = [(str(seg[0]), str(seg[1]), seg[2], seg[3])
+                         for seg in self.meta["segments"]]
+        self.modalities = dict((str(name), info) for name, info
+                               in self.meta["modalities"].iteritems())
+        self.segment_index = dict(((seg[0], seg[1]), i)
+                                  for i, seg in enumerate(self.segments))
+        self.video_segments = {}
+        for video_id, segment_id, _, _ in self.segments:
+            self.video_segments.setdefault(video_id, []).append(segment_id)
+        self._arrays = {}
+        self._quant = {}
+
+    def dataset_info(self):
+        """
+        Segment information in the format of Dataset.dataset_info
+        """
+        info = {}
+        for video_id, segment_id, start, end in self.segments:
+            info.setdefault(video_id, {})[segment_id] = {"start": start,
+                                                         "end": end}
+        return info
+
+    def arrays(self, modality):
+        """
+        :returns: tuple (intervals, features, offsets) of the modality, the
+                  features being the stored codes of a quantized modality
+                  (see values)
+        """
+        if modality not in self._arrays:
+            if modality not in self.modalities:
+                raise KeyError("Modality " + modality + " not in the store")
+            prefix = join(self.path, modality)
+            self._arrays[modality] = (
+                np.load(prefix + ".intervals.npy", mmap_mode=self.mmap_mode),
+                np.load(prefix + ".features.npy", mmap_mode=self.mmap_mode),
+                np.load(prefix + ".offsets.npy"))
+        return self._arrays[modality]
+
+    def quantization(self, modality):
+        """
+        :returns: tuple (scale, offset) of a quantized modality, None if
+                  the modality is stored as floats
+        """
+        if not self.modalities[modality].get("quantized"):
+            return None
+        if modality not in self._quant:
+            params = np.load(join(self.path, modality + ".quant.npy"))
+            self._quant[modality] = (params[0], params[1])
+        return self._quant[modality]
+
+    def values(self, modality, lo=None, hi=None):
+        """
+        Feature values of the frames lo to hi of a modality, dequantized
+        in one vectorized operation if the modality is quantized
+        """
+        features = self.arrays(modality)[1][lo:hi]
+        params = self.quantization(modality)
+        if params is None:
+            return features
+        return quantization.dequantize(features, params[0], params[1])
+
+    def coverage(self, modality):
+        """
+        :returns: covered time of every frame of a modality written with
+                  add_coverage, None if it has none
+        """
+        if not self.modalities[modality].get("coverage"):
+            return None
+        return np.load(join(self.path, modality + ".coverage.npy"),
+                       mmap_mode=self.mmap_mode)
+
+    def stats(self, modality):
+        """
+        Normalization statistics of a modality written by add_stats
+        :returns: tuple (groupby, {group: normalization.RunningStats}), or
+                  None if the modality has no statistics
+        """
+        groupby = self.modalities[modality].get("stats")
+        if not groupby:
+            return None
+        content = np.load(join(self.path, modality + ".stats.npz"))
+        groups = {}
+        for i, key in enumerate(content["groups"]):
+            groups[str(key)] = RunningStats.from_dict(
+                dict((field, content[field][i]) for field in STATS_FIELDS))
+        return str(groupby), groups
+
+    def segment(self, modality, video_id, segment_id):
+        """
+        :returns: tuple (intervals, features) slices of the segment
+        """
+        intervals, _, offsets = self.arrays(modality)
+        i = self.segment_index[(video_id, segment_id)]
+        return (intervals[offsets[i]:offsets[i + 1]],
+                self.values(modality, offsets[i], offsets[i + 1]))
+
+    def feature_dict(self, modality, timestamps="absolute"):
+        """
+        Features of a modality as {video_id: {segment_id: [tuples]}}
+        :param timestamps: absolute or relative
+        """
+        intervals, _, offsets = self.arrays(modality)
+        values = self.values(modality)
+        features = {}
+        for i, (video_id, segment_id, start, _) in enumerate(self.segments):
+            seg_intervals = np.asarray(intervals[offsets[i]:offsets[i + 1]])
+            if timestamps == "relative":
+                seg_intervals = seg_intervals - start
+            seg_values = values[offsets[i]:offsets[i + 1]]
+            features.setdefault(video_id, {})[segment_id] = [
+                (seg_intervals[j, 0], seg_intervals[j, 1], seg_values[j])
+                for j in range(len(seg_values))]
+        return features
+
+
+def merge_stores(paths, out_path):
+    """
+    Combine stores holding disjoint segments, e.g. the shards written by
+    Dataset.save, into one store. The arrays of every segment are copied
+    from the memory-mapped stores, nothing is parsed again. Token counts
+    of the modalities are summed. A modality quantized with different
+    parameters in the stores is quantized again over the union of their
+    ranges, which adds up to half a code of error.
+    :param paths: Paths to the stores to merge
+    :param out_path: Path to the merged store
+    :returns: FeatureStore of the merged store
+    """
+    stores = [FeatureStore(path) for path in paths]
+    names = set(stores[0].modalities)
+    sources = {}
+    segments = []
+    for s, feature_store in enumerate(stores):
+        if set(feature_store.modalities) != names:
+            raise ValueError("Stores " + paths[0] + " and " + paths[s]
+                             + " hold different modalities")
+        for i, (video_id, segment_id, start, end) in \
+                enumerate(feature_store.segments):
+            if (video_id, segment_id) in sources:
+                raise ValueError("Segment " + segment_id + " of video "
+                                 + video_id + " is in several stores")
+            sources[(video_id, segment_id)] = (s, i)
+            segments.append([video_id, segment_id, start, end])
+    segments.sort(key=lambda seg: (seg[0], _segment_sort_key(seg[1])))
+
+    writer = StoreWriter(out_path, segments)
+    for name in sorted(names):
+        infos = [feature_store.modalities[name] for feature_store in stores]
+        filled = [info for info in infos if info["frames"]] or infos
+        if len(set((info["dim"], info["dtype"]) for info in filled)) > 1:
+            raise ValueError("Modality " + name + " has different "
+                             "dimensions or dtypes in the stores")
+        arrays = [feature_store.arrays(name) for feature_store in stores]
+        counts = np.zeros(len(segments), dtype=np.int64)
+        for j, (video_id, segment_id, _, _) in enumerate(segments):
+            s, i = sources[(video_id, segment_id)]
+            counts[j] = arrays[s][2][i + 1] - arrays[s][2][i]
+        offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        # Codes quantized with different parameters in the stores are
+        # quantized again over the union of their ranges
+        params = dict((s, feature_store.quantization(name))
+                      for s, feature_store in enumerate(stores)
+                      if infos[s]["frames"])
+        requantize = None
+        if filled[0].get("quantized") and len(set(
+                np.vstack(param).tostring() for param in params.values())) > 1:
+            dtype = np.dtype(str(filled[0]["dtype"]))
+            _, low, high = quantization.code_range(dtype)
+            scale, offset = quantization.affine_params(
+                np.min([param[1] + low * param[0]
+                        for param in params.values()], axis=0),
+                np.max([param[1] + high * param[0]
+                        for param in params.values()], axis=0), dtype)
+            requantize = lambda source, codes: quantization.quantize(
+                quantization.dequantize(codes, params[source][0],
+                                        params[source][1], np.float64),
+                scale, offset, dtype)
+
+        intervals, values = writer._create(name, int(offsets[-1]),
+                                           filled[0]["dim"],
+                                           np.dtype(str(filled[0]["dtype"])))
+        for j, (video_id, segment_id, _, _) in enumerate(segments):
+            if not counts[j]:
+                continue
+            s, i = sources[(video_id, segment_id)]
+            src_intervals, src_values, src_offsets = arrays[s]
+            lo, hi = src_offsets[i], src_offsets[i + 1]
+            intervals[offsets[j]:offsets[j + 1]] = src_intervals[lo:hi]
+            if requantize is not None:
+                values[offsets[j]:offsets[j + 1]] = requantize(
+                    s, src_values[lo:hi])
+            else:
+                values[offsets[j]:offsets[j + 1]] = src_values[lo:hi]
+        if filled[0].get("quantized"):
+            if requantize is None:
+                scale, offset = (params.values()[0] if params else
+                                 stores[0].quantization(name))
+            writer._write_quantization(name, scale, offset)
+
+        info = dict(filled[0])
+        token_counts = [shard_info["token_counts"] for shard_info in infos
+                        if shard_info.get("token_counts")]
+        if token_counts:
+            info["token_counts"] = np.sum(token_counts, axis=0).tolist()
+        info.pop("stats", None)
+        info.pop("coverage", None)
+        writer._commit(name, intervals, values, offsets, info)
+
+        if filled[0].get("coverage"):
+            coverage = np.zeros(int(offsets[-1]))
+            sources_coverage = [feature_store.coverage(name)
+                                for feature_store in stores]
+            for j, (video_id, segment_id, _, _) in enumerate(segments):
+                s, i = sources[(video_id, segment_id)]
+                src_offsets = arrays[s][2]
+                coverage[offsets[j]:offsets[j + 1]] = \
+                    sources_coverage[s][src_offsets[i]:src_offsets[i + 1]]
+            writer.add_coverage(name, coverage)
+
+        # Statistics of the same group in several stores are combined
+        shard_stats = [feature_store.stats(name) for feature_store in stores]
+        groupbys = set(stats[0] for stats in shard_stats if stats)
+        if len(groupbys) == 1 and all(shard_stats):
+            groups = {}
+            for _, shard_groups in shard_stats:
+                for key, stats in shard_groups.iteritems():
+                    if key in groups:
+                        groups[key].merge(stats)
+                    else:
+                        groups[key] = stats
+            writer.add_stats(name, groupbys.pop(), groups)
+
+    writer.update_meta(shards=[feature_store.meta.get("shard")
+                               for feature_store in stores])
+    return FeatureStore(out_path)
+
+
+def write_video_npz(fpath, video_feats, segment_starts=None):
+    """
+    Write the features of one video into a compressed npz file. Frames
+    repeated in several segments are stored once.
+    :param video_feats: {segment_id: [tuples]}
+    :param segment_starts: {segment_id: start} if the timestamps of
+                           video_feats are relative to the segment start
+    """
+    rows = {}
+    for segment_id, feats in video_feats.iteritems():
+        offset = segment_starts[segment_id] if segment_starts else 0.0
+        for feat in feats:
+            key = (feat[0] + offset, feat[1] + offset)
+            if key not in rows:
+                rows[key] = (segment_id, feat[2])
+    keys = sorted(rows)
+    intervals = np.asarray(keys, dtype=np.float64).reshape(len(keys), 2)
+    dim = len(rows[keys[0]][1]) if keys else 0
+    values = np.asarray([rows[key][1] for key in keys],
+                        dtype=np.float32).reshape(len(keys), dim)
+    segments = np.asarray([rows[key][0] for key in keys], dtype=np.str_)
+    np.savez_compressed(fpath, intervals=intervals, features=values,
+                        segments=segments)
+
+
+def read_video_npz(fpath):
+    """
+    :returns: tuple (intervals, features, segments) of a video npz file
+    """
+    content = np.load(fpath)
+    return content["intervals"], content["features"], content["segments"]
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+"""
+The file contains the generator of synthetic MOSI/POM shaped datasets, used
+to test and benchmark Dataset and P2FA_Helper_v2 without the real corpora.
+The generated tree holds
+    Video/FACET/<video_id>.FACET_out.csv            video level FACET
+    Video/OpenFace/<video_id>_<segment_id>.txt      segment level OpenFace
+    Audio/COVAREP/<video_id>_<segment_id>.mat       segment level COVAREP
+    Audio/OpenSmile/<video_id>_<segment_id>.arff    segment level OpenSmile
+    Transcript/{words,phonemes,embeddings}/<video_id>_<segment_id>.csv
+    Transcript/P2FA/<video_id>.TextGrid             video level P2FA output
+    glove.txt                                       embeddings of the words
+    config.csv, p2fa.csv                            configs in configs/ layout
+"""
+import argparse
+import os
+from os.path import join
+import numpy as np
+from scipy.io import savemat
+import utils
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+# Scale presets roughly matching the shape of the real corpora
+presets = {
+    "tiny": {"videos": 3, "segments": 4, "segment_length": (2.0, 6.0)},
+    "mosi": {"videos": 93, "segments": 24, "segment_length": (1.0, 10.0)},
+    "pom": {"videos": 600, "segments": 1, "segment_length": (60.0, 120.0)},
+}
+
+config_modalities = ["opensmile", "covarep", "facet", "embeddings",
+                     "phonemes", "words", "openface"]
+config_levels = ["s", "s", "v", "s", "s", "s", "s"]
+
+
+def _fmt(values):
+    return ",".join("%.6g" % val for val in values)
+
+
+def _frame_times(start, end, period):
+    count = max(int((end - start) / period), 0)
+    return start + period * np.arange(count)
+
+
+class SyntheticDataset():
+    """
+    Writes a synthetic dataset with the given scale and feature shapes
+    """
+
+    def __init__(self, out_dir, videos=3, segments=4,
+                 segment_length=(2.0, 6.0), facet_dim=35, openface_dim=43,
+                 covarep_dim=74, opensmile_dim=384, embed_dim=300,
+                 vocabulary_size=500, oov_rate=0.05, words_per_sec=2.5,
+                 facet_period=0.03333, openface_period=0.0333333,
+                 covarep_period=0.01, seed=0):
+        """
+        :param out_dir: Directory to create the dataset in
+        :param videos: Number of videos
+        :param segments: Number of segments per video
+        :param segment_length: (min, max) length of a segment in seconds
+        :param *_dim: Feature dimensions of the modalities
+        :param vocabulary_size: Number of distinct words
+        :param oov_rate: Fraction of the vocabulary, the rarest words,
+                         missing in glove.txt
+        :param words_per_sec: Speech rate used for words and phonemes
+        :param *_period: Frame periods of the time-distributed features
+        :param seed: Seed of the random generator
+        """
+        self.out_dir = out_dir
+        self.videos = videos
+        self.segments = segments
+        self.segment_length = segment_length
+        self.facet_dim = facet_dim
+        self.openface_dim = openface_dim
+        self.covarep_dim = covarep_dim
+        self.opensmile_dim = opensmile_dim
+        self.embed_dim = embed_dim
+        self.words_per_sec = words_per_sec
+        self.facet_period = facet_period
+        self.openface_period = openface_period
+        self.covarep_period = covarep_period
+        self.rng = np.random.RandomState(seed)
+        self.vocabulary = ["w%d" % i for i in range(vocabulary_size)]
+        self.oov_count = int(vocabulary_size * oov_rate)
+        # Zipf-like word frequencies
+        weights = 1.0 / np.arange(1, vocabulary_size + 1)
+        self.word_probs = weights / weights.sum()
+        self.phonemes = [p for p in utils.p2fa_phonemes if p != "sp"]
+
+    def path(self, *parts):
+        return join(self.out_dir, *parts)
+
+    def generate(self):
+        """
+        Write every file of the dataset.
+        :returns: tuple (config csv path, p2fa csv path)
+        """
+        for sub_dir in ["Video/FACET", "Video/OpenFace", "Audio/COVAREP",
+                        "Audio/OpenSmile", "Transcript/words",
+                        "Transcript/phonemes", "Transcript/embeddings",
+                        "Transcript/P2FA"]:
+            if not os.path.isdir(self.path(sub_dir)):
+                os.makedirs(self.path(sub_dir))
+
+        self.write_glove()
+        config_rows = []
+        p2fa_rows = []
+        for v in range(self.videos):
+            video_id = "vid%04d" % v
+            segments = self.segment_times()
+            video_end = segments[-1][1] + self.rng.uniform(0.5, 2.0)
+            words, phones = self.transcript(video_end)
+            self.write_facet(video_id, video_end)
+            self.write_textgrid(video_id, video_end, words, phones)
+            for s, (start, end) in enumerate(segments):
+                segment_id = str(s + 1)
+                paths = self.write_segment(video_id, segment_id, start, end,
+                                           words, phones)
+                paths[config_modalities.index("facet")] = self.path(
+                    "Video/FACET", video_id + ".FACET_out.csv")
+                config_rows.append([video_id, segment_id, repr(start),
+                                    repr(end)] + paths)
+                p2fa_rows.append([video_id, segment_id, repr(start),
+                                  repr(end),
+                                  self.path("Transcript/P2FA",
+                                            video_id + ".TextGrid")])
+
+        config_csv = self.path("config.csv")
+        with open(config_csv, "w") as fh:
+            fh.write(",".join(["video_id", "segment", "start", "end"]
+                              + config_modalities) + "\n")
+            fh.write(",,,," + ",".join(config_levels) + "\n")
+            for row in config_rows:
+                fh.write(",".join(row) + "\n")
+        p2fa_csv = self.path("p2fa.csv")
+        with open(p2fa_csv, "w") as fh:
+            fh.write("video_id,segment,start,end,p2fa\n")
+            fh.write(",,,,v\n")
+            for row in p2fa_rows:
+                fh.write(",".join(row) + "\n")
+        return config_csv, p2fa_csv
+
+    def segment_times(self):
+        segments = []
+        t = self.rng.uniform(0.0, 2.0)
+        for _ in range(self.segments):
+            length = self.rng.uniform(*self.segment_length)
+            segments.append((round(t, 6), round(t + length, 6)))
+            t += length + self.rng.uniform(0.0, 1.0)
+        return segments
+
+    def transcript(self, video_end):
+        """
+        Random words with 1 to 4 phonemes each, separated by short pauses
+        :returns: tuple (words, phones) of lists of (start, end, label)
+        """
+        words, phones = [], []
+        t = 0.0
+        mean_length = 1.0 / self.words_per_sec
+        while True:
+            length = self.rng.uniform(0.5, 1.5) * mean_length
+            if t + length > video_end:
+                break
+            word = self.vocabulary[self.rng.choice(len(self.vocabulary),
+                                                   p=self.word_probs)]
+            words.append((t, t + length, word))
+            count = self.rng.randint(1, 5)
+            bounds = np.linspace(t, t + length, count + 1)
+            for i in range(count):
+                phone = self.phonemes[self.rng.randint(len(self.phonemes))]
+                phones.append((bounds[i], bounds[i + 1], phone))
+            t += length
+            if self.rng.rand() < 0.2:
+                pause = self.rng.uniform(0.05, 0.3)
+                words.append((t, t + pause, "sp"))
+                phones.append((t, t + pause, "sp"))
+                t += pause
+        return words, phones
+
+    def write_glove(self):
+        with open(self.path("glove.txt"), "w") as fh:
+            # The rarest words are missing, as in real embedding files
+            for word in self.vocabulary[:len(self.vocabulary)
+                                        - self.oov_count]:
+                vector = self.rng.uniform(-1, 1, self.embed_dim)
+                fh.write(word + " " + " ".join("%.5f" % val
+                                               for val in vector) + "\n")
+
+    def write_facet(self, video_id, video_end):
+        times = _frame_times(0.0, video_end, self.facet_period)
+        values = self.rng.randn(len(times), self.facet_dim)
+        with open(self.path("Video/FACET", video_id + ".FACET_out.csv"),
+                  "w") as fh:
+            fh.write(",".join(["Timestamp"] + ["facet_%d" % i for i
+                              in range(self.facet_dim)]) + ",\n")
+            for t, row in zip(times, values):
+                cells = ["%.6g" % val for val in row]
+                # FACET leaves cells empty when no face is detected
+                if self.rng.rand() < 0.01:
+                    cells[self.rng.randint(len(cells))] = ""
+                fh.write("%.5f," % t + ",".join(cells) + ",\n")
+
+    def write_textgrid(self, video_id, video_end, words, phones):
+        lines = ['File type = "ooTextFile short"', '"TextGrid"', '',
+                 '0', repr(video_end), '<exists>', '2', '"IntervalTier"',
+                 '"phone"', '0', repr(video_end), str(len(phones))]
+        for start, end, label in phones:
+            lines += [repr(start), repr(end), '"%s"' % label]
+        lines += ['"IntervalTier"', '"word"', '0', repr(video_end),
+                  str(len(words))]
+        for start, end, label in words:
+            lines += [repr(start), repr(end), '"%s"' % label.upper()]
+        with open(self.path("Transcript/P2FA", video_id + ".TextGrid"),
+                  "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+    def write_segment(self, video_id, segment_id, start, end, words, phones):
+        """
+        Write the segment level feature files with timestamps relative to
+        the segment start
+        :returns: list of paths in the order of config_modalities, None
+                  for the video level modalities
+        """
+        name = video_id + "_" + segment_id
+        duration = end - start
+        paths = {}
+
+        paths["opensmile"] = self.path("Audio/OpenSmile", name + ".arff")
+        with open(paths["opensmile"], "w") as fh:
+            fh.write("@relation openSMILE_features\n\n")
+            fh.write("@attribute name string\n")
+            for i in range(self.opensmile_dim):
+                fh.write("@attribute opensmile_%d numeric\n" % i)
+            fh.write("\n@data\n\n")
+            fh.write("'unknown'," + _fmt(self.rng.randn(self.opensmile_dim))
+                     + "\n")
+
+        paths["covarep"] = self.path("Audio/COVAREP", name + ".mat")
+        frames = int(duration / self.covarep_period)
+        savemat(paths["covarep"], {"features": self.rng.randn(
+                                        frames, self.covarep_dim)})
+
+        paths["openface"] = self.path("Video/OpenFace", name + ".txt")
+        times = _frame_times(0.0, duration, self.openface_period)
+        values = self.rng.randn(len(times), self.openface_dim)
+        with open(paths["openface"], "w") as fh:
+            fh.write(",".join(["timestamp"] + ["openface_%d" % i for i
+                              in range(self.openface_dim)]) + "\n")
+            for t, row in zip(times, values):
+                fh.write("%.5f," % t + _fmt(row) + "\n")
+
+        seg_words = [w for w in words if w[0] >= start and w[1] <= end
+                     and w[2] != "sp"]
+        seg_phones = [p for p in phones if p[0] >= start and p[1] <= end]
+
+        paths["words"] = self.path("Transcript/words", name + ".csv")
+        with open(paths["words"], "w") as fh:
+            for w_start, w_end, word in seg_words:
+                one_hot = np.zeros(len(self.vocabulary))
+                one_hot[self.vocabulary.index(word)] = 1
+                fh.write("%r,%r," % (w_start - start, w_end - start)
+                         + ",".join("%g" % val for val in one_hot) + "\n")
+
+        paths["embeddings"] = self.path("Transcript/embeddings", name + ".csv")
+        with open(paths["embeddings"], "w") as fh:
+            for w_start, w_end, word in seg_words:
+                vector = self.rng.uniform(-1, 1, self.embed_dim)
+                fh.write("%r,%r," % (w_start - start, w_end - start)
+                         + _fmt(vector) + "\n")
+
+        # Dataset.load_phonemes reads a leading index column
+        paths["phonemes"] = self.path("Transcript/phonemes", name + ".csv")
+        with open(paths["phonemes"], "w") as fh:
+            for i, (p_start, p_end, phone) in enumerate(seg_phones):
+                one_hot = utils.phoneme_hotkey_enc(phone)
+                fh.write("%d,%r,%r," % (i, p_start - start, p_end - start)
+                         + ",".join("%g" % val for val in one_hot) + "\n")
+
+        return [paths.get(modality) for modality in config_modalities]
+
+
+def generate(out_dir, preset="tiny", **kwargs):
+    """
+    Generate a synthetic dataset in out_dir.
+    :param preset: tiny, mosi or pom, overridden by kwargs
+    :returns: tuple (config csv path, p2fa csv path)
+    """
+    params = dict(presets[preset])
+    params.update(kwargs)
+    return SyntheticDataset(out_dir, **params).generate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic "
+                                     "MOSI/POM shaped dataset.")
+    parser.add_argument("out_dir", help="Directory to create the dataset in")
+    parser.add_argument("--preset", default="tiny",
+                        help="tiny, mosi or pom")
+    parser.add_argument("--videos", type=int)
+    parser.add_argument("--segments", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    overrides = {"seed": args.seed}
+    if args.videos:
+        overrides["videos"] = args.videos
+    if args.segments:
+        overrides["segments"] = args.segments
+    config_csv, p2fa_csv = generate(args.out_dir, args.preset, **overrides)
+    print "Dataset config written to", config_csv
+    print "P2FA config written to", p2fa_csv
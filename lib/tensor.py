@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+The file contains the joint layout of aligned modalities. After
+Dataset.align every modality has one step per frame of the modality the
+dataset was aligned to, so all of them fit in one array
+    values      (steps, sum of dims) the modalities side by side
+    intervals   (steps, 2) absolute start and end time of every step
+    offsets     (segments + 1,) first step of every segment
+    columns     {modality: slice of the columns of values}
+The steps of a segment are the contiguous rows offsets[i]:offsets[i + 1],
+and the features of a modality are a column slice, so models read views
+of the array instead of concatenating the modalities step by step.
+"""
+import numpy as np
+import store
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+class JointTensor():
+    """
+    Aligned modalities of a dataset in one contiguous array
+    """
+
+    def __init__(self, values, intervals, offsets, segments, columns):
+        """
+        :param values: Array (steps, sum of dims)
+        :param intervals: Array (steps, 2) of absolute times
+        :param offsets: Array (segments + 1,) of the first step of every
+                        segment
+        :param segments: Segment list as returned by store.segment_order
+        :param columns: {modality: (first column, end column)}
+        """
+        self.values = values
+        self.intervals = intervals
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.segments = [list(segment) for segment in segments]
+        self.columns = dict((name, slice(int(lo), int(hi)))
+                            for name, (lo, hi) in columns.iteritems())
+        self.modalities = sorted(self.columns,
+                                 key=lambda name: self.columns[name].start)
+        self.segment_index = dict(((segment[0], segment[1]), i)
+                                  for i, segment in enumerate(self.segments))
+
+    def __len__(self):
+        return len(self.segments)
+
+    def segment(self, video_id, segment_id, modality=None):
+        """
+        Steps of a segment, a view of values.
+        :param modality: Optional modality to view the columns of, all the
+                         modalities by default
+        :returns: array (steps, dims)
+        """
+        i = self.segment_index[(video_id, segment_id)]
+        rows = self.values[self.offsets[i]:self.offsets[i + 1]]
+        if modality is None:
+            return rows
+        return rows[:, self.columns[modality]]
+
+    def modality(self, name):
+        """
+        Columns of a modality for all the steps, a view of values
+        """
+        return self.values[:, self.columns[name]]
+
+    def save(self, store_path, name="joint"):
+        """
+        Write the array into a feature store as the modality name, with
+        the column slices in its information. JointTensor.load attaches to
+        it memory-mapped.
+        :returns: store.StoreWriter
+        """
+        writer = store.StoreWriter(store_path, self.segments)
+        columns = dict((modality, [cols.start, cols.stop])
+                       for modality, cols in self.columns.iteritems())
+        writer.add_arrays(name, self.intervals, self.values, self.offsets,
+                          {"joint_of": self.modalities, "columns": columns},
+                          self.values.dtype)
+        return writer
+
+    @classmethod
+    def load(cls, store_path, name="joint", mmap_mode="r"):
+        """
+        JointTensor written by save, its arrays memory-mapped
+        """
+        feature_store = store.FeatureStore(store_path, mmap_mode)
+        info = feature_store.modalities[name]
+        if "joint_of" not in info:
+            raise ValueError("Modality " + name + " of " + store_path
+                             + " is not a joint tensor")
+        intervals, values, offsets = feature_store.arrays(name)
+        columns = dict((str(modality), cols) for modality, cols
+                       in info["columns"].iteritems())
+        return cls(values, intervals, offsets, feature_store.segments,
+                   columns)
+
+
+def joint_tensor(sources, segments, timestamps="absolute",
+                 dtype=np.float32):
+    """
+    Build a JointTensor, copying the features of every modality once into
+    its columns.
+    :param sources: List of (name, feature dictionary) in column order.
+                    The modalities must have the same steps in every
+                    segment, as after Dataset.align
+    :param segments: Segment list as returned by store.segment_order
+    :param timestamps: absolute or relative, the time base of the features
+    :returns: JointTensor
+    """
+    if not sources:
+        raise ValueError("Param sources must hold at least one modality")
+    layouts = [store.modality_layout(feats, segments)
+               for _, feats in sources]
+    offsets = layouts[0][0]
+    for (name, _), (modality_offsets, _) in zip(sources, layouts):
+        if not np.array_equal(modality_offsets, offsets):
+            raise ValueError("Modality " + name + " does not have the "
+                             "steps of " + sources[0][0] + ", align the "
+                             "dataset first")
+    bounds = np.cumsum([0] + [dim for _, dim in layouts])
+    values = np.zeros((int(offsets[-1]), int(bounds[-1])), dtype=dtype)
+    intervals = np.empty((int(offsets[-1]), 2), dtype=np.float64)
+    for j, (name, feats) in enumerate(sources):
+        store.modality_arrays(feats, segments, timestamps,
+                              out=(intervals,
+                                   values[:, bounds[j]:bounds[j + 1]]))
+    columns = dict((name, (bounds[j], bounds[j + 1]))
+                   for j, (name, _) in enumerate(sources))
+    return JointTensor(values, intervals, offsets, segments, columns)
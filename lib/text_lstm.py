@@ -9,8 +9,6 @@ This script shows you how to:
 
 from __future__ import print_function
 import numpy as np
-import pandas as pd
-from collections import defaultdict
 
 from keras.models import Sequential
 from keras.layers import Dense, Dropout, Embedding, LSTM, Bidirectional
@@ -27,16 +25,16 @@ features = d.load()
 # View modalities
 print(d.modalities) # Modalities are numbered as modality_0, modality_1, ....
 
-# load the labels
+# load the labels, joined to the segments of the dataset
 print("Loading labels...")
-labels_dict = defaultdict(lambda: dict())
-label_table = pd.read_csv("../datasets/MOSI/labels/OpinionLevelSentiment.csv", header=None)
-for i in range(label_table.shape[0]):
-    vid = label_table.iloc[i][2]
-    sid = str(label_table.iloc[i][3]) # in the feature dict sid is a number in string format
-    label = (label_table.iloc[i][4] > 0) # for this tutorial we only predict positive or negative
-    labels_dict[vid][sid] = label
-print("Finished!")
+labels = d.load_labels("../datasets/MOSI/labels/OpinionLevelSentiment.csv",
+                       video_col=2, segment_col=3, label_cols=4)
+# for this tutorial we only predict positive or negative, unlabelled
+# segments are left out so that a missing label raises a KeyError below
+labels_dict = dict((segment, value > 0) for segment, value, present
+                   in zip(labels["segments"], labels["values"],
+                          labels["present"]) if present)
+print("Finished! {} segments have no label".format(len(labels["missing"])))
 
 
 # Some data preprocessing
@@ -64,7 +62,7 @@ for vid, vdata in features['modality_3'].items():
         for i in range(maxlen - len(sdata)):
             example.append(np.zeros(sdata[0][2].shape)) # padding each example to maxlen
         example = np.asarray(example)
-        label = labels_dict[vid][sid]
+        label = labels_dict[(vid, sid)]
 
         if video_count <= 63:
             x_train.append(example)
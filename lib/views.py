@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+The file contains the lazy views over feature dictionaries. Features are
+loaded once with absolute timestamps, and a TimeShiftView presents them
+relative to the start of their segment (or back) without copying the
+dataset: a segment is shifted only when it is accessed. A StoreView
+presents a memory-mapped feature store as a feature dictionary, reading a
+segment from the mapped arrays when it is accessed, so processes viewing
+the same store share one copy of the features.
+"""
+import collections
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+
+def shift_segment(feats, offset):
+    """
+    Subtract offset from the start and end times of a segment's features
+    :param feats: List of (feat_start, feat_end, feat_val) tuples
+    :returns: List of shifted tuples sharing the feature values
+    """
+    if not feats or not offset:
+        return feats
+    times = np.asarray([(feat[0], feat[1]) for feat in feats],
+                       dtype=np.float64) - offset
+    return [(times[i, 0], times[i, 1], feat[2])
+            for i, feat in enumerate(feats)]
+
+
+class TimeShiftView(collections.Mapping):
+    """
+    Read-only view of a feature dictionary {modality: {video_id:
+    {segment_id: [tuples]}}}, or of one of its levels, with the times of
+    every segment shifted by its start
+    """
+
+    def __init__(self, features, dataset_info, to="relative", depth=3,
+                 video_id=None):
+        """
+        :param features: Feature dictionary, or the dictionary of a
+                         modality or of a video
+        :param dataset_info: Dataset.dataset_info holding segment starts
+        :param to: relative to subtract the segment start from absolute
+                   times, absolute to add it to relative times
+        :param depth: 3 for a feature dictionary, 2 for a modality and 1
+                      for a video
+        :param video_id: Video of the view when depth is 1
+        """
+        if to not in ("relative", "absolute"):
+            raise ValueError("Param to must be 'relative' or 'absolute'")
+        self.features = features
+        self.dataset_info = dataset_info
+        self.to = to
+        self.depth = depth
+        self.video_id = video_id
+
+    def __getitem__(self, key):
+        value = self.features[key]
+        if self.depth == 3:
+            return TimeShiftView(value, self.dataset_info, self.to, 2)
+        if self.depth == 2:
+            return TimeShiftView(value, self.dataset_info, self.to, 1, key)
+        start = self.dataset_info[self.video_id][key]["start"]
+        return shift_segment(value, start if self.to == "relative"
+                             else -start)
+
+    def __iter__(self):
+        return iter(self.features)
+
+    def __len__(self):
+        return len(self.features)
+
+    def materialize(self):
+        """
+        Copy of the view as plain nested dictionaries
+        """
+        return dict((key, value.materialize()
+                     if isinstance(value, TimeShiftView) else value)
+                    for key, value in self.iteritems())
+
+
+class StoreView(collections.Mapping):
+    """
+    Read-only feature dictionary {modality: {video_id: {segment_id:
+    [tuples]}}} over a store.FeatureStore, or one of its levels. The
+    tuples hold absolute times and rows of the mapped arrays
+    """
+
+    def __init__(self, feature_store, names, depth=3, name=None,
+                 video_id=None):
+        """
+        :param feature_store: store.FeatureStore of the features
+        :param names: {key: name in the store} of the modalities, e.g.
+                      {'modality_0': 'aligned_modality_0'}
+        :param depth: 3 for a feature dictionary, 2 for a modality and 1
+                      for a video
+        :param name: Store name of the modality when depth is 1 or 2
+        :param video_id: Video of the view when depth is 1
+        """
+        self.feature_store = feature_store
+        self.names = names
+        self.depth = depth
+        self.name = name
+        self.video_id = video_id
+
+    def _keys(self):
+        if self.depth == 3:
+            return self.names
+        if self.depth == 2:
+            return self.feature_store.video_segments
+        return self.feature_store.video_segments[self.video_id]
+
+    def __getitem__(self, key):
+        if self.depth == 3:
+            return StoreView(self.feature_store, self.names, 2,
+                             self.names[key])
+        if self.depth == 2:
+            if key not in self.feature_store.video_segments:
+                raise KeyError(key)
+            return StoreView(self.feature_store, self.names, 1, self.name,
+                             key)
+        if key not in self.feature_store.video_segments[self.video_id]:
+            raise KeyError(key)
+        intervals, values = self.feature_store.segment(self.name,
+                                                       self.video_id, key)
+        return [(intervals[i, 0], intervals[i, 1], values[i])
+                for i in range(len(values))]
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __contains__(self, key):
+        return key in self._keys()
+
+    def materialize(self):
+        """
+        Copy of the view as plain nested dictionaries
+        """
+        return dict((key, value.materialize()
+                     if isinstance(value, StoreView) else value)
+                    for key, value in self.iteritems())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+The file contains the sliding window functionals of time-distributed
+features. Sums and sums of squares of a segment's frames are computed once
+as prefix sums, so the mean and standard deviation of any window are two
+subtractions, and min/max of all the windows are a single reduceat call.
+A frame belongs to the window its start time falls in.
+"""
+import numpy as np
+
+__author__ = "Prateek Vij"
+__copyright__ = "Copyright 2017, Carnegie Mellon University"
+__credits__ = ["Amir Zadeh", "Prateek Vij", "Soujanya Poria"]
+__license__ = "GPL"
+__version__ = "1.0.1"
+__status__ = "Production"
+
+WINDOW_STATS = ("mean", "std", "min", "max", "count")
+
+
+def window_bounds(start, end, window, hop):
+    """
+    Windows of length window every hop seconds from start, the last one
+    being the first to reach end. A segment shorter than window has one
+    window.
+    :returns: tuple (window_starts, window_ends) arrays
+    """
+    if window <= 0 or hop <= 0:
+        raise ValueError("Params window and hop must be positive")
+    count = int(np.ceil(max(end - start - window, 0.0) / hop)) + 1
+    window_starts = start + hop * np.arange(count)
+    return window_starts, window_starts + window
+
+
+def window_stats(frame_starts, values, window_starts, window_ends,
+                 stats=("mean", "std", "min", "max")):
+    """
+    Functionals of the frames in every window. NaN and infinite values
+    are left out; a window without finite values gives NaN.
+    :param frame_starts: Sorted start times of the frames, shape (n,)
+    :param values: Feature values of the frames, shape (n, dim)
+    :param window_starts: Start times of the windows
+    :param window_ends: End times of the windows
+    :param stats: Functionals from WINDOW_STATS, in output order
+    :returns: array (windows, len(stats) * dim), the functionals of a
+              window concatenated in the order of stats
+    """
+    for name in stats:
+        if name not in WINDOW_STATS:
+            raise ValueError("Unknown window statistic " + str(name))
+    values = np.asarray(values, dtype=np.float64)
+    count, dim = values.shape
+    lo = np.searchsorted(frame_starts, window_starts, "left")
+    hi = np.searchsorted(frame_starts, window_ends, "left")
+    finite = np.isfinite(values)
+
+    def prefix(array):
+        sums = np.zeros((count + 1, dim))
+        np.cumsum(array, axis=0, out=sums[1:])
+        return sums[hi] - sums[lo]
+
+    counts = prefix(finite)
+    results = {"count": counts}
+    if "mean" in stats or "std" in stats:
+        # Centering on the segment mean keeps the sums of squares accurate
+        center = (np.where(finite, values, 0.0).sum(axis=0)
+                  / np.maximum(finite.sum(axis=0), 1))
+        centered = np.where(finite, values - center, 0.0)
+        safe_counts = np.where(counts > 0, counts, np.nan)
+        mean = prefix(centered) / safe_counts
+        results["mean"] = mean + center
+        if "std" in stats:
+            var = prefix(centered ** 2) / safe_counts - mean ** 2
+            results["std"] = np.sqrt(np.maximum(var, 0.0))
+    if "min" in stats or "max" in stats:
+        # reduceat over interleaved (lo, hi) bounds reduces every window
+        # in one call, the reductions over (hi, next lo) are dropped. A
+        # padding row keeps the index of the last frame + 1 valid
+        bounds = np.empty(2 * len(lo), dtype=np.int64)
+        bounds[0::2] = lo
+        bounds[1::2] = hi
+        empty = counts == 0
+        for name, fill, reduce_op in (("min", np.inf, np.minimum),
+                                      ("max", -np.inf, np.maximum)):
+            if name not in stats:
+                continue
+            padded = np.full((count + 1, dim), fill)
+            padded[:count] = np.where(finite, values, fill)
+            if len(bounds):
+                reduced = reduce_op.reduceat(padded, bounds, axis=0)[0::2]
+            else:
+                reduced = np.zeros((0, dim))
+            reduced[empty] = np.nan
+            results[name] = reduced
+    return np.hstack([results[name] for name in stats])
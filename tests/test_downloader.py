@@ -0,0 +1,102 @@
+import BaseHTTPServer
+import hashlib
+import os
+import shutil
+import SocketServer
+import sys
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+import downloader
+
+
+class RangeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        data = self.server.data
+        first, last = 0, len(data) - 1
+        byte_range = self.headers.getheader("Range")
+        if byte_range:
+            first, last = [int(val) for val
+                           in byte_range.split("=")[1].split("-")]
+            last = min(last, len(data) - 1)
+            self.server.ranges.append(first)
+            if first >= self.server.fail_from:
+                self.send_response(500)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+        self.send_response(206 if byte_range else 200)
+        self.send_header("Content-Length", str(last - first + 1))
+        if byte_range:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(
+                             first, last, len(data)))
+        self.end_headers()
+        self.wfile.write(data[first:last + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class RangeServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.tmp, "MOSI.tar.gz")
+        self.chunk_sz = downloader.chunk_sz
+        downloader.chunk_sz = 1000
+        self.server = RangeServer(("127.0.0.1", 0), RangeHandler)
+        self.server.data = np.random.RandomState(0).bytes(10500)
+        self.server.ranges = []
+        self.server.fail_from = len(self.server.data)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = "http://127.0.0.1:{}/MOSI.tar.gz".format(
+                   self.server.server_address[1])
+
+    def tearDown(self):
+        downloader.chunk_sz = self.chunk_sz
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def checksum(self, data):
+        return "sha256:" + hashlib.sha256(data).hexdigest()
+
+    def test_interrupted_download_resumes(self):
+        state_path = self.file_path + ".state"
+        # Chunk 4 and later fail, chunks 0 to 3 are recorded as done
+        self.server.fail_from = 4000
+        self.assertRaises(IOError, downloader.download, self.url,
+                          self.file_path, 1)
+        self.assertEqual(downloader.load_state(state_path, self.url, 10500,
+                                               11), set(range(4)))
+
+        self.server.fail_from = len(self.server.data)
+        del self.server.ranges[:]
+        downloader.download(self.url, self.file_path, 3,
+                            self.checksum(self.server.data))
+        self.assertEqual(sorted(self.server.ranges[1:]),
+                         range(4000, 10500, 1000))
+        with open(self.file_path, "rb") as f:
+            self.assertEqual(f.read(), self.server.data)
+        self.assertFalse(os.path.exists(state_path))
+
+    def test_checksum_mismatch(self):
+        self.assertRaises(IOError, downloader.download, self.url,
+                          self.file_path, 2, self.checksum(b"other"))
+        self.assertFalse(os.path.exists(self.file_path + ".state"))
+
+
+if __name__ == "__main__":
+    unittest.main()
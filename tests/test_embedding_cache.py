@@ -0,0 +1,49 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from embedding_cache import EmbeddingTable
+
+
+class EmbeddingTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, text):
+        fpath = os.path.join(self.tmp, "vectors.txt")
+        with open(fpath, "w") as fh:
+            fh.write(text)
+        return fpath
+
+    def test_from_text(self):
+        fpath = self.write("the 0.0001 -1.5\nof 2 3\n\nthe 4 5\n")
+        table = EmbeddingTable.from_text(fpath, np.float64)
+        self.assertEqual((len(table), table.vector_size), (3, 2))
+        self.assertEqual(table["the"].tolist(), [4.0, 5.0])
+        self.assertEqual(table.vectors[0, 0], float("0.0001"))
+        self.assertEqual(table.row_ids_for(["of", "a"]).tolist(),
+                         [1, table.oov_row])
+        self.assertEqual(table.vectors[table.oov_row].tolist(), [0.0, 0.0])
+
+    def test_from_text_header(self):
+        fpath = self.write("2 3\nuno 1 2 3\ndos 4 5 6\n")
+        table = EmbeddingTable.from_text(fpath, has_header=True)
+        self.assertEqual(table.vectors.dtype, np.float32)
+        self.assertEqual(table["dos"].tolist(), [4.0, 5.0, 6.0])
+
+    def test_from_text_ragged_raises(self):
+        fpath = self.write("a 1 2\nb 3\n")
+        self.assertRaises(ValueError, EmbeddingTable.from_text, fpath)
+
+
+if __name__ == "__main__":
+    unittest.main()
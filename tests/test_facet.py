@@ -0,0 +1,86 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from dataset import Dataset
+
+
+class FacetSchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.dataset = Dataset("unused.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        fpath = os.path.join(self.tmp, name)
+        with open(fpath, "w") as fh:
+            fh.write(text)
+        return fpath
+
+    def schema(self, text, layout=None):
+        return self.dataset.facet_schema(self.write("f.csv", text),
+                                         text.splitlines(), layout)
+
+    def test_header_with_time_name(self):
+        schema = self.schema("Frame,Timestamp,a,b,\n0,0.0,1,2,\n")
+        self.assertEqual((schema["header"], schema["time_col"],
+                          schema["first"], schema["last"]),
+                         (True, 1, 2, 4))
+        self.assertEqual(schema["names"], ["a", "b"])
+
+    def test_headerless_time_first(self):
+        schema = self.schema("0.00000,1,2\n0.03333,3,4\n")
+        self.assertEqual((schema["header"], schema["time_col"],
+                          schema["last"]), (False, 0, 3))
+
+    def test_headerless_frame_counter(self):
+        schema = self.schema("1,0.03333,1,2,\n2,0.06667,3,4,\n")
+        self.assertEqual((schema["time_col"], schema["first"],
+                          schema["last"]), (1, 2, 4))
+
+    def test_gapped_frame_counter(self):
+        # FACET drops frames, the frame numbers skip 3
+        text = ("1,0.03333,0.5,0.25,\n2,0.06667,0.1,0.2,\n"
+                "4,0.13333,0.3,0.4,\n5,0.16667,0.7,0.8,\n")
+        self.assertEqual(self.schema(text)["time_col"], 1)
+        fpath = self.write("gap.csv", text)
+        for loader in (self.dataset.load_facet, self.dataset.load_facet1):
+            features = loader(fpath, 0.0, 0.15)
+            self.assertEqual([feat[0] for feat in features],
+                             [0.03333, 0.06667, 0.13333])
+            np.testing.assert_allclose(features[2][2], [0.3, 0.4])
+
+    def test_ambiguous_layout_raises(self):
+        self.assertRaises(ValueError, self.schema, "1,2,3\n2,5,6\n")
+        # A frame number that does not increase is not a counter
+        self.assertRaises(ValueError, self.schema,
+                          "3,0.1,1\n2,0.2,1\n")
+
+    def test_fixed_layouts(self):
+        schema = self.schema("1,2,3,4,\n2,5,6,7,\n", "facet1")
+        self.assertEqual((schema["header"], schema["time_col"],
+                          schema["first"], schema["last"]),
+                         (False, 1, 2, 4))
+        schema = self.schema("Time,a,b\n0.0,1,2\n", "old_facet")
+        self.assertEqual((schema["header"], schema["time_col"],
+                          schema["last"], schema["names"]),
+                         (True, 0, 3, ["a", "b"]))
+
+    def test_empty_and_nan_cells(self):
+        fpath = self.write("cells.csv", "Timestamp,a,b,c,\n"
+                                        "0.0,1,,NaN,\n0.1,x,2,3,\n")
+        features = self.dataset.load_facet(fpath, 0.0, 1.0)
+        np.testing.assert_array_equal(features[0][2], [1.0, 0.0, np.nan])
+        np.testing.assert_array_equal(features[1][2], [0.0, 2.0, 3.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
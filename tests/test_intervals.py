@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from intervals import IntervalIndex
+
+
+def old_window(feat_starts, feat_ends, start, end):
+    # The per-feature loop the loaders used before the index
+    indices = []
+    for i, (feat_start, feat_end) in enumerate(zip(feat_starts, feat_ends)):
+        feat_time = feat_end - feat_start
+        if ((feat_start <= start and feat_end > end)
+                or (feat_start >= start and feat_end < end)
+                or (feat_start <= start
+                    and start - feat_start < feat_time / 2)
+                or (feat_start >= start
+                    and end - feat_start > feat_time / 2)):
+            indices.append(i)
+    return indices
+
+
+class IntervalIndexTest(unittest.TestCase):
+
+    def check(self, starts, ends, windows):
+        index = IntervalIndex(starts, ends)
+        for start, end in windows:
+            self.assertEqual(index.window(start, end).tolist(),
+                             old_window(starts, ends, start, end),
+                             "window (%r, %r)" % (start, end))
+
+    def random_windows(self, rng, count):
+        # Whole numbers tie with the interval bounds, a few are reversed
+        windows = rng.uniform(-1.0, 21.0, (count, 2))
+        windows[::3] = np.round(windows[::3])
+        return [tuple(window) for window in windows]
+
+    def test_random_intervals(self):
+        rng = np.random.RandomState(0)
+        starts = np.round(rng.uniform(0.0, 20.0, 300), 1)
+        ends = starts + np.round(rng.exponential(1.0, 300), 1)
+        # Long intervals spanning many windows and zero length ones
+        ends[::50] += 10.0
+        ends[7::40] = starts[7::40]
+        self.check(starts, ends, self.random_windows(rng, 200))
+
+    def test_malformed_intervals(self):
+        rng = np.random.RandomState(1)
+        starts = rng.uniform(0.0, 20.0, 100)
+        ends = starts + rng.uniform(-2.0, 2.0, 100)
+        index = IntervalIndex(starts, ends)
+        self.assertEqual(index.candidates(5.0, 6.0), (0, 100))
+        self.check(starts, ends, self.random_windows(rng, 100))
+
+    def test_empty_index(self):
+        self.assertEqual(IntervalIndex([], []).window(0.0, 1.0).tolist(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+import store
+
+
+class MergeStoresTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, feats, segments, info=None, quantize=None):
+        path = os.path.join(self.tmp, name)
+        writer = store.StoreWriter(path, segments)
+        for modality in sorted(feats):
+            writer.add_modality(modality, feats[modality], info,
+                                quantize=quantize)
+        return path
+
+    def test_disjoint_stores(self):
+        first = self.write(
+            "a", {"m": {"v2": {"10": [(0.0, 1.0, np.array([1.0, 2.0]))]},
+                        "v1": {"2": [(0.0, 0.5, np.array([3.0, 4.0])),
+                                     (0.5, 1.0, np.array([5.0, 6.0]))]}}},
+            [["v1", "2", 0.0, 1.0], ["v2", "10", 0.0, 1.0]],
+            {"token_counts": [1, 2]})
+        second = self.write(
+            "b", {"m": {"v1": {"10": [(2.0, 3.0, np.array([7.0, 8.0]))]},
+                        "v2": {"2": []}}},
+            [["v1", "10", 2.0, 3.0], ["v2", "2", 0.0, 1.0]],
+            {"token_counts": [3, 4]})
+        merged = store.merge_stores([first, second],
+                                    os.path.join(self.tmp, "merged"))
+        self.assertEqual([tuple(segment[:2])
+                          for segment in merged.segments],
+                         [("v1", "2"), ("v1", "10"), ("v2", "2"),
+                          ("v2", "10")])
+        intervals, values = merged.segment("m", "v1", "2")
+        np.testing.assert_array_equal(intervals, [[0.0, 0.5], [0.5, 1.0]])
+        np.testing.assert_array_equal(values, [[3.0, 4.0], [5.0, 6.0]])
+        _, values = merged.segment("m", "v1", "10")
+        np.testing.assert_array_equal(values, [[7.0, 8.0]])
+        self.assertEqual(len(merged.segment("m", "v2", "2")[1]), 0)
+        self.assertEqual(merged.modalities["m"]["token_counts"], [4, 6])
+
+    def test_requantized_stores(self):
+        segments = [[["v", "1", 0.0, 1.0]], [["v", "2", 0.0, 1.0]]]
+        feats = [{"m": {"v": {"1": [(0.0, 1.0, np.array([0.0])),
+                                    (0.0, 1.0, np.array([1.0]))]}}},
+                 {"m": {"v": {"2": [(0.0, 1.0, np.array([-4.0])),
+                                    (0.0, 1.0, np.array([np.nan]))]}}}]
+        paths = [self.write(name, feats[k], segments[k], quantize="int8")
+                 for k, name in enumerate(("a", "b"))]
+        merged = store.merge_stores(paths, os.path.join(self.tmp, "merged"))
+        scale, _ = merged.quantization("m")
+        _, values = merged.segment("m", "v", "1")
+        np.testing.assert_allclose(values[:, 0], [0.0, 1.0],
+                                   atol=scale[0])
+        _, values = merged.segment("m", "v", "2")
+        self.assertAlmostEqual(values[0, 0], -4.0, delta=scale[0])
+        self.assertTrue(np.isnan(values[1, 0]))
+
+    def test_duplicate_segment_raises(self):
+        segments = [["v", "1", 0.0, 1.0]]
+        feats = {"m": {"v": {"1": [(0.0, 1.0, np.array([1.0]))]}}}
+        paths = [self.write(name, feats, segments) for name in ("a", "b")]
+        self.assertRaises(ValueError, store.merge_stores, paths,
+                          os.path.join(self.tmp, "merged"))
+
+    def test_different_modalities_raise(self):
+        feats = {"v": {"1": [(0.0, 1.0, np.array([1.0]))]}}
+        paths = [self.write("a", {"m": feats}, [["v", "1", 0.0, 1.0]]),
+                 self.write("b", {"n": {"v": {"2": feats["v"]["1"]}}},
+                            [["v", "2", 0.0, 1.0]])]
+        self.assertRaises(ValueError, store.merge_stores, paths,
+                          os.path.join(self.tmp, "merged"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from dataset import Dataset
+
+
+class StreamingStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rng = np.random.RandomState(0)
+        rows = []
+        for video_id, period in (("a", 0.1), ("b", 0.25)):
+            for name, dim in (("fine", 3), ("coarse", 2)):
+                fpath = os.path.join(self.tmp, video_id + "_" + name + ".csv")
+                step = period if name == "fine" else 2 * period
+                with open(fpath, "w") as fh:
+                    fh.write("Timestamp," + ",".join("f%d" % i for i
+                                                     in range(dim)) + "\n")
+                    for t in np.arange(0.0, 4.0, step):
+                        values = rng.randn(dim)
+                        if rng.rand() < 0.1:
+                            values[0] = np.nan
+                        fh.write("%r," % t + ",".join("%r" % val for val
+                                                      in values) + "\n")
+            for segment_id, (start, end) in (("1", (0.0, 1.5)),
+                                             ("2", (2.0, 3.5))):
+                rows.append([video_id, segment_id, repr(start), repr(end),
+                             os.path.join(self.tmp, video_id + "_fine.csv"),
+                             os.path.join(self.tmp,
+                                          video_id + "_coarse.csv")])
+        self.csv = os.path.join(self.tmp, "config.csv")
+        with open(self.csv, "w") as fh:
+            fh.write("video_id,segment,start,end,facet,facet\n,,,,v,v\n")
+            for row in rows:
+                fh.write(",".join(row) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertStatsEqual(self, streamed, computed):
+        self.assertEqual(sorted(streamed), sorted(computed))
+        for group in computed:
+            for field in ("count", "mean", "m2", "min", "max"):
+                np.testing.assert_allclose(getattr(streamed[group], field),
+                                           getattr(computed[group], field),
+                                           rtol=1e-12, atol=1e-12)
+
+    def test_stats_while_loading_and_aligning(self):
+        for groupby in ("global", "video"):
+            dataset = Dataset(self.csv, stats=groupby)
+            dataset.load()
+            dataset.align("modality_0")
+            streamed = dict((key, dict(stats["groups"])) for key, stats
+                            in dataset.feature_stats.iteritems())
+            self.assertEqual(sorted(streamed), ["aligned_modality_1",
+                                                "modality_0", "modality_1"])
+            computed = dataset.compute_stats(groupby=groupby)
+            computed.update(("aligned_" + modality, groups)
+                            for modality, groups in dataset.compute_stats(
+                                groupby=groupby, aligned=True).iteritems())
+            for key in streamed:
+                self.assertStatsEqual(streamed[key], computed[key])
+
+    def test_stats_of_selected_modalities(self):
+        dataset = Dataset(self.csv, stats={"modality_1": "video"})
+        dataset.load()
+        self.assertEqual(sorted(dataset.feature_stats), ["modality_1"])
+        self.assertEqual(sorted(dataset.feature_stats["modality_1"]
+                                ["groups"]), ["a", "b"])
+        self.assertRaises(ValueError, Dataset, self.csv, stats="segment")
+
+
+if __name__ == "__main__":
+    unittest.main()
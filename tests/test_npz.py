@@ -0,0 +1,40 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from dataset import Dataset
+import store
+
+
+class LoadNpzTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.fpath = os.path.join(self.tmp, "v.npz")
+        # Segment relative times, as P2FA_Helper_v2 writes for level s
+        store.write_video_npz(self.fpath, {
+            "1": [(0.0, 1.0, np.array([1.0])), (1.0, 2.0, np.array([2.0]))],
+            "2": [(0.0, 1.0, np.array([3.0]))]}, {"1": 0.0, "2": 5.0})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_segment_level_is_windowed(self):
+        dataset = Dataset("unused.csv")
+        for level in ("s", "v"):
+            features = dataset.load_npz(self.fpath, 5.0, 6.0, "relative",
+                                        level)
+            self.assertEqual([(feat[0], feat[1], feat[2].tolist())
+                              for feat in features], [(0.0, 1.0, [3.0])])
+            features = dataset.load_npz(self.fpath, 0.0, 2.0, "absolute",
+                                        level)
+            self.assertEqual(len(features), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from p2fa_helper import P2FA_Helper_v2
+import store
+
+
+class P2FAIncrementalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tmp, "out")
+        self.p2fa_csv = os.path.join(self.tmp, "p2fa.csv")
+        self.write_textgrid("a", ["one", "two", "three"])
+        self.write_textgrid("b", ["two", "four"])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_textgrid(self, video_id, words):
+        # One word and one phoneme per second
+        end = float(len(words))
+        lines = ['File type = "ooTextFile short"', '"TextGrid"', '', '0',
+                 repr(end), '<exists>', '2', '"IntervalTier"', '"phone"',
+                 '0', repr(end), str(len(words))]
+        for i in range(len(words)):
+            lines += [repr(float(i)), repr(i + 1.0), '"AA1"']
+        lines += ['"IntervalTier"', '"word"', '0', repr(end),
+                  str(len(words))]
+        for i, word in enumerate(words):
+            lines += [repr(float(i)), repr(i + 1.0), '"%s"' % word.upper()]
+        with open(os.path.join(self.tmp, video_id + ".TextGrid"), "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+
+    def write_csv(self, segments):
+        with open(self.p2fa_csv, "w") as fh:
+            fh.write("video_id,segment,start,end,p2fa\n,,,,v\n")
+            for video_id, segment_id, start, end in segments:
+                fh.write("%s,%s,%r,%r,%s\n" % (
+                    video_id, segment_id, start, end,
+                    os.path.join(self.tmp, video_id + ".TextGrid")))
+
+    def load(self, output_format):
+        helper = P2FA_Helper_v2(self.p2fa_csv, self.out_dir,
+                                output_format=output_format)
+        helper.load(incremental=True)
+        return helper
+
+    def test_vocabulary_growth_rewrites_csv(self):
+        self.write_csv([("a", "1", 0.0, 3.0), ("b", "1", 0.0, 2.0)])
+        self.load("csv")
+        self.write_textgrid("b", ["two", "five"])
+        helper = self.load("csv")
+        self.assertEqual(len(helper.vocabulary), 5)
+        for name in ("a_1.csv", "b_1.csv"):
+            with open(os.path.join(self.out_dir, "words", name)) as fh:
+                lengths = set(len(line.split(",")) for line in fh)
+            self.assertEqual(lengths, set([2 + 5]))
+
+    def test_vocabulary_growth_rewrites_store(self):
+        self.write_csv([("a", "1", 0.0, 3.0), ("b", "1", 0.0, 2.0)])
+        self.load("store")
+        self.write_textgrid("b", ["two", "five"])
+        helper = self.load("store")
+        feature_store = store.FeatureStore(helper.store_path)
+        self.assertEqual(feature_store.modalities["words"]["dim"], 5)
+        _, values = feature_store.segment("words", "a", "1")
+        np.testing.assert_array_equal(values.argmax(axis=1), [0, 1, 2])
+
+    def test_added_segment_keeps_store(self):
+        self.write_csv([("a", "1", 0.0, 3.0), ("b", "1", 0.0, 2.0)])
+        self.load("store")
+        self.write_csv([("a", "1", 0.0, 3.0), ("a", "2", 1.0, 3.0),
+                        ("b", "1", 0.0, 2.0)])
+        helper = self.load("store")
+        feature_store = store.FeatureStore(helper.store_path)
+        for name in ("phonemes", "words"):
+            offsets = feature_store.arrays(name)[2]
+            np.testing.assert_array_equal(np.diff(offsets), [3, 2, 2])
+        intervals, _ = feature_store.segment("words", "b", "1")
+        np.testing.assert_array_equal(intervals, [[0.0, 1.0], [1.0, 2.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
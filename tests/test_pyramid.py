@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+from dataset import Dataset
+import pyramid
+
+
+class PyramidTest(unittest.TestCase):
+
+    def dataset(self):
+        rng = np.random.RandomState(0)
+        dataset = Dataset("unused.csv")
+        dataset.dataset_info = {"v": {"1": {"start": 0.5, "end": 20.8},
+                                      "2": {"start": 22.0, "end": 23.5}}}
+        feats = {}
+        for segment_id, segment_data in dataset.dataset_info["v"].items():
+            starts = np.arange(segment_data["start"], segment_data["end"],
+                               0.25)
+            feats[segment_id] = [(start, start + 0.25, rng.randn(3))
+                                 for start in starts]
+        dataset.feature_dict = {"m": {"v": feats}}
+        return dataset
+
+    def test_coarsened_levels_match_integrated(self):
+        widths = (1, 2, 3, 6, pyramid.SEGMENT_LEVEL)
+        levels = self.dataset().build_pyramid("m", widths)
+        for width in widths:
+            direct = self.dataset().build_pyramid("m", (width,))[width]
+            for built, expected in zip(levels[width], direct):
+                np.testing.assert_allclose(built, expected, atol=1e-9,
+                                           err_msg="level %s" % (width,))
+
+    def test_integer_widths_without_divisor(self):
+        levels = self.dataset().build_pyramid("m", (2, 3))
+        direct = self.dataset().build_pyramid("m", (3,))[3]
+        self.assertEqual(len(levels[3][0]), len(direct[0]))
+        np.testing.assert_allclose(levels[3][1], direct[1], atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "lib"))
+import quantization
+import store
+
+
+class QuantizationTest(unittest.TestCase):
+
+    def test_round_trip_within_half_scale(self):
+        rng = np.random.RandomState(0)
+        values = rng.randn(500, 4) * [1.0, 10.0, 0.01, 100.0]
+        for dtype in ("int8", "int16"):
+            scale, offset = quantization.affine_params(
+                values.min(axis=0), values.max(axis=0), dtype)
+            codes = quantization.quantize(values, scale, offset, dtype)
+            self.assertEqual(codes.dtype, np.dtype(dtype))
+            restored = quantization.dequantize(codes, scale, offset,
+                                               np.float64)
+            self.assertTrue(np.all(np.abs(restored - values)
+                                   <= scale / 2 + 1e-12))
+
+    def test_nan_code(self):
+        values = np.array([[0.0, np.nan], [1.0, 2.0], [np.nan, 4.0]])
+        scale, offset = quantization.affine_params([0.0, 2.0], [1.0, 4.0],
+                                                   "int8")
+        codes = quantization.quantize(values, scale, offset, "int8")
+        nan_code, low, high = quantization.code_range(np.int8)
+        self.assertEqual(codes[0, 1], nan_code)
+        self.assertEqual(codes[2, 0], nan_code)
+        self.assertEqual((codes[0, 0], codes[1, 0]), (low, high))
+        restored = quantization.dequantize(codes, scale, offset)
+        np.testing.assert_array_equal(np.isnan(restored), np.isnan(values))
+
+    def test_constant_and_infinite_values(self):
+        scale, offset = quantization.affine_params([3.0, -np.inf],
+                                                   [3.0, np.inf], "int16")
+        np.testing.assert_array_equal(scale, [1.0, 1.0])
+        codes = quantization.quantize([[3.0, np.inf]], scale, offset,
+                                      "int16")
+        self.assertEqual(quantization.dequantize(codes, scale, offset)[0, 0],
+                         3.0)
+
+    def test_quantized_store(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            feats = {"v": {"1": [(0.0, 1.0, np.array([0.5, -2.0])),
+                                 (1.0, 2.0, np.array([np.nan, 3.0]))]}}
+            writer = store.StoreWriter(tmp, [["v", "1", 0.0, 2.0]])
+            writer.add_modality("m", feats, quantize="int8")
+            feature_store = store.FeatureStore(tmp)
+            self.assertEqual(feature_store.arrays("m")[1].dtype, np.int8)
+            _, values = feature_store.segment("m", "v", "1")
+            self.assertTrue(np.isnan(values[1, 0]))
+            np.testing.assert_allclose(values[0], [0.5, -2.0], atol=0.02)
+            self.assertIs(feature_store.quantization("m"),
+                          feature_store.quantization("m"))
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    unittest.main()